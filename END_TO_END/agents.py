@@ -1,9 +1,25 @@
-import streamlit as st
+import os
 import time
-from utils.pdf_processor import chunk_text, process_in_chunks, read_prompt_file
-from utils.api_clients import unified_api_call
+from concurrent.futures import FIRST_COMPLETED, wait
+from utils.pdf_processor import chunk_text, get_extraction_token_budget, iter_document_chunks, read_prompt_file
+from utils.api_clients import unified_api_call, stream_api_call
 from utils.json_validator import extract_json_from_text, validate_knowledge_graph_json
-from utils.graph_utils import extract_graph_data
+from utils.json_ld_shards import merge_fragments, plan_shards, shard_instructions
+from utils.graph_store import GraphStore
+from utils.json_stream import GraphStreamParser
+from utils.concurrency import map_in_order, ContextThreadPoolExecutor, DEFAULT_MAX_CONCURRENCY
+from utils.condenser import tree_condense, DEFAULT_FAN_IN
+from utils.extraction_manifest import ExtractionManifest
+from utils.relevance import RelevanceScorer, relevance_summary
+from utils.entity_index import MentionIndex, entity_contexts, format_entity_entries, parse_entity_entries
+from utils.token_accounting import get_token_ledger, with_token_ledger
+from utils.token_utils import count_tokens
+from utils.batch_jobs import build_batch_request, make_custom_id, parse_custom_id, run_batch
+from utils.structured_extraction import (
+    STRUCTURED_ENTITY_INSTRUCTIONS, STRUCTURED_RELATIONSHIP_INSTRUCTIONS,
+    parse_entity_records, parse_relationship_records,
+    merge_entities, merge_relationships, format_entities, format_relationships
+)
 
 class Agent:
     """Base agent class for handling specific tasks in the workflow."""
@@ -19,14 +35,15 @@ class PDFChunkingAgent(Agent):
     def __init__(self):
         super().__init__("PDF Chunking Agent")
     
-    def execute(self, pdf_content, api_choice="OpenAI API"):
-        """Chunk the PDF content into manageable pieces."""
+    def execute(self, pdf_content, api_choice="OpenAI API", model=None, prompt="", max_chunk_tokens=None,
+                content_defined=False):
+        """Chunk the PDF content into pieces that fill the model's context next to prompt."""
         try:
-            chunks = chunk_text(pdf_content, api_choice)
+            chunks = chunk_text(pdf_content, api_choice, model, prompt, max_chunk_tokens, content_defined)
             return {
                 "success": True,
                 "chunks": chunks,
-                "message": f"Split PDF into {len(chunks)} chunks"
+                "message": f"Split PDF into {len(chunks)} chunks of up to {chunks.token_budget} tokens"
             }
         except Exception as e:
             return {
@@ -40,70 +57,110 @@ class EntityExtractionAgent(Agent):
     def __init__(self):
         super().__init__("Entity Extraction Agent")
     
+    def resolve_prompt(self, entity_prompt, api_choice, structured=False):
+        """Return the entity prompt to use for the given API provider and output mode."""
+        # For Groq API, use a simplified prompt to save tokens
+        if api_choice == "Groq API":
+            # Extract just the essential instructions from the prompt
+            simplified_prompt = """
+            You are a Materials Science expert. Extract entities from the text using these categories:
+            - Material: any material, substance, or chemical
+            - Manufacturing: any manufacturing process, synthesis, or fabrication
+            - Measurement: any characterization, measurement, or analysis
+            - Property: any property, characteristic, or attribute
+            - Parameter: any processing parameter, condition, or variable
+            
+            Format your response as a structured list of entities.
+            """
+            entity_prompt = simplified_prompt
+        if structured:
+            entity_prompt += STRUCTURED_ENTITY_INSTRUCTIONS
+        return entity_prompt
+    
+    def extract_chunk(self, chunk, entity_prompt, api_choice, api_key, model, use_cache=True):
+        """Extract entities from a single chunk using an already resolved prompt."""
+        input_text = entity_prompt + f"\n\nText: {chunk}"
+        response = unified_api_call(api_choice, input_text, api_key, model, use_cache=use_cache, stage="entity")
+        return response.strip() if response else ""
+    
+    def condense(self, all_entities, api_choice, api_key, model, progress_callback=None, **kwargs):
+        """Condense per-chunk entity outputs into a single entity list."""
+        def condense_progress(fraction):
+            # Ensure progress is between 0.2 and 0.4 for this condensing phase
+            progress_callback(min(0.4, 0.2 + fraction * 0.2))
+        
+        return tree_condense(
+            all_entities,
+            "Condense the following extracted entities into a single output without missing any unique information:",
+            "Condense the following condensed parts into one final output:",
+            api_choice, api_key, model,
+            fan_in=kwargs.get('fan_in', DEFAULT_FAN_IN),
+            max_concurrency=kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            use_cache=kwargs.get('use_cache', True),
+            progress_callback=condense_progress if progress_callback else None,
+            stage="entity_condense"
+        )
+    
+    def merge(self, all_entities):
+        """Merge structured per-chunk entity outputs locally, without an API call.
+        
+        Returns the merged entity list as text together with its records.
+        """
+        records = merge_entities(parse_entity_records(output) for output in all_entities)
+        return format_entities(records), records
+    
     def execute(self, chunks, entity_prompt, api_choice, api_key, model, **kwargs):
         """Extract entities from PDF text chunks."""
         progress_callback = kwargs.get('progress_callback', None)
         status_callback = kwargs.get('status_callback', None)
+        max_concurrency = kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        fan_in = kwargs.get('fan_in', DEFAULT_FAN_IN)
+        structured = kwargs.get('structured', False)
+        use_cache = kwargs.get('use_cache', True)
         
         try:
             if status_callback:
                 status_callback("Extracting entities...")
             
-            # For Groq API, use a simplified prompt to save tokens
-            if api_choice == "Groq API":
-                # Extract just the essential instructions from the prompt
-                simplified_prompt = """
-                You are a Materials Science expert. Extract entities from the text using these categories:
-                - Material: any material, substance, or chemical
-                - Manufacturing: any manufacturing process, synthesis, or fabrication
-                - Measurement: any characterization, measurement, or analysis
-                - Property: any property, characteristic, or attribute
-                - Parameter: any processing parameter, condition, or variable
-                
-                Format your response as a structured list of entities.
-                """
-                entity_prompt = simplified_prompt
-            
+            entity_prompt = self.resolve_prompt(entity_prompt, api_choice, structured)
             total_chunks = len(chunks)
-            all_entities = []
+            completed = [0]
             
-            for i, chunk in enumerate(chunks):
+            def extract_chunk(chunk):
+                return self.extract_chunk(chunk, entity_prompt, api_choice, api_key, model, use_cache)
+            
+            def on_result(index, response):
+                completed[0] += 1
                 if progress_callback:
                     # Ensure progress is between 0.0 and 0.2 for this phase
-                    progress_value = i / total_chunks * 0.2
+                    progress_value = completed[0] / total_chunks * 0.2
                     progress_callback(min(0.2, progress_value))
                 if status_callback:
-                    status_callback(f"Extracting entities from chunk {i+1} of {total_chunks}...")
-                    
-                input_text = entity_prompt + f"\n\nText: {chunk}"
-                response = unified_api_call(api_choice, input_text, api_key, model)
-                
-                if response:
-                    all_entities.append(response.strip())
+                    status_callback(f"Extracted entities from {completed[0]} of {total_chunks} chunks...")
+            
+            # Responses come back in chunk order regardless of completion order
+            responses = map_in_order(extract_chunk, chunks, max_concurrency, on_result)
+            all_entities = [response for response in responses if response]
                     
             # Combine entity results
-            if status_callback:
-                status_callback("Condensing entity results...")
+            entity_records = None
+            if structured:
+                if status_callback:
+                    status_callback("Merging entity results...")
+                final_response, entity_records = self.merge(all_entities)
+            else:
+                if status_callback:
+                    status_callback("Condensing entity results...")
                 
-            combined_prompt = "Condense the following extracted entities into a single output without missing any unique information:\n" + "\n".join(all_entities)
-            final_entities = []
-            
-            for i, sub_prompt in enumerate(process_in_chunks(combined_prompt, api_choice=api_choice)):
-                if progress_callback:
-                    # Ensure progress is between 0.2 and 0.4 for this condensing phase
-                    chunk_count = len(list(process_in_chunks(combined_prompt, api_choice=api_choice)))
-                    progress_value = 0.2 + (i / max(1, chunk_count) * 0.2)
-                    progress_callback(min(0.4, progress_value))
-                response = unified_api_call(api_choice, sub_prompt, api_key, model)
-                if response:
-                    final_entities.append(response.strip())
-                    
-            final_combined_prompt = "Condense the following condensed parts into one final output:\n" + "\n".join(final_entities)
-            final_response = unified_api_call(api_choice, final_combined_prompt, api_key, model)
+                final_response = self.condense(
+                    all_entities, api_choice, api_key, model, progress_callback,
+                    fan_in=fan_in, max_concurrency=max_concurrency, use_cache=use_cache
+                )
             
             return {
                 "success": bool(final_response),
                 "entities": final_response,
+                "entity_records": entity_records,
                 "message": "Entity extraction complete"
             }
         except Exception as e:
@@ -118,71 +175,130 @@ class RelationshipExtractionAgent(Agent):
     def __init__(self):
         super().__init__("Relationship Extraction Agent")
     
+    def resolve_prompt(self, relationship_prompt, api_choice, structured=False):
+        """Return the relationship prompt to use for the given API provider and output mode."""
+        # For Groq API, use a simplified prompt to save tokens
+        if api_choice == "Groq API":
+            # Extract just the essential instructions from the prompt
+            simplified_prompt = """
+            You are a Materials Science expert. Extract relationships between the entities using these relationship types:
+            - is_manufacturing_input: material → manufacturing
+            - has_manufacturing_output: manufacturing → material
+            - is_measurement_input: material → measurement
+            - has_measurement_output: measurement → property
+            - has_property: material → property
+            - has_parameter: manufacturing/measurement → parameter
+            
+            Format your response as a simple list of relationships.
+            """
+            relationship_prompt = simplified_prompt
+        if structured:
+            relationship_prompt += STRUCTURED_RELATIONSHIP_INSTRUCTIONS
+        return relationship_prompt
+    
+    def extract_chunk(self, chunk, entities, relationship_prompt, api_choice, api_key, model, use_cache=True):
+        """Extract relationships from a single chunk using an already resolved prompt."""
+        input_text = relationship_prompt + f"\n\nText: {chunk}\nEntities: {entities}"
+        response = unified_api_call(
+            api_choice, input_text, api_key, model, use_cache=use_cache, stage="relationship"
+        )
+        return response.strip() if response else ""
+    
+    def condense(self, relationships, api_choice, api_key, model, progress_callback=None, **kwargs):
+        """Condense per-chunk relationship outputs into a single relationship list."""
+        def condense_progress(fraction):
+            # Ensure progress is between 0.6 and 0.8 for this condensing phase
+            progress_callback(min(0.8, 0.6 + fraction * 0.2))
+        
+        return tree_condense(
+            relationships,
+            "Condense the following extracted relationships into a single output without missing any unique information:",
+            "Condense the following condensed parts into one final output:",
+            api_choice, api_key, model,
+            fan_in=kwargs.get('fan_in', DEFAULT_FAN_IN),
+            max_concurrency=kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            use_cache=kwargs.get('use_cache', True),
+            progress_callback=condense_progress if progress_callback else None,
+            stage="relationship_condense"
+        )
+    
+    def merge(self, relationships, entity_records=None):
+        """Merge structured per-chunk relationship outputs locally, without an API call.
+        
+        Returns the merged relationship list as text together with its records.
+        """
+        records = merge_relationships(
+            (parse_relationship_records(output) for output in relationships), entity_records
+        )
+        return format_relationships(records), records
+    
     def execute(self, chunks, entities, relationship_prompt, api_choice, api_key, model, **kwargs):
-        """Extract relationships between extracted entities."""
+        """Extract relationships between extracted entities.
+        
+        With prune_entities (the default), each chunk's prompt lists only the
+        entities mentioned in that chunk or its entity_neighbors neighboring
+        chunks instead of the whole entity list.
+        """
         progress_callback = kwargs.get('progress_callback', None)
         status_callback = kwargs.get('status_callback', None)
+        max_concurrency = kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        fan_in = kwargs.get('fan_in', DEFAULT_FAN_IN)
+        structured = kwargs.get('structured', False)
+        entity_records = kwargs.get('entity_records', None)
+        prune_entities = kwargs.get('prune_entities', True)
+        entity_neighbors = kwargs.get('entity_neighbors', 0)
+        use_cache = kwargs.get('use_cache', True)
         
         try:
             if status_callback:
                 status_callback("Extracting relationships...")
             
-            # For Groq API, use a simplified prompt to save tokens
-            if api_choice == "Groq API":
-                # Extract just the essential instructions from the prompt
-                simplified_prompt = """
-                You are a Materials Science expert. Extract relationships between the entities using these relationship types:
-                - is_manufacturing_input: material → manufacturing
-                - has_manufacturing_output: manufacturing → material
-                - is_measurement_input: material → measurement
-                - has_measurement_output: measurement → property
-                - has_property: material → property
-                - has_parameter: manufacturing/measurement → parameter
-                
-                Format your response as a simple list of relationships.
-                """
-                relationship_prompt = simplified_prompt
-            
+            relationship_prompt = self.resolve_prompt(relationship_prompt, api_choice, structured)
             total_chunks = len(chunks)
-            relationships = []
+            completed = [0]
+            
+            if prune_entities:
+                contexts = entity_contexts(chunks, entities, entity_records, entity_neighbors)
+            else:
+                contexts = [entities] * total_chunks
+            
+            def extract_chunk(index):
+                return self.extract_chunk(
+                    chunks[index], contexts[index], relationship_prompt, api_choice, api_key, model, use_cache
+                )
             
-            for i, chunk in enumerate(chunks):
+            def on_result(index, response):
+                completed[0] += 1
                 if progress_callback:
                     # Ensure progress is between 0.4 and 0.6 for this phase
-                    progress_value = 0.4 + (i / total_chunks * 0.2)
+                    progress_value = 0.4 + (completed[0] / total_chunks * 0.2)
                     progress_callback(min(0.6, progress_value))
                 if status_callback:
-                    status_callback(f"Extracting relationships from chunk {i+1} of {total_chunks}...")
-                    
-                input_text = relationship_prompt + f"\n\nText: {chunk}\nEntities: {entities}"
-                response = unified_api_call(api_choice, input_text, api_key, model)
-                
-                if response:
-                    relationships.append(response.strip())
+                    status_callback(f"Extracted relationships from {completed[0]} of {total_chunks} chunks...")
+            
+            # Responses come back in chunk order regardless of completion order
+            responses = map_in_order(extract_chunk, range(total_chunks), max_concurrency, on_result)
+            relationships = [response for response in responses if response]
                     
             # Combine relationship results
-            if status_callback:
-                status_callback("Condensing relationship results...")
+            relationship_records = None
+            if structured:
+                if status_callback:
+                    status_callback("Merging relationship results...")
+                final_response, relationship_records = self.merge(relationships, entity_records)
+            else:
+                if status_callback:
+                    status_callback("Condensing relationship results...")
                 
-            combined_prompt = "Condense the following extracted relationships into a single output without missing any unique information:\n" + "\n".join(relationships)
-            final_relationships = []
-            
-            for i, sub_prompt in enumerate(process_in_chunks(combined_prompt, api_choice=api_choice)):
-                if progress_callback:
-                    # Ensure progress is between 0.6 and 0.8 for this condensing phase
-                    chunk_count = len(list(process_in_chunks(combined_prompt, api_choice=api_choice)))
-                    progress_value = 0.6 + (i / max(1, chunk_count) * 0.2)
-                    progress_callback(min(0.8, progress_value))
-                response = unified_api_call(api_choice, sub_prompt, api_key, model)
-                if response:
-                    final_relationships.append(response.strip())
-                    
-            final_combined_prompt = "Condense the following condensed parts into one final output:\n" + "\n".join(final_relationships)
-            final_response = unified_api_call(api_choice, final_combined_prompt, api_key, model)
+                final_response = self.condense(
+                    relationships, api_choice, api_key, model, progress_callback,
+                    fan_in=fan_in, max_concurrency=max_concurrency, use_cache=use_cache
+                )
             
             return {
                 "success": bool(final_response),
                 "relationships": final_response,
+                "relationship_records": relationship_records,
                 "message": "Relationship extraction complete"
             }
         except Exception as e:
@@ -197,81 +313,144 @@ class JSONGenerationAgent(Agent):
     def __init__(self):
         super().__init__("JSON Generation Agent")
     
+    def build_prompt(self, entities, relationships, json_prompt, api_choice, instructions=None):
+        """Build the JSON-LD generation request for entities and relationships.
+        
+        instructions, if given, are added after the data (e.g. the @id table
+        of a shard).
+        """
+        # For Groq API, use a simplified prompt to save tokens
+        if api_choice == "Groq API":
+            # Extract just the essential instructions from the prompt
+            simplified_prompt = """
+            Generate a JSON-LD representation of the following entities and relationships.
+            
+            Format:
+            {
+              "@context": {
+                "ex": "http://example.com/",
+                "emmo": "http://emmo.info/emmo#",
+                "skos": "http://www.w3.org/2004/02/skos/core#"
+              },
+              "@graph": [
+                {
+                  "@id": "ex:Material1",
+                  "@type": "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94",
+                  "skos:prefLabel": "Material Name"
+                },
+                ...
+              ]
+            }
+            
+            Use these entity types:
+            - Material: emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94
+            - Manufacturing: emmo:EMMO_a4d66059_5dd3_4b90_b4cb_10960559441b
+            - Measurement: emmo:EMMO_463bcfda_867b_41d9_a967_211d4d437cfb
+            - Property: emmo:EMMO_b7bcff25_ffc3_474e_9ab5_01b1664bd4ba
+            - Parameter: emmo:EMMO_d1d436e7_72fc_49cd_863b_7bfb4ba5276a
+            
+            And these relationship types:
+            - is_manufacturing_input: emmo:EMMO_e1097637
+            - has_manufacturing_output: emmo:EMMO_e1245987
+            - is_measurement_input: emmo:EMMO_m5677989
+            - has_measurement_output: emmo:EMMO_m87987545
+            - has_property: emmo:EMMO_p5778r78
+            - has_parameter: emmo:EMMO_p46903ar7
+            """
+            json_prompt = simplified_prompt
+        
+        # Pass condensed data directly
+        json_ld_prompt = (
+            json_prompt + "\n\nDATA (START)\n\nEntities: " + entities + "\nRelationships: " + relationships + "\nDATA (END)"
+        )
+        if instructions:
+            json_ld_prompt += "\n\n" + instructions
+        
+        # For Groq API, make explicit request for JSON in the prompt
+        if api_choice == "Groq API":
+            json_ld_prompt += "\n\nReturn ONLY the JSON-LD object with no explanations or markdown formatting."
+        else:
+            json_ld_prompt += "\n\nRespond with only the JSON-LD object. No other text."
+        
+        return json_ld_prompt
+    
+    def parse_response(self, response):
+        """Parse a JSON-LD response into (json_data, graph_store), or None if invalid."""
+        # Extract and validate JSON from the response
+        json_data = extract_json_from_text(response)
+        
+        if json_data and validate_knowledge_graph_json(json_data):
+            return json_data, GraphStore.from_json_ld(json_data)
+        return None
+    
+    def stream_response(self, json_ld_prompt, api_choice, api_key, model, partial_graph_callback=None, partial_interval=1.0,
+                        use_cache=True):
+        """Stream the JSON-LD response and report the partial graph as @graph items complete.
+        
+        partial_graph_callback(nodes, links) receives the graph built from every
+        item parsed so far, at most once per partial_interval seconds.
+        """
+        parser = GraphStreamParser()
+        # Items are added to the store as they complete instead of rebuilding it per update
+        graph_store = GraphStore()
+        added = 0
+        pieces = []
+        last_update = None
+        for piece in stream_api_call(api_choice, json_ld_prompt, api_key, model, use_cache=use_cache, stage="json_ld"):
+            pieces.append(piece)
+            if parser.feed(piece) and partial_graph_callback:
+                now = time.monotonic()
+                if last_update is None or now - last_update >= partial_interval:
+                    graph_store.add_items(parser.items[added:])
+                    added = len(parser.items)
+                    partial_graph_callback(*graph_store.to_echarts())
+                    last_update = now
+        return "".join(pieces)
+    
     def execute(self, entities, relationships, json_prompt, api_choice, api_key, model, **kwargs):
         """Generate JSON-LD from entities and relationships."""
         progress_callback = kwargs.get('progress_callback', None)
         status_callback = kwargs.get('status_callback', None)
+        stream = kwargs.get('stream', False)
+        partial_graph_callback = kwargs.get('partial_graph_callback', None)
+        shard_size = kwargs.get('shard_size', None)
+        use_cache = kwargs.get('use_cache', True)
         
         try:
+            if shard_size:
+                shards = plan_shards(
+                    entities, relationships, kwargs.get('entity_records', None), kwargs.get('relationship_records', None),
+                    shard_size
+                )
+                if len(shards) > 1:
+                    return self.execute_sharded(shards, json_prompt, api_choice, api_key, model, **kwargs)
+            
             if status_callback:
                 status_callback("Generating JSON-LD...")
             
             if progress_callback:
                 progress_callback(0.85)  # Final progress stage
             
-            # For Groq API, use a simplified prompt to save tokens
-            if api_choice == "Groq API":
-                # Extract just the essential instructions from the prompt
-                simplified_prompt = """
-                Generate a JSON-LD representation of the following entities and relationships.
-                
-                Format:
-                {
-                  "@context": {
-                    "ex": "http://example.com/",
-                    "emmo": "http://emmo.info/emmo#",
-                    "skos": "http://www.w3.org/2004/02/skos/core#"
-                  },
-                  "@graph": [
-                    {
-                      "@id": "ex:Material1",
-                      "@type": "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94",
-                      "skos:prefLabel": "Material Name"
-                    },
-                    ...
-                  ]
-                }
-                
-                Use these entity types:
-                - Material: emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94
-                - Manufacturing: emmo:EMMO_a4d66059_5dd3_4b90_b4cb_10960559441b
-                - Measurement: emmo:EMMO_463bcfda_867b_41d9_a967_211d4d437cfb
-                - Property: emmo:EMMO_b7bcff25_ffc3_474e_9ab5_01b1664bd4ba
-                - Parameter: emmo:EMMO_d1d436e7_72fc_49cd_863b_7bfb4ba5276a
-                
-                And these relationship types:
-                - is_manufacturing_input: emmo:EMMO_e1097637
-                - has_manufacturing_output: emmo:EMMO_e1245987
-                - is_measurement_input: emmo:EMMO_m5677989
-                - has_measurement_output: emmo:EMMO_m87987545
-                - has_property: emmo:EMMO_p5778r78
-                - has_parameter: emmo:EMMO_p46903ar7
-                """
-                json_prompt = simplified_prompt
-            
-            # Pass condensed data directly
-            json_ld_prompt = (
-                json_prompt + "\n\nDATA (START)\n\nEntities: " + entities + "\nRelationships: " + relationships + "\nDATA (END)"
-            )
-            
-            # For Groq API, make explicit request for JSON in the prompt
-            if api_choice == "Groq API":
-                json_ld_prompt += "\n\nReturn ONLY the JSON-LD object with no explanations or markdown formatting."
+            json_ld_prompt = self.build_prompt(entities, relationships, json_prompt, api_choice)
+            if stream:
+                response = self.stream_response(
+                    json_ld_prompt, api_choice, api_key, model, partial_graph_callback, use_cache=use_cache
+                )
             else:
-                json_ld_prompt += "\n\nRespond with only the JSON-LD object. No other text."
-            
-            response = unified_api_call(api_choice, json_ld_prompt, api_key, model)
+                response = unified_api_call(
+                    api_choice, json_ld_prompt, api_key, model, use_cache=use_cache, stage="json_ld"
+                )
             
             if status_callback:
                 status_callback("Validating JSON-LD...")
             
             # Try to parse the JSON-LD from the response
             try:
-                # Extract and validate JSON from the response
-                json_data = extract_json_from_text(response)
+                parsed = self.parse_response(response)
                 
-                if json_data and validate_knowledge_graph_json(json_data):
-                    nodes, links = extract_graph_data(json_data)
+                if parsed:
+                    json_data, graph_store = parsed
+                    nodes, links = graph_store.to_echarts()
                     
                     if progress_callback:
                         progress_callback(1.0)
@@ -283,6 +462,7 @@ class JSONGenerationAgent(Agent):
                         "json_ld": json_data,
                         "nodes": nodes,
                         "links": links,
+                        "graph_store": graph_store,
                         "message": "JSON-LD generation complete"
                     }
                 else:
@@ -304,6 +484,80 @@ class JSONGenerationAgent(Agent):
                 "message": f"Error generating JSON-LD: {str(e)}"
             }
 
+    def execute_sharded(self, shards, json_prompt, api_choice, api_key, model, **kwargs):
+        """Generate JSON-LD for each shard in parallel and merge the fragments locally.
+        
+        Each request covers one shard's entities and their relationships,
+        with the @id of every entity fixed up front, so no single
+        completion has to hold the whole graph. A shard whose response
+        cannot be parsed is reported in the result's "shards" entry; the
+        graph is built from the others.
+        """
+        progress_callback = kwargs.get('progress_callback', None)
+        status_callback = kwargs.get('status_callback', None)
+        partial_graph_callback = kwargs.get('partial_graph_callback', None)
+        max_concurrency = kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        use_cache = kwargs.get('use_cache', True)
+        
+        if status_callback:
+            status_callback(f"Generating JSON-LD in {len(shards)} parts...")
+        if progress_callback:
+            progress_callback(0.85)
+        
+        def generate(shard):
+            prompt = self.build_prompt(
+                shard["entities"], shard["relationships"], json_prompt, api_choice, shard_instructions(shard)
+            )
+            try:
+                response = unified_api_call(api_choice, prompt, api_key, model, use_cache=use_cache, stage="json_ld")
+                # A completion without content counts as a failed part
+                return extract_json_from_text(response) if response else None
+            except Exception:
+                return None
+        
+        # Fragments are previewed as they arrive, without waiting for the merge
+        preview_store = GraphStore()
+        completed = 0
+        
+        def on_result(index, fragment):
+            nonlocal completed
+            completed += 1
+            if progress_callback:
+                progress_callback(0.85 + 0.15 * completed / len(shards))
+            if partial_graph_callback and isinstance(fragment, dict) and isinstance(fragment.get("@graph"), list):
+                preview_store.add_items(fragment["@graph"])
+                partial_graph_callback(*preview_store.to_echarts())
+        
+        fragments = map_in_order(generate, shards, max_concurrency, on_result)
+        failed = [
+            index for index, fragment in enumerate(fragments)
+            if not isinstance(fragment, dict) or not isinstance(fragment.get("@graph"), list)
+        ]
+        json_data = merge_fragments(fragments, shards)
+        if not validate_knowledge_graph_json(json_data):
+            return {
+                "success": False,
+                "json_ld": None,
+                "message": f"Invalid JSON-LD was generated ({len(failed)} of {len(shards)} parts failed)"
+            }
+        
+        graph_store = GraphStore.from_json_ld(json_data)
+        nodes, links = graph_store.to_echarts()
+        if status_callback:
+            status_callback("JSON-LD generation complete!")
+        message = "JSON-LD generation complete"
+        if failed:
+            message += f" ({len(failed)} of {len(shards)} parts could not be parsed)"
+        return {
+            "success": True,
+            "json_ld": json_data,
+            "nodes": nodes,
+            "links": links,
+            "graph_store": graph_store,
+            "shards": {"count": len(shards), "failed": failed},
+            "message": message
+        }
+
 class WorkflowManager:
     """Manager to coordinate the agents in the extraction workflow."""
     def __init__(self):
@@ -312,6 +566,321 @@ class WorkflowManager:
         self.relationship_agent = RelationshipExtractionAgent()
         self.json_agent = JSONGenerationAgent()
     
+    def extract_pipelined(self, chunks, entity_prompt, relationship_prompt, api_choice, api_key, model, **kwargs):
+        """Extract entities and relationships with the two stages overlapped.
+        
+        Relationship extraction for a chunk is scheduled as soon as that chunk's
+        entities are available, using its own entities followed by the other
+        entities extracted so far (only those mentioned in the chunk, unless
+        prune_entities is False). Each condense (or, in structured mode, local
+        merge) step runs in the background once its per-chunk outputs are
+        complete, so wall-clock time tracks the slowest chunk rather than the
+        sum of the stages.
+        
+        chunks may be any iterable, including a lazy generator; it is consumed
+        once, and only a bounded window of chunk texts is held at a time.
+        """
+        progress_callback = kwargs.get('progress_callback', None)
+        status_callback = kwargs.get('status_callback', None)
+        max_concurrency = max(1, int(kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY) or 1))
+        fan_in = kwargs.get('fan_in', DEFAULT_FAN_IN)
+        structured = kwargs.get('structured', False)
+        prune_entities = kwargs.get('prune_entities', True)
+        use_cache = kwargs.get('use_cache', True)
+        # Chunk texts waiting on either stage; bounds memory for streamed documents
+        max_in_flight = 2 * max_concurrency
+        
+        entity_prompt = self.entity_agent.resolve_prompt(entity_prompt, api_choice, structured)
+        relationship_prompt = self.relationship_agent.resolve_prompt(relationship_prompt, api_choice, structured)
+        
+        def combine_entities(outputs):
+            if structured:
+                return self.entity_agent.merge(outputs)
+            condensed = self.entity_agent.condense(
+                outputs, api_choice, api_key, model,
+                fan_in=fan_in, max_concurrency=max_concurrency, use_cache=use_cache
+            )
+            return condensed, None
+        
+        def combine_relationships(outputs, entity_future):
+            if structured:
+                return self.relationship_agent.merge(outputs, entity_future.result()[1])
+            condensed = self.relationship_agent.condense(
+                outputs, api_choice, api_key, model,
+                fan_in=fan_in, max_concurrency=max_concurrency, use_cache=use_cache
+            )
+            return condensed, None
+        
+        chunk_iter = enumerate(chunks)
+        chunk_texts = {}
+        chunk_entities = {}
+        chunk_entity_records = {}
+        chunk_entries = {}
+        chunk_relationships = {}
+        # Names of the entities extracted so far, mapped to (chunk index, entry position)
+        mention_index = MentionIndex()
+        pending = {}
+        stage = "entity_extraction"
+        exhausted = False
+        entity_condense = None
+        
+        if status_callback:
+            status_callback("Extracting entities and relationships...")
+        
+        # Condense calls get their own worker so they never wait behind chunk calls
+        with ContextThreadPoolExecutor(max_workers=max_concurrency) as executor, \
+                ContextThreadPoolExecutor(max_workers=2) as condense_executor:
+            
+            def submit_next_chunk():
+                try:
+                    index, chunk = next(chunk_iter)
+                except StopIteration:
+                    return False
+                chunk_texts[index] = chunk
+                future = executor.submit(
+                    self.entity_agent.extract_chunk, chunk, entity_prompt, api_choice, api_key, model, use_cache
+                )
+                pending[future] = ("entity", index)
+                return True
+            
+            try:
+                # Keep at most max_concurrency entity calls queued ahead of the relationship calls
+                while len(pending) < max_concurrency and submit_next_chunk():
+                    pass
+                exhausted = len(pending) < max_concurrency
+                
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        kind, index = pending.pop(future)
+                        if kind == "entity":
+                            stage = "entity_extraction"
+                            chunk_entities[index] = future.result()
+                            chunk_text = chunk_texts.pop(index)
+                            if structured:
+                                chunk_entity_records[index] = parse_entity_records(chunk_entities[index])
+                            if prune_entities:
+                                # The chunk's own entities, then the earlier ones it mentions
+                                mentioned = sorted(mention_index.find(chunk_text))
+                                if structured:
+                                    own = chunk_entity_records[index]
+                                    others = [chunk_entity_records[i][position] for i, position in mentioned]
+                                    known_entities = format_entities(merge_entities([own, others]))
+                                    for position, record in enumerate(own):
+                                        mention_index.add(record.name, (index, position))
+                                else:
+                                    chunk_entries[index] = parse_entity_entries(chunk_entities[index])
+                                    others = format_entity_entries(chunk_entries[i][position] for i, position in mentioned)
+                                    known_entities = "\n".join(part for part in (chunk_entities[index], others) if part)
+                                    for position, (_, _, names) in enumerate(chunk_entries[index]):
+                                        for name in names:
+                                            mention_index.add(name, (index, position))
+                            else:
+                                # The chunk's own entities come first, then the global set so far
+                                order = [index] + [i for i in sorted(chunk_entities) if i != index]
+                                if structured:
+                                    known_entities = format_entities(
+                                        merge_entities(chunk_entity_records[i] for i in order)
+                                    )
+                                else:
+                                    known_entities = "\n".join(chunk_entities[i] for i in order if chunk_entities[i])
+                            rel_future = executor.submit(
+                                self.relationship_agent.extract_chunk,
+                                chunk_text, known_entities,
+                                relationship_prompt, api_choice, api_key, model, use_cache
+                            )
+                            pending[rel_future] = ("relationship", index)
+                        else:
+                            stage = "relationship_extraction"
+                            chunk_relationships[index] = future.result()
+                    
+                    # Pull more chunks only while the in-flight window has room
+                    while not exhausted and len(pending) < max_in_flight and \
+                            sum(kind == "entity" for kind, _ in pending.values()) < max_concurrency:
+                        exhausted = not submit_next_chunk()
+                    
+                    total_chunks = len(chunk_entities) + len(chunk_texts)
+                    if progress_callback and exhausted and total_chunks:
+                        # Both per-chunk stages share the 0.0 - 0.6 progress range
+                        done_calls = len(chunk_entities) + len(chunk_relationships)
+                        progress_callback(min(0.6, done_calls / (2 * total_chunks) * 0.6))
+                    if status_callback:
+                        status_callback(
+                            f"Extracted entities from {len(chunk_entities)} and relationships from "
+                            f"{len(chunk_relationships)} chunks..."
+                        )
+                    
+                    # Entity condensing overlaps the remaining relationship calls
+                    if exhausted and not chunk_texts and entity_condense is None:
+                        all_entities = [chunk_entities[i] for i in sorted(chunk_entities) if chunk_entities[i]]
+                        entity_condense = condense_executor.submit(combine_entities, all_entities)
+            except Exception as e:
+                for future in pending:
+                    future.cancel()
+                return {
+                    "success": False,
+                    "message": f"Error in pipelined extraction: {str(e)}",
+                    "stage": stage
+                }
+            
+            if entity_condense is None:
+                entity_condense = condense_executor.submit(combine_entities, [])
+            
+            if status_callback:
+                status_callback("Combining entity and relationship results...")
+            all_relationships = [chunk_relationships[i] for i in sorted(chunk_relationships) if chunk_relationships[i]]
+            relationship_condense = condense_executor.submit(
+                combine_relationships, all_relationships, entity_condense
+            )
+            
+            try:
+                stage = "entity_extraction"
+                entities, entity_records = entity_condense.result()
+                stage = "relationship_extraction"
+                relationships, relationship_records = relationship_condense.result()
+            except Exception as e:
+                return {
+                    "success": False,
+                    "message": f"Error condensing results: {str(e)}",
+                    "stage": stage
+                }
+        
+        if progress_callback:
+            progress_callback(0.8)
+        
+        if not entities:
+            return {"success": False, "message": "No entities were extracted", "stage": "entity_extraction"}
+        if not relationships:
+            return {"success": False, "message": "No relationships were extracted", "stage": "relationship_extraction"}
+        
+        return {
+            "success": True,
+            "entities": entities,
+            "relationships": relationships,
+            "entity_records": entity_records,
+            "relationship_records": relationship_records,
+            "message": "Pipelined extraction complete",
+            "stage": "relationship_extraction"
+        }
+    
+    def extract_incremental(self, chunks, entity_prompt, relationship_prompt, api_choice, api_key, model, manifest, **kwargs):
+        """Extract entities and relationships, reusing manifest results for unchanged chunks.
+        
+        Only chunks whose text (or prompt) changed since the manifest was saved
+        are sent to the model. Relationships are extracted against the chunk's
+        own entities, so an edit elsewhere in the document does not invalidate
+        them. Extraction is always structured and the per-chunk records are
+        merged locally: a condense tree groups its inputs by position, so one
+        inserted chunk would change every later condense request.
+        
+        Only this extraction is incremental. The JSON-LD stage that follows is
+        not in the manifest and is regenerated in full (every shard, with
+        json_shard_size) whenever the merged lists change; only unchanged
+        lists are answered from the response cache.
+        """
+        progress_callback = kwargs.get('progress_callback', None)
+        status_callback = kwargs.get('status_callback', None)
+        max_concurrency = kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        use_cache = kwargs.get('use_cache', True)
+        
+        entity_prompt = self.entity_agent.resolve_prompt(entity_prompt, api_choice, structured=True)
+        relationship_prompt = self.relationship_agent.resolve_prompt(relationship_prompt, api_choice, structured=True)
+        chunks = list(chunks)
+        stage = "entity_extraction"
+        
+        try:
+            # Step 1: Entities for new or changed chunks only
+            entity_keys = [manifest.entity_key(chunk, entity_prompt, api_choice, model) for chunk in chunks]
+            chunk_entities = [manifest.get("entities", key) for key in entity_keys]
+            missing = [index for index, entities in enumerate(chunk_entities) if entities is None]
+            if status_callback:
+                status_callback(f"Extracting entities from {len(missing)} new or changed of {len(chunks)} chunks...")
+            
+            def on_entities(position, response):
+                index = missing[position]
+                chunk_entities[index] = response
+                manifest.set("entities", entity_keys[index], response)
+                if progress_callback:
+                    progress_callback(min(0.2, (position + 1) / len(missing) * 0.2))
+            
+            map_in_order(
+                lambda index: self.entity_agent.extract_chunk(
+                    chunks[index], entity_prompt, api_choice, api_key, model, use_cache
+                ),
+                missing, max_concurrency, on_entities
+            )
+            
+            # Step 2: Relationships, keyed on the chunk and its entity context
+            stage = "relationship_extraction"
+            contexts = [format_entities(parse_entity_records(entities)) for entities in chunk_entities]
+            relationship_keys = [
+                manifest.relationship_key(chunk, context, relationship_prompt, api_choice, model)
+                for chunk, context in zip(chunks, contexts)
+            ]
+            chunk_relationships = [manifest.get("relationships", key) for key in relationship_keys]
+            missing = [index for index, relationships in enumerate(chunk_relationships) if relationships is None]
+            if status_callback:
+                status_callback(f"Extracting relationships from {len(missing)} new or changed of {len(chunks)} chunks...")
+            
+            def on_relationships(position, response):
+                index = missing[position]
+                chunk_relationships[index] = response
+                manifest.set("relationships", relationship_keys[index], response)
+                if progress_callback:
+                    progress_callback(min(0.6, 0.4 + (position + 1) / len(missing) * 0.2))
+            
+            map_in_order(
+                lambda index: self.relationship_agent.extract_chunk(
+                    chunks[index], contexts[index], relationship_prompt, api_choice, api_key, model, use_cache
+                ),
+                missing, max_concurrency, on_relationships
+            )
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error in incremental extraction: {str(e)}",
+                "stage": stage
+            }
+        finally:
+            # Keep whatever was extracted so an interrupted run can resume
+            manifest.save()
+        
+        all_entities = [entities for entities in chunk_entities if entities]
+        all_relationships = [relationships for relationships in chunk_relationships if relationships]
+        try:
+            stage = "entity_extraction"
+            if status_callback:
+                status_callback("Merging entity and relationship results...")
+            entities, entity_records = self.entity_agent.merge(all_entities)
+            stage = "relationship_extraction"
+            relationships, relationship_records = self.relationship_agent.merge(all_relationships, entity_records)
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error merging results: {str(e)}",
+                "stage": stage
+            }
+        
+        if progress_callback:
+            progress_callback(0.8)
+        
+        if not entities:
+            return {"success": False, "message": "No entities were extracted", "stage": "entity_extraction"}
+        if not relationships:
+            return {"success": False, "message": "No relationships were extracted", "stage": "relationship_extraction"}
+        
+        return {
+            "success": True,
+            "entities": entities,
+            "relationships": relationships,
+            "entity_records": entity_records,
+            "relationship_records": relationship_records,
+            "incremental": manifest.stats(),
+            "message": "Incremental extraction complete",
+            "stage": "relationship_extraction"
+        }
+    
+    @with_token_ledger
     def process_pdf(self, 
                    pdf_content, 
                    entity_prompt,
@@ -322,10 +891,44 @@ class WorkflowManager:
                    model, 
                    hide_units_and_literals=False, 
                    progress_callback=None, 
-                   status_callback=None):
-        """Run the complete workflow to process a PDF into a knowledge graph."""
-        # Step 1: Chunk the PDF
-        chunking_result = self.chunking_agent.execute(pdf_content, api_choice)
+                   status_callback=None,
+                   max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                   pipelined=False,
+                   fan_in=DEFAULT_FAN_IN,
+                   max_chunk_tokens=None,
+                   structured=False,
+                   stream_json=False,
+                   partial_graph_callback=None,
+                   document_id=None,
+                   relevance_threshold=None,
+                   prune_entities=True,
+                   entity_neighbors=0,
+                   json_shard_size=None,
+                   use_cache=True):
+        """Run the complete workflow to process a PDF into a knowledge graph.
+        
+        When document_id is given, per-chunk results are kept in that
+        document's manifest and a revised upload only sends its new or
+        changed chunks to the model; extraction is then always structured. When relevance_threshold is given,
+        chunks the local relevance scorer rates below it are skipped.
+        prune_entities and entity_neighbors control which entities are
+        listed in each chunk's relationship prompt. With json_shard_size,
+        JSON-LD is generated for that many entities per request, in
+        parallel, and merged locally. use_cache=False sends every request
+        to the model instead of answering it from the response cache.
+        """
+        if document_id is not None:
+            # Incremental runs merge per-chunk records locally, see extract_incremental
+            structured = True
+        
+        # Step 1: Chunk the PDF so that both extraction requests of a chunk fit
+        extraction_prompt, chunk_tokens = self.plan_extraction_budget(
+            entity_prompt, relationship_prompt, api_choice, model, structured, max_chunk_tokens
+        )
+        chunking_result = self.chunking_agent.execute(
+            pdf_content, api_choice, model, extraction_prompt, chunk_tokens,
+            content_defined=document_id is not None
+        )
         if not chunking_result["success"]:
             return {
                 "success": False,
@@ -334,42 +937,267 @@ class WorkflowManager:
             }
         
         chunks = chunking_result["chunks"]
+        incremental_stats = None
+        
+        relevance = None
+        if relevance_threshold is not None:
+            decisions = []
+            scorer = RelevanceScorer(entity_prompt, relevance_threshold)
+            chunks = list(scorer.filter(chunks, decisions))
+            relevance = relevance_summary(decisions, relevance_threshold)
+            if status_callback:
+                status_callback(f"Skipping {relevance['skipped']} of {len(decisions)} chunks without likely entities...")
+        
+        if document_id is not None:
+            # Steps 2 and 3 for changed chunks only; unchanged ones come from the manifest
+            incremental_result = self.extract_incremental(
+                chunks, entity_prompt, relationship_prompt, api_choice, api_key, model,
+                ExtractionManifest(document_id),
+                progress_callback=progress_callback,
+                status_callback=status_callback,
+                max_concurrency=max_concurrency,
+                use_cache=use_cache
+            )
+            if not incremental_result["success"]:
+                return {
+                    "success": False,
+                    "message": incremental_result["message"],
+                    "stage": incremental_result["stage"]
+                }
+            
+            entities = incremental_result["entities"]
+            relationships = incremental_result["relationships"]
+            entity_records = incremental_result["entity_records"]
+            relationship_records = incremental_result["relationship_records"]
+            incremental_stats = incremental_result["incremental"]
+        elif pipelined:
+            # Steps 2 and 3 overlap: relationships start as soon as a chunk's entities exist
+            pipeline_result = self.extract_pipelined(
+                chunks, entity_prompt, relationship_prompt, api_choice, api_key, model,
+                progress_callback=progress_callback,
+                status_callback=status_callback,
+                max_concurrency=max_concurrency,
+                fan_in=fan_in,
+                structured=structured,
+                prune_entities=prune_entities,
+                use_cache=use_cache
+            )
+            if not pipeline_result["success"]:
+                return {
+                    "success": False,
+                    "message": pipeline_result["message"],
+                    "stage": pipeline_result["stage"]
+                }
+            
+            entities = pipeline_result["entities"]
+            relationships = pipeline_result["relationships"]
+            entity_records = pipeline_result["entity_records"]
+            relationship_records = pipeline_result["relationship_records"]
+        else:
+            # Step 2: Extract entities
+            entity_result = self.entity_agent.execute(
+                chunks, entity_prompt, api_choice, api_key, model,
+                progress_callback=progress_callback,
+                status_callback=status_callback,
+                max_concurrency=max_concurrency,
+                fan_in=fan_in,
+                structured=structured,
+                use_cache=use_cache
+            )
+            if not entity_result["success"]:
+                return {
+                    "success": False,
+                    "message": entity_result["message"],
+                    "stage": "entity_extraction"
+                }
+            
+            entities = entity_result["entities"]
+            entity_records = entity_result["entity_records"]
+            
+            # Step 3: Extract relationships
+            relationship_result = self.relationship_agent.execute(
+                chunks, entities, relationship_prompt, api_choice, api_key, model,
+                progress_callback=progress_callback,
+                status_callback=status_callback,
+                max_concurrency=max_concurrency,
+                fan_in=fan_in,
+                structured=structured,
+                entity_records=entity_records,
+                prune_entities=prune_entities,
+                entity_neighbors=entity_neighbors,
+                use_cache=use_cache
+            )
+            if not relationship_result["success"]:
+                return {
+                    "success": False,
+                    "message": relationship_result["message"],
+                    "stage": "relationship_extraction"
+                }
+            
+            relationships = relationship_result["relationships"]
+            relationship_records = relationship_result["relationship_records"]
         
-        # Step 2: Extract entities
-        entity_result = self.entity_agent.execute(
-            chunks, entity_prompt, api_choice, api_key, model,
+        # Step 4: Generate JSON-LD
+        result = self.build_knowledge_graph(
+            entities, relationships, entity_records, relationship_records,
+            json_prompt, api_choice, api_key, model,
+            hide_units_and_literals=hide_units_and_literals,
             progress_callback=progress_callback,
-            status_callback=status_callback
+            status_callback=status_callback,
+            stream_json=stream_json,
+            partial_graph_callback=partial_graph_callback,
+            json_shard_size=json_shard_size,
+            max_concurrency=max_concurrency,
+            use_cache=use_cache
         )
-        if not entity_result["success"]:
-            return {
-                "success": False,
-                "message": entity_result["message"],
-                "stage": "entity_extraction"
-            }
+        if incremental_stats is not None:
+            result["incremental"] = incremental_stats
+        if relevance is not None:
+            result["relevance"] = relevance
+        result["token_usage"] = self.token_report(
+            entity_prompt, relationship_prompt, json_prompt, api_choice, model, structured
+        )
+        return result
+    
+    @with_token_ledger
+    def process_pdf_stream(self,
+                   pdf_file,
+                   entity_prompt,
+                   relationship_prompt,
+                   json_prompt,
+                   api_choice,
+                   api_key,
+                   model,
+                   hide_units_and_literals=False,
+                   progress_callback=None,
+                   status_callback=None,
+                   max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                   fan_in=DEFAULT_FAN_IN,
+                   max_chunk_tokens=None,
+                   structured=False,
+                   stream_json=False,
+                   partial_graph_callback=None,
+                   file_type=None,
+                   clean=False,
+                   relevance_threshold=None,
+                   prune_entities=True,
+                   json_shard_size=None,
+                   use_cache=True):
+        """Process a PDF or TXT file into a knowledge graph without loading its full text.
         
-        entities = entity_result["entities"]
+        PDF pages are parsed (TXT files decoded block by block), split into
+        paragraphs and packed into chunks lazily, and each chunk goes to the
+        pipelined extraction as soon as it is ready, so memory stays bounded
+        by the in-flight window however large the document is. file_type
+        defaults to the file's extension. With clean, running headers, page
+        numbers and back matter are stripped from PDF pages before chunking.
+        With relevance_threshold, low-scoring chunks are skipped as they
+        are produced. json_shard_size and use_cache work as in
+        process_pdf.
+        """
+        extraction_prompt, chunk_tokens = self.plan_extraction_budget(
+            entity_prompt, relationship_prompt, api_choice, model, structured, max_chunk_tokens
+        )
+        cleaning_report = {}
+        chunks = (
+            chunk.text
+            for chunk in iter_document_chunks(
+                pdf_file, model, extraction_prompt, api_choice, chunk_tokens, file_type,
+                clean, cleaning_report
+            )
+        )
+        decisions = []
+        if relevance_threshold is not None:
+            chunks = RelevanceScorer(entity_prompt, relevance_threshold).filter(chunks, decisions)
         
-        # Step 3: Extract relationships
-        relationship_result = self.relationship_agent.execute(
-            chunks, entities, relationship_prompt, api_choice, api_key, model,
+        pipeline_result = self.extract_pipelined(
+            chunks, entity_prompt, relationship_prompt, api_choice, api_key, model,
             progress_callback=progress_callback,
-            status_callback=status_callback
+            status_callback=status_callback,
+            max_concurrency=max_concurrency,
+            fan_in=fan_in,
+            structured=structured,
+            prune_entities=prune_entities,
+            use_cache=use_cache
         )
-        if not relationship_result["success"]:
+        if not pipeline_result["success"]:
             return {
                 "success": False,
-                "message": relationship_result["message"],
-                "stage": "relationship_extraction"
+                "message": pipeline_result["message"],
+                "stage": pipeline_result["stage"]
             }
         
-        relationships = relationship_result["relationships"]
+        result = self.build_knowledge_graph(
+            pipeline_result["entities"], pipeline_result["relationships"],
+            pipeline_result["entity_records"], pipeline_result["relationship_records"],
+            json_prompt, api_choice, api_key, model,
+            hide_units_and_literals=hide_units_and_literals,
+            progress_callback=progress_callback,
+            status_callback=status_callback,
+            stream_json=stream_json,
+            partial_graph_callback=partial_graph_callback,
+            json_shard_size=json_shard_size,
+            max_concurrency=max_concurrency,
+            use_cache=use_cache
+        )
+        if cleaning_report:
+            result["cleaning"] = cleaning_report
+        if relevance_threshold is not None:
+            result["relevance"] = relevance_summary(decisions, relevance_threshold)
+        result["token_usage"] = self.token_report(
+            entity_prompt, relationship_prompt, json_prompt, api_choice, model, structured
+        )
+        return result
+    
+    def plan_extraction_budget(self, entity_prompt, relationship_prompt, api_choice, model, structured=False,
+                               max_chunk_tokens=None):
+        """Return the larger resolved extraction prompt and the chunk budget of both extraction stages."""
+        entity_instructions = self.entity_agent.resolve_prompt(entity_prompt, api_choice, structured)
+        relationship_instructions = self.relationship_agent.resolve_prompt(relationship_prompt, api_choice, structured)
+        chunk_tokens = get_extraction_token_budget(
+            model, entity_instructions, relationship_instructions, api_choice, max_chunk_tokens
+        )
+        return max(entity_instructions, relationship_instructions, key=len), chunk_tokens
+    
+    def token_report(self, entity_prompt, relationship_prompt, json_prompt, api_choice, model, structured=False):
+        """Return the tokens used per stage since the run started.
+        
+        instruction_tokens gives the fixed instruction size each entity,
+        relationship and JSON-LD call carries on top of its chunk or lists.
+        """
+        report = get_token_ledger().report()
+        report["instruction_tokens"] = {
+            "entity": count_tokens(self.entity_agent.resolve_prompt(entity_prompt, api_choice, structured), model),
+            "relationship": count_tokens(
+                self.relationship_agent.resolve_prompt(relationship_prompt, api_choice, structured), model
+            ),
+            "json_ld": count_tokens(self.json_agent.build_prompt("", "", json_prompt, api_choice), model)
+        }
+        return report
+    
+    def build_knowledge_graph(self, entities, relationships, entity_records, relationship_records,
+                              json_prompt, api_choice, api_key, model, **kwargs):
+        """Generate the JSON-LD graph from extracted results and assemble the workflow result."""
+        hide_units_and_literals = kwargs.get('hide_units_and_literals', False)
+        progress_callback = kwargs.get('progress_callback', None)
+        status_callback = kwargs.get('status_callback', None)
+        stream_json = kwargs.get('stream_json', False)
+        partial_graph_callback = kwargs.get('partial_graph_callback', None)
+        json_shard_size = kwargs.get('json_shard_size', None)
+        max_concurrency = kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        use_cache = kwargs.get('use_cache', True)
         
-        # Step 4: Generate JSON-LD
         json_result = self.json_agent.execute(
             entities, relationships, json_prompt, api_choice, api_key, model,
             progress_callback=progress_callback,
-            status_callback=status_callback
+            status_callback=status_callback,
+            stream=stream_json,
+            partial_graph_callback=partial_graph_callback,
+            shard_size=json_shard_size,
+            max_concurrency=max_concurrency,
+            use_cache=use_cache,
+            entity_records=entity_records,
+            relationship_records=relationship_records
         )
         if not json_result["success"]:
             return {
@@ -378,20 +1206,146 @@ class WorkflowManager:
                 "stage": "json_generation"
             }
         
-        # Extract nodes and links with hide_units_and_literals option
-        if hide_units_and_literals:
-            nodes, links = extract_graph_data(json_result["json_ld"], hide_units_and_literals)
-        else:
-            nodes, links = json_result["nodes"], json_result["links"]
+        # The hide_units_and_literals view is a mask over the graph the JSON agent already built
+        nodes, links = json_result["graph_store"].to_echarts(hide_units_and_literals)
         
         # Return the successful result
-        return {
+        result = {
             "success": True,
             "message": "PDF processed successfully",
             "knowledge_graph": json_result["json_ld"],
             "nodes": nodes,
             "links": links,
+            "graph_store": json_result["graph_store"],
             "entities": entities,
             "relationships": relationships,
+            "entity_records": entity_records,
+            "relationship_records": relationship_records,
             "stage": "complete"
-        }
\ No newline at end of file
+        }
+        if "shards" in json_result:
+            result["json_shards"] = json_result["shards"]
+        return result
+
+class BatchWorkflowManager:
+    """Manager that runs the extraction workflow for a whole corpus as batch jobs.
+    
+    Each stage writes the requests of every document into JSONL job files,
+    submits them through the backend, waits for the results and maps them
+    back to document and chunk ids before the next stage is built. Per-chunk
+    results are merged locally in structured mode, since batch jobs cannot
+    run the interactive condense steps.
+    """
+    def __init__(self, backend, work_dir, poll_interval=30.0, timeout=None):
+        self.backend = backend
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.chunking_agent = PDFChunkingAgent()
+        self.entity_agent = EntityExtractionAgent()
+        self.relationship_agent = RelationshipExtractionAgent()
+        self.json_agent = JSONGenerationAgent()
+    
+    def _run_stage(self, stage, requests, run_dir):
+        """Run one stage's requests and group the responses by document and chunk."""
+        responses = run_batch(
+            requests, self.backend, run_dir, prefix=stage,
+            poll_interval=self.poll_interval, timeout=self.timeout
+        )
+        by_document = {}
+        for custom_id, content in responses.items():
+            document_id, _, chunk_index = parse_custom_id(custom_id)
+            by_document.setdefault(document_id, {})[chunk_index] = content or ""
+        return by_document
+    
+    def process_corpus(self, documents, entity_prompt, relationship_prompt, json_prompt,
+                       api_choice, model, max_chunk_tokens=None, status_callback=None):
+        """Process a dict of document id -> text and return a result dict per document."""
+        run_dir = os.path.join(self.work_dir, time.strftime("%Y%m%d-%H%M%S"))
+        entity_prompt = self.entity_agent.resolve_prompt(entity_prompt, api_choice, structured=True)
+        relationship_prompt = self.relationship_agent.resolve_prompt(relationship_prompt, api_choice, structured=True)
+        results = {}
+        
+        # Stage 1: chunk every document, sized for both extraction stages
+        chunk_tokens = get_extraction_token_budget(
+            model, entity_prompt, relationship_prompt, api_choice, max_chunk_tokens
+        )
+        plans = {}
+        for document_id, text in documents.items():
+            chunking_result = self.chunking_agent.execute(
+                text, api_choice, model, max(entity_prompt, relationship_prompt, key=len), chunk_tokens
+            )
+            if chunking_result["success"]:
+                plans[document_id] = chunking_result["chunks"]
+            else:
+                results[document_id] = {"success": False, "message": chunking_result["message"], "stage": "chunking"}
+        
+        # Stage 2: entities for every chunk of every document
+        if status_callback:
+            status_callback(f"Submitting entity extraction for {len(plans)} documents...")
+        entity_outputs = self._run_stage("entities", (
+            build_batch_request(make_custom_id(document_id, "entities", index), model,
+                                entity_prompt + f"\n\nText: {chunk}")
+            for document_id, plan in plans.items()
+            for index, chunk in enumerate(plan)
+        ), run_dir)
+        merged_entities = {}
+        for document_id, plan in plans.items():
+            outputs = entity_outputs.get(document_id, {})
+            entities, entity_records = self.entity_agent.merge(outputs[i] for i in sorted(outputs))
+            if entities:
+                merged_entities[document_id] = (entities, entity_records)
+            else:
+                results[document_id] = {"success": False, "message": "No entities were extracted", "stage": "entity_extraction"}
+        
+        # Stage 3: relationships for every chunk, given the document's merged entities
+        if status_callback:
+            status_callback(f"Submitting relationship extraction for {len(merged_entities)} documents...")
+        relationship_outputs = self._run_stage("relationships", (
+            build_batch_request(make_custom_id(document_id, "relationships", index), model,
+                                relationship_prompt + f"\n\nText: {chunk}\nEntities: {merged_entities[document_id][0]}")
+            for document_id, plan in plans.items() if document_id in merged_entities
+            for index, chunk in enumerate(plan)
+        ), run_dir)
+        merged_relationships = {}
+        for document_id, (entities, entity_records) in merged_entities.items():
+            outputs = relationship_outputs.get(document_id, {})
+            relationships, relationship_records = self.relationship_agent.merge(
+                (outputs[i] for i in sorted(outputs)), entity_records
+            )
+            if relationships:
+                merged_relationships[document_id] = (relationships, relationship_records)
+            else:
+                results[document_id] = {"success": False, "message": "No relationships were extracted", "stage": "relationship_extraction"}
+        
+        # Stage 4: one JSON-LD request per document
+        if status_callback:
+            status_callback(f"Submitting JSON-LD generation for {len(merged_relationships)} documents...")
+        json_outputs = self._run_stage("json_ld", (
+            build_batch_request(make_custom_id(document_id, "json_ld", 0), model,
+                                self.json_agent.build_prompt(merged_entities[document_id][0], relationships, json_prompt, api_choice))
+            for document_id, (relationships, _) in merged_relationships.items()
+        ), run_dir)
+        for document_id, (relationships, relationship_records) in merged_relationships.items():
+            entities, entity_records = merged_entities[document_id]
+            parsed = self.json_agent.parse_response(json_outputs.get(document_id, {}).get(0, ""))
+            if not parsed:
+                results[document_id] = {"success": False, "message": "Invalid JSON-LD was generated", "stage": "json_generation"}
+                continue
+            json_data, graph_store = parsed
+            nodes, links = graph_store.to_echarts()
+            results[document_id] = {
+                "success": True,
+                "message": "Document processed successfully",
+                "knowledge_graph": json_data,
+                "nodes": nodes,
+                "links": links,
+                "graph_store": graph_store,
+                "entities": entities,
+                "relationships": relationships,
+                "entity_records": entity_records,
+                "relationship_records": relationship_records,
+                "stage": "complete"
+            }
+        
+        return results
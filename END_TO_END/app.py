@@ -5,10 +5,18 @@ import time
 from streamlit_echarts import st_echarts
 
 # Import utility modules
-from utils.pdf_processor import extract_text_from_pdf, extract_text_from_txt, chunk_text, process_in_chunks, read_prompt_file
-from utils.api_clients import truncate_conversation, unified_api_call
-from utils.graph_utils import extract_graph_data, create_echarts_option
+from utils.pdf_processor import (
+    extract_pages_from_pdf, extract_text_from_txt, join_pages, clean_pages, clean_text, chunk_text, read_prompt_file,
+    DEFAULT_MAX_CHUNK_TOKENS
+)
+from utils.api_clients import client_settings, configure_clients, truncate_conversation, unified_api_call
+from utils.graph_utils import create_echarts_option
 from utils.json_validator import read_json_ld, validate_knowledge_graph_json, extract_json_from_text
+from utils.response_cache import get_response_cache
+from utils.resources import missing_resources
+from utils.prompts import DEFAULT_ENTITY_PROMPT, DEFAULT_RELATIONSHIP_PROMPT, DEFAULT_JSON_PROMPT
+from utils.relevance import DEFAULT_RELEVANCE_THRESHOLD
+from utils.rate_limiter import configure_rate_limit, get_rate_limits
 
 # Import agent-based workflow
 from agents import WorkflowManager
@@ -35,71 +43,44 @@ if 'api_choice' not in st.session_state:
     st.session_state.api_choice = "OpenAI API"
 if 'model' not in st.session_state:
     st.session_state.model = "gpt-4o"
+if 'max_concurrency' not in st.session_state:
+    st.session_state.max_concurrency = 1
+if 'pipelined' not in st.session_state:
+    st.session_state.pipelined = False
+if 'use_response_cache' not in st.session_state:
+    st.session_state.use_response_cache = True
+if 'max_chunk_tokens' not in st.session_state:
+    st.session_state.max_chunk_tokens = 0
+if 'structured_extraction' not in st.session_state:
+    st.session_state.structured_extraction = False
+if 'stream_json' not in st.session_state:
+    st.session_state.stream_json = False
+if 'json_shard_size' not in st.session_state:
+    st.session_state.json_shard_size = 0
+if 'incremental_extraction' not in st.session_state:
+    st.session_state.incremental_extraction = False
+if 'document_name' not in st.session_state:
+    st.session_state.document_name = None
+if 'clean_document' not in st.session_state:
+    st.session_state.clean_document = False
+if 'prune_entities' not in st.session_state:
+    st.session_state.prune_entities = True
+if 'skip_irrelevant_chunks' not in st.session_state:
+    st.session_state.skip_irrelevant_chunks = False
+if 'relevance_threshold' not in st.session_state:
+    st.session_state.relevance_threshold = DEFAULT_RELEVANCE_THRESHOLD
 
 # Entity extraction prompt
 if 'entity_prompt' not in st.session_state:
-    st.session_state.entity_prompt = """
-You are a Materials Science expert. Extract entities from the text using these categories:
-- Material: any material, substance, or chemical
-- Manufacturing: any manufacturing process, synthesis, or fabrication
-- Measurement: any characterization, measurement, or analysis
-- Property: any property, characteristic, or attribute
-- Parameter: any processing parameter, condition, or variable
-
-Format your response as a structured list of entities.
-"""
+    st.session_state.entity_prompt = DEFAULT_ENTITY_PROMPT
 
 # Relationship extraction prompt
 if 'relationship_prompt' not in st.session_state:
-    st.session_state.relationship_prompt = """
-You are a Materials Science expert. Extract relationships between the entities using these relationship types:
-- is_manufacturing_input: material → manufacturing
-- has_manufacturing_output: manufacturing → material
-- is_measurement_input: material → measurement
-- has_measurement_output: measurement → property
-- has_property: material → property
-- has_parameter: manufacturing/measurement → parameter
-
-Format your response as a simple list of relationships.
-"""
+    st.session_state.relationship_prompt = DEFAULT_RELATIONSHIP_PROMPT
 
 # JSON-LD generation prompt
 if 'json_prompt' not in st.session_state:
-    st.session_state.json_prompt = """
-Generate a JSON-LD representation of the following entities and relationships.
-
-Format:
-{
-  "@context": {
-    "ex": "http://example.com/",
-    "emmo": "http://emmo.info/emmo#",
-    "skos": "http://www.w3.org/2004/02/skos/core#"
-  },
-  "@graph": [
-    {
-      "@id": "ex:Material1",
-      "@type": "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94",
-      "skos:prefLabel": "Material Name"
-    },
-    ...
-  ]
-}
-
-Use these entity types:
-- Material: emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94
-- Manufacturing: emmo:EMMO_a4d66059_5dd3_4b90_b4cb_10960559441b
-- Measurement: emmo:EMMO_463bcfda_867b_41d9_a967_211d4d437cfb
-- Property: emmo:EMMO_b7bcff25_ffc3_474e_9ab5_01b1664bd4ba
-- Parameter: emmo:EMMO_d1d436e7_72fc_49cd_863b_7bfb4ba5276a
-
-And these relationship types:
-- is_manufacturing_input: emmo:EMMO_e1097637
-- has_manufacturing_output: emmo:EMMO_e1245987
-- is_measurement_input: emmo:EMMO_m5677989
-- has_measurement_output: emmo:EMMO_m87987545
-- has_property: emmo:EMMO_p5778r78
-- has_parameter: emmo:EMMO_p46903ar7
-"""
+    st.session_state.json_prompt = DEFAULT_JSON_PROMPT
 
 if 'processing_complete' not in st.session_state:
     st.session_state.processing_complete = False
@@ -107,6 +88,8 @@ if 'nodes' not in st.session_state:
     st.session_state.nodes = []
 if 'links' not in st.session_state:
     st.session_state.links = []
+if 'graph_store' not in st.session_state:
+    st.session_state.graph_store = None
 if 'layout' not in st.session_state:
     st.session_state.layout = 'force'
 if 'hide_units_and_literals' not in st.session_state:
@@ -125,6 +108,13 @@ tabs = st.tabs(["Document Upload", "Extraction Settings", "Knowledge Graph", "In
 with tabs[0]:
     st.header("Upload Document")
     
+    clean_document = st.checkbox(
+        "Strip running headers, page numbers, references and acknowledgements",
+        value=st.session_state.clean_document,
+        help="Removes text that would otherwise be sent to the API twice without adding entities"
+    )
+    st.session_state.clean_document = clean_document
+    
     uploaded_file = st.file_uploader("Choose a PDF or TXT file", type=["pdf", "txt"])
     
     if uploaded_file is not None:
@@ -133,28 +123,46 @@ with tabs[0]:
             file_type = uploaded_file.name.split('.')[-1].lower()
             
             with st.spinner(f"Extracting text from {file_type.upper()} file..."):
+                cleaning_report = None
                 if file_type == "pdf":
                     # Process PDF file
-                    text_content = extract_text_from_pdf(uploaded_file)
+                    pages = extract_pages_from_pdf(uploaded_file)
+                    if clean_document:
+                        pages, cleaning_report = clean_pages(pages, st.session_state.model)
+                    text_content = join_pages(pages)
                 elif file_type == "txt":
                     # Process TXT file
                     text_content = extract_text_from_txt(uploaded_file)
+                    if clean_document:
+                        text_content, cleaning_report = clean_text(text_content, st.session_state.model)
                 else:
                     raise Exception(f"Unsupported file type: {file_type}")
                 
                 st.session_state.pdf_content = text_content
+                st.session_state.document_name = uploaded_file.name
                 st.success(f"Successfully extracted {len(text_content)} characters from file")
+                if cleaning_report:
+                    st.caption(
+                        f"Cleaning removed {cleaning_report['chars_removed']} characters "
+                        f"(~{cleaning_report['tokens_removed']} tokens per extraction call): "
+                        f"{cleaning_report['boilerplate_lines']} header/footer lines and "
+                        f"{cleaning_report['back_matter_lines']} back-matter lines"
+                    )
                 
                 # Display a preview of the extracted text
                 st.subheader("Document Content Preview")
                 st.text_area("Extracted text", value=text_content[:1500] + "..." if len(text_content) > 1500 else text_content, height=300)
                 
                 # Chunk the text for easier processing
-                chunks = chunk_text(text_content, st.session_state.api_choice)
+                chunks = chunk_text(
+                    text_content, st.session_state.api_choice, st.session_state.model,
+                    st.session_state.entity_prompt + st.session_state.relationship_prompt,
+                    st.session_state.max_chunk_tokens or None
+                )
                 st.session_state.chunks = chunks
                 st.session_state.current_chunk_index = 0
                 
-                st.info(f"Content split into {len(chunks)} chunks for processing")
+                st.info(f"Content split into {len(chunks)} chunks ({chunks.total_tokens} tokens) for processing")
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")
 
@@ -162,6 +170,10 @@ with tabs[0]:
 with tabs[1]:
     st.header("Knowledge Graph Extraction Settings")
     
+    # Report missing optional dependencies without importing them
+    for note in missing_resources():
+        st.warning(note)
+    
     # API selection
     api_choice = st.radio(
         "Choose AI API Provider:",
@@ -183,6 +195,126 @@ with tabs[1]:
     api_key = st.text_input("Enter API key:", value=st.session_state.api_key, type="password")
     st.session_state.api_key = api_key
     
+    # Number of chunk requests sent to the API in parallel
+    max_concurrency = st.slider(
+        "Max concurrent API requests:",
+        min_value=1,
+        max_value=16,
+        value=st.session_state.max_concurrency,
+        help="Higher values process chunks in parallel but may hit provider rate limits"
+    )
+    st.session_state.max_concurrency = max_concurrency
+    
+    # Account limits; the defaults are OpenAI's usage tier 2 and Groq's free tier
+    rate_limits = get_rate_limits(api_choice, model)
+    rpm = st.number_input(
+        "Requests per minute of your API account:",
+        min_value=1,
+        value=int(rate_limits["rpm"]),
+        step=10,
+        key=f"rpm_{api_choice}_{model}"
+    )
+    tpm = st.number_input(
+        "Tokens per minute of your API account:",
+        min_value=1000,
+        value=int(rate_limits["tpm"]),
+        step=10000,
+        key=f"tpm_{api_choice}_{model}",
+        help="Requests are paced to stay under these limits, and chunks are sized to fit in one minute's tokens"
+    )
+    if (rpm, tpm) != (rate_limits["rpm"], rate_limits["tpm"]):
+        configure_rate_limit(api_choice, model, rpm=int(rpm), tpm=int(tpm))
+    
+    # Connection pool of the API clients shared by every session
+    max_connections = st.number_input(
+        "HTTP connections per API client:",
+        min_value=1,
+        value=client_settings["max_connections"],
+        step=1
+    )
+    request_timeout = st.number_input(
+        "API request timeout (seconds):",
+        min_value=10.0,
+        value=float(client_settings["timeout"]),
+        step=10.0
+    )
+    if (max_connections, request_timeout) != (client_settings["max_connections"], client_settings["timeout"]):
+        configure_clients(max_connections=int(max_connections), timeout=float(request_timeout))
+    
+    pipelined = st.checkbox(
+        "Pipeline entity and relationship extraction",
+        value=st.session_state.pipelined,
+        help="Start relationship extraction for each chunk as soon as its entities are available"
+    )
+    st.session_state.pipelined = pipelined
+    
+    structured_extraction = st.checkbox(
+        "Structured extraction with local merge",
+        value=st.session_state.structured_extraction,
+        help="Ask for JSON records per chunk and deduplicate them locally instead of condensing with extra API calls"
+    )
+    st.session_state.structured_extraction = structured_extraction
+    
+    stream_json = st.checkbox(
+        "Stream JSON-LD generation and preview the graph while it is generated",
+        value=st.session_state.stream_json
+    )
+    st.session_state.stream_json = stream_json
+    
+    json_shard_size = st.number_input(
+        "Entities per JSON-LD request (0 = one request for the whole graph):",
+        min_value=0,
+        value=st.session_state.json_shard_size,
+        step=10,
+        help="Large graphs can exceed one completion's output limit; in parts, entities and their relationships are converted in parallel and the @graph arrays are merged locally"
+    )
+    st.session_state.json_shard_size = int(json_shard_size)
+    
+    incremental_extraction = st.checkbox(
+        "Re-extract only changed chunks when a document is uploaded again",
+        value=st.session_state.incremental_extraction,
+        help="Keep per-chunk results for each file name and send only new or changed chunks of a revised version to the API; always uses structured extraction with local merge"
+    )
+    st.session_state.incremental_extraction = incremental_extraction
+    
+    max_chunk_tokens = st.number_input(
+        f"Max tokens per chunk (0 = {DEFAULT_MAX_CHUNK_TOKENS}, or less if the model's context window is smaller):",
+        min_value=0,
+        value=st.session_state.max_chunk_tokens,
+        step=500
+    )
+    st.session_state.max_chunk_tokens = int(max_chunk_tokens)
+    
+    prune_entities = st.checkbox(
+        "List only the entities each chunk mentions in its relationship prompt",
+        value=st.session_state.prune_entities,
+        help="Match entity names against each chunk instead of sending the whole entity list with every relationship request"
+    )
+    st.session_state.prune_entities = prune_entities
+    
+    skip_irrelevant_chunks = st.checkbox(
+        "Skip chunks without likely entities",
+        value=st.session_state.skip_irrelevant_chunks,
+        help="Score each chunk locally for material, process, measurement, property and parameter mentions and do not send low-scoring chunks (author lists, affiliations, figure residue) to the API"
+    )
+    st.session_state.skip_irrelevant_chunks = skip_irrelevant_chunks
+    
+    if skip_irrelevant_chunks:
+        relevance_threshold = st.number_input(
+            "Minimum relevance score (category mentions per 100 words):",
+            min_value=0.0,
+            value=float(st.session_state.relevance_threshold),
+            step=0.5
+        )
+        st.session_state.relevance_threshold = relevance_threshold
+    
+    use_response_cache = st.checkbox(
+        "Reuse cached API responses",
+        value=st.session_state.use_response_cache,
+        help="Answer identical requests from the local response cache instead of calling the API again"
+    )
+    st.session_state.use_response_cache = use_response_cache
+    
     # Prompt customization
     st.subheader("Extraction Prompts")
     
@@ -241,6 +373,7 @@ with tabs[1]:
             # Process chunks sequentially with progress bar
             progress_bar = st.progress(0)
             status_text = st.empty()
+            partial_graph = st.empty()
             
             try:
                 # Create the workflow manager
@@ -253,6 +386,16 @@ with tabs[1]:
                 # Define status callback
                 def update_status(status_message):
                     status_text.text(status_message)
+                
+                # Show the graph built from the JSON-LD items streamed so far
+                def update_partial_graph(nodes, links):
+                    with partial_graph.container():
+                        st.caption(f"Partial graph: {len(nodes)} nodes and {len(links)} relationships so far")
+                        st_echarts(
+                            options=create_echarts_option(nodes, links, st.session_state.layout),
+                            height="400px",
+                            key=f"partial_graph_{len(nodes)}_{len(links)}"
+                        )
                     
                 # Process the PDF using the agent-based workflow
                 result = workflow_manager.process_pdf(
@@ -265,14 +408,28 @@ with tabs[1]:
                     model=st.session_state.model,
                     hide_units_and_literals=st.session_state.hide_units_and_literals,
                     progress_callback=update_progress,
-                    status_callback=update_status
+                    status_callback=update_status,
+                    max_concurrency=st.session_state.max_concurrency,
+                    pipelined=st.session_state.pipelined,
+                    max_chunk_tokens=st.session_state.max_chunk_tokens or None,
+                    structured=st.session_state.structured_extraction,
+                    stream_json=st.session_state.stream_json,
+                    partial_graph_callback=update_partial_graph,
+                    document_id=st.session_state.document_name if st.session_state.incremental_extraction else None,
+                    relevance_threshold=st.session_state.relevance_threshold if st.session_state.skip_irrelevant_chunks else None,
+                    prune_entities=st.session_state.prune_entities,
+                    json_shard_size=st.session_state.json_shard_size or None,
+                    use_cache=st.session_state.use_response_cache
                 )
                 
+                partial_graph.empty()
+                
                 if result["success"]:
                     # Store the results
                     st.session_state.knowledge_graph_data = result["knowledge_graph"]
                     st.session_state.nodes = result["nodes"]
                     st.session_state.links = result["links"]
+                    st.session_state.graph_store = result["graph_store"]
                     st.session_state.entities = result["entities"]
                     st.session_state.relationships = result["relationships"]
                     
@@ -285,6 +442,54 @@ with tabs[1]:
                     
                     # Success message with stats
                     st.success(f"Successfully extracted knowledge graph with {len(st.session_state.nodes)} nodes and {len(st.session_state.links)} relationships")
+                    # Hits and misses of this run; the cache itself is shared by every session
+                    run_totals = result["token_usage"]["totals"]
+                    cache_stats = get_response_cache().stats()
+                    st.caption(f"Response cache: {run_totals['cached_calls']} of {run_totals['calls']} calls answered from the cache, {cache_stats['entries']} stored responses")
+                    if "incremental" in result:
+                        st.caption(f"Incremental extraction: reused {result['incremental']['reused']} and extracted {result['incremental']['extracted']} per-chunk results")
+                    if "json_shards" in result:
+                        failed = result["json_shards"]["failed"]
+                        st.caption(
+                            f"JSON-LD generated in {result['json_shards']['count']} parts"
+                            + (f"; parts {', '.join(str(index + 1) for index in failed)} could not be parsed" if failed else "")
+                        )
+                    if "token_usage" in result:
+                        token_usage = result["token_usage"]
+                        with st.expander(
+                            f"Token usage: {token_usage['totals']['input_tokens']} input and "
+                            f"{token_usage['totals']['output_tokens']} output tokens"
+                        ):
+                            st.table([
+                                {
+                                    "Stage": stage,
+                                    "Calls": usage["calls"],
+                                    "Cached": usage["cached_calls"],
+                                    "Input tokens": usage["input_tokens"],
+                                    "Output tokens": usage["output_tokens"],
+                                    "Mean input": usage["mean_input_tokens"],
+                                    "Max input": usage["max_input_tokens"],
+                                    "Share": f"{usage['share']:.1%}"
+                                }
+                                for stage, usage in token_usage["stages"].items()
+                            ])
+                            instructions = token_usage["instruction_tokens"]
+                            st.caption(
+                                f"Fixed instruction tokens per call: entity {instructions['entity']}, "
+                                f"relationship {instructions['relationship']}, JSON-LD {instructions['json_ld']}"
+                            )
+                            if token_usage["totals"]["estimated_calls"]:
+                                st.caption(f"{token_usage['totals']['estimated_calls']} calls without provider usage were counted with the tokenizer")
+                    if "relevance" in result:
+                        relevance = result["relevance"]
+                        st.caption(f"Relevance filter: kept {relevance['kept']} and skipped {relevance['skipped']} chunks (threshold {relevance['threshold']})")
+                        skipped = [decision for decision in relevance["decisions"] if not decision["kept"]]
+                        if skipped:
+                            with st.expander("Skipped chunks"):
+                                st.table([
+                                    {"Chunk": decision["chunk"] + 1, "Score": decision["score"], "Start of text": decision["preview"]}
+                                    for decision in skipped
+                                ])
                 else:
                     st.error(f"Failed to extract knowledge graph: {result['message']} (Stage: {result['stage']})")
                     st.session_state.extraction_status = "Failed"
@@ -303,7 +508,7 @@ with tabs[1]:
 with tabs[2]:
     st.header("Knowledge Graph Visualization")
     
-    if st.session_state.processing_complete and st.session_state.nodes and st.session_state.links:
+    if st.session_state.processing_complete and st.session_state.graph_store is not None:
         # Visualization options
         col1, col2 = st.columns(2)
         
@@ -316,17 +521,29 @@ with tabs[2]:
             st.session_state.layout = layout
         
         with col2:
-            hide_units = st.checkbox(
+            st.session_state.hide_units_and_literals = st.checkbox(
                 "Hide units and literal values (simpler view)", 
                 value=st.session_state.hide_units_and_literals
             )
-            if hide_units != st.session_state.hide_units_and_literals:
-                st.session_state.hide_units_and_literals = hide_units
-                # Re-extract the graph data with the new setting
-                st.session_state.nodes, st.session_state.links = extract_graph_data(
-                    st.session_state.knowledge_graph_data, 
-                    st.session_state.hide_units_and_literals
-                )
+        
+        # Views are masks over the graph built once after extraction, cached per combination of filters
+        graph_store = st.session_state.graph_store
+        col1, col2 = st.columns(2)
+        with col1:
+            shown_types = st.multiselect(
+                "Show only instances of these types (empty shows all):",
+                graph_store.type_names()
+            )
+        with col2:
+            shown_relationships = st.multiselect(
+                "Show only these relationships (empty shows all):",
+                graph_store.relationship_labels()
+            )
+        st.session_state.nodes, st.session_state.links = graph_store.to_echarts(
+            st.session_state.hide_units_and_literals,
+            types=shown_types or None,
+            relationships=shown_relationships or None
+        )
         
         # Display graph statistics
         st.info(f"Graph contains {len(st.session_state.nodes)} nodes and {len(st.session_state.links)} relationships")
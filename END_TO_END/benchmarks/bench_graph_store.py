@@ -0,0 +1,107 @@
+"""Benchmark building and rendering the knowledge graph store on synthetic JSON-LD.
+
+Run from the END_TO_END directory:
+
+    python benchmarks/bench_graph_store.py [--items 100000] [--repeat 3] [--seed 0]
+
+A synthetic @graph of --items items is generated with typed instances,
+labels, numeric values and links between random items (some of them
+repeated, as models tend to do). The time to build the store, to render
+ECharts nodes/links, to switch to filtered views (without units and
+literals, one type, one relationship) and back to a cached view, to apply
+an edit of one item through GraphEditor, and the memory held by the store
+and by the rendered lists are reported.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.graph_store import GraphEditor, GraphStore, NODE_TYPES, RELATIONSHIP_KEYS
+
+def synthetic_graph(items, seed=0):
+    """Return a JSON-LD document with items @graph entries."""
+    rng = random.Random(seed)
+    type_ids = list(NODE_TYPES)
+    relations = [key for key in RELATIONSHIP_KEYS if key != "skos:prefLabel"]
+    graph = []
+    for index in range(items):
+        item = {"@id": f"ex:Node{index}", "@type": rng.choice(type_ids), "skos:prefLabel": f"Node {index}"}
+        if index % 10 == 0:
+            item["@type"] = ["owl:NamedIndividual", item["@type"]]
+        if index % 3 == 0:
+            item["ex:value"] = round(rng.uniform(0, 100), 2)
+        targets = [{"@id": f"ex:Node{rng.randrange(items)}"} for _ in range(rng.randint(1, 3))]
+        # Every fifth item repeats a link
+        if index % 5 == 0:
+            targets.append(dict(targets[0]))
+        item[rng.choice(relations)] = targets
+        graph.append(item)
+    return {"@context": {}, "@graph": graph}
+
+def best_time(function, repeat):
+    """Return the best wall-clock time of repeat calls and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def timed(function):
+    """Return the wall-clock time of one call and its result."""
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def allocated(function):
+    """Return the result of function and the bytes it left allocated."""
+    tracemalloc.start()
+    result = function()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000, help="number of @graph items")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, best time is reported")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic graph")
+    args = parser.parse_args()
+
+    data = synthetic_graph(args.items, args.seed)
+    build, store = best_time(lambda: GraphStore.from_json_ld(data), args.repeat)
+    # The first view renders every node and link; later views only mask them
+    render, (nodes, links) = timed(store.to_echarts)
+    hidden, (hidden_nodes, hidden_links) = timed(lambda: store.to_echarts(True))
+    typed, _ = timed(lambda: store.to_echarts(False, types=["Matter"]))
+    related, _ = timed(lambda: store.to_echarts(True, relationships=["has_property"]))
+    cached, _ = timed(store.to_echarts)
+    editor = GraphEditor()
+    editor.update(data)
+    editor.store.to_echarts()
+    data["@graph"][0]["skos:prefLabel"] = "Edited node"
+    edit, _ = timed(lambda: (editor.update(data), editor.store.to_echarts()))
+    _, store_bytes = allocated(lambda: GraphStore.from_json_ld(data))
+    _, render_bytes = allocated(GraphStore.from_json_ld(data).to_echarts)
+
+    print(f"items: {args.items}, nodes: {len(nodes)}, links: {len(links)} "
+          f"(without units and literals: {len(hidden_nodes)} nodes, {len(hidden_links)} links)")
+    print(f"build store:                        {build:8.3f} s")
+    print(f"render all nodes/links:             {render:8.3f} s")
+    print(f"view without units and literals:    {hidden:8.3f} s")
+    print(f"view of one type:                   {typed:8.3f} s")
+    print(f"view of one relationship:           {related:8.3f} s")
+    print(f"cached view:                        {cached:8.3f} s")
+    print(f"edit one item and re-render:        {edit:8.3f} s")
+    print(f"store memory:                       {store_bytes / 1e6:8.1f} MB")
+    print(f"rendered lists memory:              {render_bytes / 1e6:8.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark serial vs. process-pool PDF text extraction.
+
+Run from the END_TO_END directory:
+
+    python benchmarks/bench_pdf_extraction.py [--pages 300] [--workers N] [PDF ...]
+
+Each input PDF (default: every file in ../Sample) is padded to at least
+--pages pages by repeating its pages, to approximate long reports.
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader, PdfWriter
+from utils.pdf_processor import extract_text_from_pdf
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sample")
+
+def pad_pdf(path, min_pages):
+    """Return the bytes of a PDF made of path's pages repeated to min_pages pages."""
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    while len(writer.pages) < max(min_pages, len(reader.pages)):
+        for page in reader.pages:
+            writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def time_extraction(pdf_bytes, workers, repeat):
+    """Return the best wall-clock time of repeat extractions and the extracted text."""
+    best = None
+    text = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract_text_from_pdf(io.BytesIO(pdf_bytes), max_workers=workers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDF files to extract (default: Sample/*.pdf)")
+    parser.add_argument("--pages", type=int, default=300, help="pad each PDF to at least this many pages")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="process pool size")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration, best time is reported")
+    args = parser.parse_args()
+
+    paths = args.pdfs or sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.pdf")))
+    print(f"{'file':50} {'pages':>6} {'serial s':>9} {'parallel s':>11} {'speedup':>8}")
+    for path in paths:
+        pdf_bytes = pad_pdf(path, args.pages)
+        pages = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+        serial, serial_text = time_extraction(pdf_bytes, 1, args.repeat)
+        parallel, parallel_text = time_extraction(pdf_bytes, args.workers, args.repeat)
+        if serial_text != parallel_text:
+            raise SystemExit(f"Parallel extraction output differs for {path}")
+        name = os.path.basename(path)[:50]
+        print(f"{name:50} {pages:6d} {serial:9.2f} {parallel:11.2f} {serial / parallel:7.2f}x")
+    print(f"workers: {args.workers}")
+
+if __name__ == "__main__":
+    main()
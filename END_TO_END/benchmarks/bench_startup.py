@@ -0,0 +1,80 @@
+"""Benchmark the import cost of the extractor modules.
+
+Run from the END_TO_END directory:
+
+    python benchmarks/bench_startup.py [--repeat 5] [--top 5] [MODULE ...]
+
+Each module is imported in a fresh interpreter with -X importtime; the
+best cumulative import time over --repeat runs is reported together with
+the most expensive modules it imports directly (in ms).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+END_TO_END_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    "utils.token_utils",
+    "utils.pdf_processor",
+    "utils.api_clients",
+    "utils.condenser",
+    "utils.graph_utils",
+    "agents"
+]
+
+def import_times(module):
+    """Import module in a fresh interpreter with -X importtime.
+    
+    Returns the cumulative import time of module in microseconds and a list
+    of (name, microseconds) for the modules it imports directly.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=END_TO_END_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr}")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            depth = (len(name) - len(name.lstrip())) // 2
+            entries.append((depth, name.strip(), int(cumulative)))
+    # Children are printed before their parent, one indentation level deeper
+    total = 0
+    children = []
+    for index in range(len(entries) - 1, -1, -1):
+        depth, name, cumulative = entries[index]
+        if depth == 0 and name == module:
+            total = cumulative
+            for child_depth, child_name, child_cumulative in reversed(entries[:index]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    children.append((child_name, child_cumulative))
+            break
+    return total, children
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", help="modules to import (default: the main extractor modules)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per module, best time is reported")
+    parser.add_argument("--top", type=int, default=5, help="number of heaviest imports listed per module")
+    args = parser.parse_args()
+
+    modules = args.modules or DEFAULT_MODULES
+    print(f"{'module':30} {'import ms':>10}  heaviest imports")
+    for module in modules:
+        total, children = min((import_times(module) for _ in range(args.repeat)), key=lambda run: run[0])
+        heaviest = sorted(children, key=lambda item: item[1], reverse=True)[:args.top]
+        details = ", ".join(f"{name} {us / 1000:.1f}" for name, us in heaviest)
+        print(f"{module:30} {total / 1000:10.1f}  {details}")
+
+if __name__ == "__main__":
+    main()
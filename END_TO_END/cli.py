@@ -0,0 +1,449 @@
+"""Run the knowledge graph extraction workflow over a corpus without the UI.
+
+Run from the END_TO_END directory:
+
+    python cli.py PATH [PATH ...] --output-dir out [--workers 4] [--api groq] [--model llama3-70b-8192]
+    python cli.py --manifest corpus.txt --output-dir out
+    python cli.py PATH --output-dir out --batch api
+
+PATH may be a PDF or TXT file or a directory, which is searched recursively.
+A manifest lists one path per line; blank lines and lines starting with "#"
+are ignored. Documents are processed in parallel worker processes, and for
+each one <name>.jsonld, <name>.entities.txt and <name>.relationships.txt are
+written to the output directory, together with a summary.json report.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.concurrency import DEFAULT_MAX_CONCURRENCY
+from utils.condenser import DEFAULT_FAN_IN
+from utils.prompts import DEFAULT_ENTITY_PROMPT, DEFAULT_RELATIONSHIP_PROMPT, DEFAULT_JSON_PROMPT
+from utils.json_ld_shards import DEFAULT_SHARD_SIZE
+from utils.pdf_processor import DEFAULT_MAX_CHUNK_TOKENS, DEFAULT_MODELS
+from utils.relevance import DEFAULT_RELEVANCE_THRESHOLD
+from utils.token_accounting import combine_token_reports, format_token_report
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+API_CHOICES = {"openai": "OpenAI API", "groq": "Groq API"}
+API_KEY_VARIABLES = {"OpenAI API": "OPENAI_API_KEY", "Groq API": "GROQ_API_KEY"}
+
+def collect_documents(paths, manifest=None):
+    """Return the PDF and TXT files named by paths and manifest, without duplicates."""
+    entries = list(paths)
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    entries.append(line if os.path.isabs(line) else os.path.join(base, line))
+    documents = []
+    seen = set()
+    for entry in entries:
+        if os.path.isdir(entry):
+            found = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(entry)
+                for name in names
+                if name.lower().endswith(SUPPORTED_EXTENSIONS)
+            )
+        elif os.path.isfile(entry):
+            found = [entry]
+        else:
+            raise FileNotFoundError(f"No such file or directory: {entry}")
+        for path in found:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                documents.append(path)
+    return documents
+
+def output_names(documents):
+    """Map every document to a unique output base name derived from its file name."""
+    names = {}
+    used = set()
+    for path in documents:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = stem
+        suffix = 2
+        while name in used:
+            name = f"{stem}-{suffix}"
+            suffix += 1
+        used.add(name)
+        names[path] = name
+    return names
+
+def read_prompt(path, default_prompt):
+    """Read a prompt from a text file, or return the default prompt."""
+    if not path:
+        return default_prompt
+    with open(path, encoding="utf-8") as handle:
+        return handle.read()
+
+def _init_worker(api_choice, model, workers, rpm=None, tpm=None, max_connections=None, timeout=None):
+    """Configure a worker process: connection pool, rate limit and its share of it."""
+    from multiprocessing.util import Finalize
+    from utils.api_clients import close_clients, configure_clients
+    from utils.rate_limiter import configure_rate_limit, set_process_share
+    configure_clients(max_connections=max_connections, timeout=timeout)
+    # Pool workers leave through multiprocessing's exit hooks, not atexit
+    Finalize(None, close_clients, exitpriority=10)
+    if rpm or tpm:
+        configure_rate_limit(api_choice, model, rpm=rpm, tpm=tpm)
+    # Every process has its own limiter, so each gets an equal share of the provider budget;
+    # chunks are still sized from the whole budget
+    set_process_share(workers)
+
+def read_document(path, options):
+    """Return the text of a PDF or TXT document and its cleaning report (None without --clean)."""
+    from utils.pdf_processor import extract_pages_from_pdf, extract_text_from_txt, join_pages, clean_pages, clean_text
+
+    cleaning_report = None
+    if path.lower().endswith(".pdf"):
+        # Documents already run in parallel processes; do not nest another pool
+        pages = extract_pages_from_pdf(path, max_workers=1)
+        if options["clean"]:
+            pages, cleaning_report = clean_pages(pages, options["model"])
+        text = join_pages(pages)
+    else:
+        text = extract_text_from_txt(path)
+        if options["clean"]:
+            text, cleaning_report = clean_text(text, options["model"])
+    return text, cleaning_report
+
+def write_outputs(summary, result, name, options):
+    """Write the outputs of a successful workflow result and add its figures to summary."""
+    base = os.path.join(options["output_dir"], name)
+    with open(base + ".jsonld", "w", encoding="utf-8") as handle:
+        json.dump(result["knowledge_graph"], handle, indent=2, ensure_ascii=False)
+    with open(base + ".entities.txt", "w", encoding="utf-8") as handle:
+        handle.write(result["entities"])
+    with open(base + ".relationships.txt", "w", encoding="utf-8") as handle:
+        handle.write(result["relationships"])
+    summary["nodes"] = len(result["nodes"])
+    summary["links"] = len(result["links"])
+    if "token_usage" in result:
+        summary["token_usage"] = result["token_usage"]
+    if "incremental" in result:
+        summary["incremental"] = result["incremental"]
+    if "json_shards" in result:
+        summary["json_shards"] = result["json_shards"]
+    if "relevance" in result:
+        # One line per chunk so skip decisions can be audited
+        with open(base + ".relevance.jsonl", "w", encoding="utf-8") as handle:
+            for decision in result["relevance"]["decisions"]:
+                handle.write(json.dumps(decision, ensure_ascii=False) + "\n")
+        summary["relevance"] = {"kept": result["relevance"]["kept"], "skipped": result["relevance"]["skipped"]}
+
+def _finish_summary(summary, result, cleaning_report=None):
+    summary["success"] = result["success"]
+    summary["stage"] = result["stage"]
+    summary["message"] = result["message"]
+    if cleaning_report:
+        summary["cleaning"] = cleaning_report
+
+def process_document(path, name, options):
+    """Run the workflow for one document and write its outputs.
+
+    Returns a summary dict for the report; errors are reported in it rather
+    than raised, so one bad document does not stop the corpus.
+    """
+    from agents import WorkflowManager
+
+    start = time.perf_counter()
+    summary = {"path": path, "name": name, "bytes": os.path.getsize(path)}
+    workflow_manager = WorkflowManager()
+    settings = dict(
+        entity_prompt=options["entity_prompt"],
+        relationship_prompt=options["relationship_prompt"],
+        json_prompt=options["json_prompt"],
+        api_choice=options["api_choice"],
+        api_key=options["api_key"],
+        model=options["model"],
+        hide_units_and_literals=options["hide_units_and_literals"],
+        max_concurrency=options["max_concurrency"],
+        fan_in=options["fan_in"],
+        max_chunk_tokens=options["max_chunk_tokens"],
+        structured=options["structured"],
+        relevance_threshold=options["relevance_threshold"],
+        prune_entities=not options["full_entity_context"],
+        json_shard_size=options["json_shard_size"],
+        use_cache=options["use_cache"]
+    )
+    try:
+        cleaning_report = None
+        if options["streaming"]:
+            result = workflow_manager.process_pdf_stream(path, clean=options["clean"], **settings)
+            cleaning_report = result.get("cleaning")
+        else:
+            text, cleaning_report = read_document(path, options)
+            result = workflow_manager.process_pdf(
+                text,
+                pipelined=options["pipelined"],
+                entity_neighbors=options["entity_neighbors"],
+                document_id=os.path.abspath(path) if options["incremental"] else None,
+                **settings
+            )
+    except Exception as e:
+        result = {"success": False, "message": str(e), "stage": "reading"}
+
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    _finish_summary(summary, result, cleaning_report)
+    if result["success"]:
+        write_outputs(summary, result, name, options)
+    return summary
+
+def make_batch_backend(kind, options):
+    """Return the batch backend for --batch: the provider's batch API, or local job files.
+
+    The local backend runs every line of a job file in this process through
+    unified_api_call, so it obeys the rate limiter and the response cache.
+    """
+    from utils.batch_jobs import APIBatchBackend, LocalFileBatchBackend
+    if kind == "api":
+        return APIBatchBackend(options["api_choice"], options["api_key"])
+
+    from utils.api_clients import unified_api_call
+
+    def respond(body):
+        return unified_api_call(
+            options["api_choice"], body["messages"][0]["content"], options["api_key"], body["model"],
+            use_cache=options["use_cache"], stage="batch"
+        )
+
+    return LocalFileBatchBackend(os.path.join(options["output_dir"], "batch", "local"), respond)
+
+def process_batch(documents, names, options, backend, poll_interval=30.0, timeout=None):
+    """Run every document through BatchWorkflowManager and write the outputs.
+
+    Each stage of the whole corpus is one set of JSONL batch jobs, so all
+    documents finish together and share the run's elapsed time. Returns a
+    summary dict per document, in the order of documents.
+    """
+    from agents import BatchWorkflowManager
+
+    start = time.perf_counter()
+    summaries = {}
+    texts = {}
+    cleaning_reports = {}
+    for path in documents:
+        summaries[path] = {"path": path, "name": names[path], "bytes": os.path.getsize(path)}
+        try:
+            texts[names[path]], cleaning_reports[path] = read_document(path, options)
+        except Exception as e:
+            _finish_summary(summaries[path], {"success": False, "message": str(e), "stage": "reading"})
+
+    manager = BatchWorkflowManager(
+        backend, os.path.join(options["output_dir"], "batch"), poll_interval=poll_interval, timeout=timeout
+    )
+    try:
+        results = manager.process_corpus(
+            texts, options["entity_prompt"], options["relationship_prompt"], options["json_prompt"],
+            options["api_choice"], options["model"], options["max_chunk_tokens"],
+            status_callback=lambda message: print(message, flush=True)
+        )
+    except Exception as e:
+        results = {name: {"success": False, "message": str(e), "stage": "batch"} for name in texts}
+
+    elapsed = round(time.perf_counter() - start, 3)
+    for path in documents:
+        summary = summaries[path]
+        summary["seconds"] = elapsed
+        if "success" in summary:
+            continue
+        result = results[names[path]]
+        _finish_summary(summary, result, cleaning_reports.get(path))
+        if result["success"]:
+            write_outputs(summary, result, names[path], options)
+    return [summaries[path] for path in documents]
+
+def build_report(summaries, elapsed, workers):
+    """Summarize throughput and failures of a corpus run."""
+    succeeded = [summary for summary in summaries if summary["success"]]
+    failed = [summary for summary in summaries if not summary["success"]]
+    total_bytes = sum(summary["bytes"] for summary in summaries)
+    return {
+        "documents": len(summaries),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_minute": round(len(summaries) / elapsed * 60, 2) if elapsed else None,
+        "megabytes_per_minute": round(total_bytes / 1e6 / elapsed * 60, 3) if elapsed else None,
+        "tokens_removed_by_cleaning": sum(summary.get("cleaning", {}).get("tokens_removed", 0) for summary in summaries),
+        "chunks_skipped_by_relevance": sum(summary.get("relevance", {}).get("skipped", 0) for summary in succeeded),
+        "nodes": sum(summary.get("nodes", 0) for summary in succeeded),
+        "links": sum(summary.get("links", 0) for summary in succeeded),
+        "token_usage": combine_token_reports(summary["token_usage"] for summary in succeeded if "token_usage" in summary),
+        "failures": [
+            {"path": summary["path"], "stage": summary["stage"], "message": summary["message"]}
+            for summary in failed
+        ],
+        "results": summaries
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="PDF/TXT files or directories to process")
+    parser.add_argument("--manifest", help="text file listing one document path per line")
+    parser.add_argument("--output-dir", required=True, help="directory for the per-document outputs and summary.json")
+    parser.add_argument("--api", choices=sorted(API_CHOICES), default="openai", help="API provider")
+    parser.add_argument("--model", help="model name (default depends on --api)")
+    parser.add_argument("--api-key", help="API key (default: OPENAI_API_KEY or GROQ_API_KEY)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="documents processed in parallel")
+    parser.add_argument("--rpm", type=int,
+                        help="requests per minute of your API account (default: OpenAI's usage tier 2, Groq's free tier)")
+    parser.add_argument("--tpm", type=int,
+                        help="tokens per minute of your API account (default: OpenAI's usage tier 2, Groq's free tier)")
+    parser.add_argument("--max-connections", type=int,
+                        help="HTTP connections kept per API client in every worker (default: 20)")
+    parser.add_argument("--timeout", type=float, help="seconds before an API request times out (default: 120)")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="concurrent API requests per document")
+    parser.add_argument("--fan-in", type=int, default=DEFAULT_FAN_IN, help="parts merged per condense call")
+    parser.add_argument("--max-chunk-tokens", type=int, help=f"cap on tokens per chunk (default: {DEFAULT_MAX_CHUNK_TOKENS})")
+    parser.add_argument("--pipelined", action="store_true", help="overlap entity and relationship extraction")
+    parser.add_argument("--structured", action="store_true", help="structured extraction with local merge")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read and chunk documents lazily (implies --pipelined)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse per-chunk results of earlier runs on the same paths (implies --structured)")
+    parser.add_argument("--clean", action="store_true",
+                        help="strip running headers, page numbers, references and acknowledgements first")
+    parser.add_argument("--relevance-threshold", type=float, nargs="?", const=DEFAULT_RELEVANCE_THRESHOLD,
+                        help="skip chunks whose local relevance score (category mentions per 100 words) is below this "
+                             f"(default when given without a value: {DEFAULT_RELEVANCE_THRESHOLD}); "
+                             "decisions are written to <name>.relevance.jsonl")
+    parser.add_argument("--full-entity-context", action="store_true",
+                        help="send the whole entity list with every relationship prompt instead of the entities each chunk mentions")
+    parser.add_argument("--entity-neighbors", type=int, default=0,
+                        help="also list entities mentioned in this many chunks on either side (staged mode)")
+    parser.add_argument("--json-shard-size", type=int, nargs="?", const=DEFAULT_SHARD_SIZE,
+                        help="generate JSON-LD for this many entities per request, in parallel, and merge the parts "
+                             f"(default when given without a value: {DEFAULT_SHARD_SIZE})")
+    parser.add_argument("--batch", choices=["local", "api"],
+                        help="run each stage of the whole corpus as JSONL batch jobs (structured extraction), either "
+                             "through the provider's batch API or as local job files answered by regular API calls")
+    parser.add_argument("--batch-poll-interval", type=float, default=30.0,
+                        help="seconds between batch job status checks")
+    parser.add_argument("--batch-timeout", type=float, help="give up on batch jobs after this many seconds")
+    parser.add_argument("--hide-units-and-literals", action="store_true", help="drop unit and literal nodes")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the on-disk response cache")
+    parser.add_argument("--entity-prompt", help="file with a custom entity extraction prompt")
+    parser.add_argument("--relationship-prompt", help="file with a custom relationship extraction prompt")
+    parser.add_argument("--json-prompt", help="file with a custom JSON-LD generation prompt")
+    args = parser.parse_args(argv)
+    if not args.paths and not args.manifest:
+        parser.error("give at least one path or --manifest")
+    if args.streaming and args.incremental:
+        parser.error("--streaming and --incremental cannot be combined")
+    if args.batch and (args.streaming or args.incremental):
+        parser.error("--batch cannot be combined with --streaming or --incremental")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    api_choice = API_CHOICES[args.api]
+    model = args.model or DEFAULT_MODELS[api_choice]
+    api_key = args.api_key or os.environ.get(API_KEY_VARIABLES[api_choice])
+    if not api_key:
+        raise SystemExit(f"No API key: pass --api-key or set {API_KEY_VARIABLES[api_choice]}")
+
+    documents = collect_documents(args.paths, args.manifest)
+    if not documents:
+        raise SystemExit("No PDF or TXT documents found")
+    os.makedirs(args.output_dir, exist_ok=True)
+    names = output_names(documents)
+    options = {
+        "entity_prompt": read_prompt(args.entity_prompt, DEFAULT_ENTITY_PROMPT),
+        "relationship_prompt": read_prompt(args.relationship_prompt, DEFAULT_RELATIONSHIP_PROMPT),
+        "json_prompt": read_prompt(args.json_prompt, DEFAULT_JSON_PROMPT),
+        "api_choice": api_choice,
+        "api_key": api_key,
+        "model": model,
+        "output_dir": args.output_dir,
+        "hide_units_and_literals": args.hide_units_and_literals,
+        "max_concurrency": args.max_concurrency,
+        "fan_in": args.fan_in,
+        "max_chunk_tokens": args.max_chunk_tokens,
+        "pipelined": args.pipelined,
+        "structured": args.structured,
+        "streaming": args.streaming,
+        "clean": args.clean,
+        "relevance_threshold": args.relevance_threshold,
+        "full_entity_context": args.full_entity_context,
+        "entity_neighbors": args.entity_neighbors,
+        "json_shard_size": args.json_shard_size,
+        "incremental": args.incremental,
+        "use_cache": not args.no_cache
+    }
+    workers = max(1, min(args.workers, len(documents)))
+    init_args = (api_choice, model, workers, args.rpm, args.tpm, args.max_connections, args.timeout)
+
+    start = time.perf_counter()
+    summaries = []
+
+    def report(summary):
+        summaries.append(summary)
+        status = "ok" if summary["success"] else f"FAILED at {summary['stage']}: {summary['message']}"
+        print(f"[{len(summaries)}/{len(documents)}] {summary['path']} ({summary['seconds']:.1f}s) {status}", flush=True)
+
+    if args.batch:
+        from utils.api_clients import close_clients
+        _init_worker(*init_args)
+        try:
+            backend = make_batch_backend(args.batch, options)
+            for summary in process_batch(
+                documents, names, options, backend, args.batch_poll_interval, args.batch_timeout
+            ):
+                report(summary)
+        finally:
+            close_clients()
+    elif workers == 1:
+        from utils.api_clients import close_clients
+        _init_worker(*init_args)
+        try:
+            for path in documents:
+                report(process_document(path, names[path], options))
+        finally:
+            close_clients()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+            futures = {
+                executor.submit(process_document, path, names[path], options): path
+                for path in documents
+            }
+            for future in as_completed(futures):
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    # The worker process itself failed, e.g. it was killed
+                    path = futures[future]
+                    summary = {
+                        "path": path, "name": names[path], "bytes": os.path.getsize(path), "seconds": 0.0,
+                        "success": False, "stage": "worker", "message": str(e)
+                    }
+                report(summary)
+
+    order = {path: index for index, path in enumerate(documents)}
+    summaries.sort(key=lambda summary: order[summary["path"]])
+    summary_report = build_report(summaries, time.perf_counter() - start, workers)
+    with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf-8") as handle:
+        json.dump(summary_report, handle, indent=2, ensure_ascii=False)
+
+    print(
+        f"Processed {summary_report['documents']} documents in {summary_report['elapsed_seconds']:.1f}s "
+        f"({summary_report['documents_per_minute']} documents/min, {summary_report['megabytes_per_minute']} MB/min): "
+        f"{summary_report['succeeded']} succeeded, {summary_report['failed']} failed"
+    )
+    if summary_report["token_usage"]["stages"]:
+        print(format_token_report(summary_report["token_usage"]))
+    return 1 if summary_report["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
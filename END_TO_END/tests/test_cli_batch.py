@@ -0,0 +1,50 @@
+import json
+
+import cli
+from utils import api_clients
+
+KNOWLEDGE_GRAPH = {
+    "@context": {"ex": "http://example.com/"},
+    "@graph": [
+        {"@id": "ex:M1", "@type": "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94",
+         "skos:prefLabel": "Nafion", "emmo:EMMO_p5778r78": {"@id": "ex:P1"}},
+        {"@id": "ex:P1", "@type": "emmo:EMMO_b7bcff25_ffc3_474e_9ab5_01b1664bd4ba",
+         "skos:prefLabel": "conductivity", "value": "0.1"}
+    ]
+}
+
+def fake_openai(content, api_key, model="gpt-4o", usage=None):
+    if "\nRelationships: " in content:
+        return "```json\n" + json.dumps(KNOWLEDGE_GRAPH) + "\n```"
+    if "\nEntities: " in content:
+        return json.dumps([{"source": "Nafion", "relation": "has_property", "target": "conductivity"}])
+    if '"category"' in content:
+        return json.dumps([
+            {"name": "Nafion", "category": "Material", "attributes": {}},
+            {"name": "conductivity", "category": "Property", "attributes": {"value": "0.1 S/cm"}}
+        ])
+    raise AssertionError("unexpected prompt")
+
+def test_local_batch_runs_corpus_end_to_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_clients, "call_openai_api", fake_openai)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "a.txt").write_text("Nafion membranes reach a conductivity of 0.1 S/cm.", encoding="utf-8")
+    (corpus / "b.txt").write_text("The conductivity of Nafion depends on humidity.", encoding="utf-8")
+    output_dir = tmp_path / "out"
+
+    cli.main([str(corpus), "--output-dir", str(output_dir), "--batch", "local",
+              "--batch-poll-interval", "0", "--no-cache", "--rpm", "1000000", "--tpm", "1000000000"])
+
+    report = json.loads((output_dir / "summary.json").read_text(encoding="utf-8"))
+    assert report["succeeded"] == 2
+    assert report["failures"] == []
+    for name in ("a", "b"):
+        assert json.loads((output_dir / f"{name}.jsonld").read_text(encoding="utf-8")) == KNOWLEDGE_GRAPH
+        assert "Nafion" in (output_dir / f"{name}.entities.txt").read_text(encoding="utf-8")
+        assert "has_property" in (output_dir / f"{name}.relationships.txt").read_text(encoding="utf-8")
+    # Every stage went through JSONL job files in the output directory
+    job_files = {path.name for path in (output_dir / "batch").rglob("*.jsonl")}
+    assert any(name.startswith("entities") for name in job_files)
+    assert any(name.startswith("json_ld") for name in job_files)
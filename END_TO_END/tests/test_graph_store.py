@@ -0,0 +1,40 @@
+from utils.graph_store import GraphEditor, GraphStore
+
+MATTER = "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94"
+MANUFACTURING = "emmo:EMMO_a4d66059_5dd3_4b90_b4cb_10960559441b"
+
+def test_removing_duplicate_id_restores_remaining_type():
+    matter = {"@id": "ex:Nafion", "@type": MATTER, "skos:prefLabel": "Nafion"}
+    manufacturing = {"@id": "ex:Nafion", "@type": MANUFACTURING, "skos:prefLabel": "Nafion casting"}
+    store = GraphStore()
+    store.add_items([matter, manufacturing])
+    assert store.type_names() == ["Manufacturing"]
+
+    store.remove_items([manufacturing])
+    assert store.type_names() == ["Matter"]
+    nodes, _ = store.to_echarts(types=["Matter"])
+    assert "ex:Nafion" in {node["name"] for node in nodes}
+
+    store.remove_items([matter])
+    assert store.type_names() == []
+    nodes, _ = store.to_echarts()
+    assert "ex:Nafion" not in {node["name"] for node in nodes}
+
+def test_editor_keeps_type_of_remaining_duplicate():
+    matter = {"@id": "ex:Nafion", "@type": MATTER}
+    manufacturing = {"@id": "ex:Nafion", "@type": MANUFACTURING}
+    editor = GraphEditor()
+    editor.update({"@graph": [matter, manufacturing]})
+    editor.update({"@graph": [matter]})
+    assert editor.store.type_names() == ["Matter"]
+
+def test_type_follows_most_recent_remaining_definition():
+    matter = {"@id": "ex:Nafion", "@type": MATTER}
+    manufacturing = {"@id": "ex:Nafion", "@type": MANUFACTURING}
+    store = GraphStore()
+    store.add_items([matter, manufacturing, matter])
+    assert store.type_names() == ["Matter"]
+    store.remove_items([matter])
+    assert store.type_names() == ["Matter"]
+    store.remove_items([matter])
+    assert store.type_names() == ["Manufacturing"]
@@ -0,0 +1,29 @@
+from utils import json_validator
+from utils.json_validator import extract_json_from_text
+
+def counting_loads(monkeypatch):
+    parsed = []
+    loads = json_validator.json_loads
+
+    def json_loads(text):
+        parsed.append(text)
+        return loads(text)
+
+    monkeypatch.setattr(json_validator, "json_loads", json_loads)
+    return parsed
+
+def test_fast_path_span_is_not_parsed_again(monkeypatch):
+    parsed = counting_loads(monkeypatch)
+    # Invalid JSON (a trailing comma) in the only object of the response
+    text = 'Here is the graph: {"@context": {}, "@graph": [{"@id": "ex:A"},]} Done.'
+    assert extract_json_from_text(text, repair=False) is None
+    assert len(parsed) == len(set(parsed))
+
+def test_fast_path_object_without_graph_is_the_fallback(monkeypatch):
+    parsed = counting_loads(monkeypatch)
+    assert extract_json_from_text('Result: {"name": "Nafion"}') == {"name": "Nafion"}
+    assert len(parsed) == 1
+
+def test_graph_object_after_prose_object_is_preferred():
+    text = 'Notes {"note": 1} and the graph {"@context": {}, "@graph": []}'
+    assert extract_json_from_text(text) == {"@context": {}, "@graph": []}
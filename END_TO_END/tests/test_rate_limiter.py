@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from utils import api_clients
+from utils.rate_limiter import RateLimiter, configure_rate_limit, get_rate_limiter
+
+class RateLimitError(Exception):
+    status_code = 429
+
+def test_settle_returns_unused_reservation():
+    limiter = RateLimiter(rpm=1000, tpm=6000)
+    limiter.acquire(5000)
+    limiter.settle(5000, used=1000)
+    start = time.monotonic()
+    # Only 1000 tokens were used, so 5000 more fit without waiting
+    limiter.acquire(5000)
+    assert time.monotonic() - start < 0.5
+
+def test_rate_limited_attempts_are_refunded(monkeypatch):
+    configure_rate_limit("OpenAI API", "refund-test", rpm=1000, tpm=6000)
+    calls = []
+
+    def fake_openai(content, api_key, model="gpt-4o", usage=None):
+        calls.append(content)
+        if len(calls) == 1:
+            raise RateLimitError("slow down")
+        usage.update({"prompt_tokens": 100, "completion_tokens": 20})
+        return "answer"
+
+    monkeypatch.setattr(api_clients, "call_openai_api", fake_openai)
+    monkeypatch.setattr(api_clients, "retry_after_seconds", lambda error: 0.01)
+    assert api_clients.unified_api_call("OpenAI API", "prompt", "key", "refund-test", use_cache=False) == "answer"
+    assert len(calls) == 2
+    limiter = get_rate_limiter("OpenAI API", "refund-test")
+    # Only the successful attempt's reported usage is charged
+    assert limiter._tokens.available == pytest.approx(6000 - 120, abs=50)
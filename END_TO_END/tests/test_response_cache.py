@@ -0,0 +1,44 @@
+import sqlite3
+
+from utils.response_cache import ResponseCache
+
+def test_size_budget_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    first = ResponseCache(path, max_bytes=250)
+    second = ResponseCache(path, max_bytes=250)
+    first.set("a", "x" * 100)
+    second.set("b", "y" * 100)
+    first.set("c", "z" * 100)
+    # The oldest entry was evicted although another instance wrote it
+    assert first.stats()["bytes"] == 200
+    assert second.get("a") is None
+    assert second.get("c") == "z" * 100
+
+def test_hit_does_not_need_the_write_lock(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = ResponseCache(path)
+    cache.set("a", "cached")
+    writer = sqlite3.connect(path, isolation_level=None, timeout=0)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        assert cache.get("a") == "cached"
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+    assert cache.stats()["hits"] == 1
+
+def test_database_errors_do_not_fail_requests(tmp_path):
+    # A directory cannot be opened as a database
+    cache = ResponseCache(str(tmp_path))
+    cache.set("a", "value")
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+def test_hits_count_as_recent_use_for_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=250)
+    cache.set("a", "x" * 100)
+    cache.set("b", "y" * 100)
+    assert cache.get("a") == "x" * 100
+    cache.set("c", "z" * 100)
+    assert cache.get("a") == "x" * 100
+    assert cache.get("b") is None
@@ -1,6 +1,23 @@
 import os
-import openai
-from groq import Groq
+import threading
+import time
+from utils.response_cache import get_response_cache
+from utils.rate_limiter import (
+    get_rate_limiter, is_rate_limit_error, retry_after_seconds,
+    RESERVED_OUTPUT_TOKENS, MAX_RATE_LIMIT_RETRIES
+)
+from utils.token_utils import count_tokens
+from utils.token_accounting import get_token_ledger
+
+# Connection pool settings shared by every pooled client; SDK retries are off so that
+# rate-limit responses reach the limiter's backoff instead of the SDK's own sleeps
+client_settings = {
+    "max_connections": 20,
+    "timeout": 120.0,
+    "max_retries": 0
+}
+_clients = {}
+_clients_lock = threading.Lock()
 
 def truncate_conversation(conversation, max_tokens=120000):
     """Truncate conversation to fit within context length."""
@@ -9,33 +26,225 @@ def truncate_conversation(conversation, max_tokens=120000):
         conversation.pop(0)  # Remove the oldest message
         total_tokens = sum(len(item["content"].split()) for item in conversation if item["content"])
 
-def call_openai_api(content, api_key, model="gpt-4o"):
+def configure_clients(max_connections=None, timeout=None, max_retries=None):
+    """Update connection pool settings and drop clients built with the old ones."""
+    with _clients_lock:
+        if max_connections is not None:
+            client_settings["max_connections"] = max_connections
+        if timeout is not None:
+            client_settings["timeout"] = timeout
+        if max_retries is not None:
+            client_settings["max_retries"] = max_retries
+        stale = list(_clients.values())
+        _clients.clear()
+    for client in stale:
+        client.close()
+
+def _pool_options():
+    """Return httpx limits and timeout built from the current client settings."""
+    import httpx
+    limits = httpx.Limits(
+        max_connections=client_settings["max_connections"],
+        max_keepalive_connections=client_settings["max_connections"]
+    )
+    return limits, httpx.Timeout(client_settings["timeout"])
+
+def get_client(api_choice, api_key):
+    """Return a pooled client for (api_choice, api_key), creating it on first use.
+    
+    Clients keep their HTTP connections alive between calls and are safe to
+    share across threads.
+    """
+    key = (api_choice, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # Provider SDKs are imported on first use to keep startup fast
+            import httpx
+            limits, timeout = _pool_options()
+            http_client = httpx.Client(limits=limits, timeout=timeout)
+            if api_choice == "OpenAI API":
+                import openai
+                client = openai.OpenAI(api_key=api_key, http_client=http_client,
+                                       max_retries=client_settings["max_retries"])
+            elif api_choice == "Groq API":
+                from groq import Groq
+                client = Groq(api_key=api_key, http_client=http_client,
+                              max_retries=client_settings["max_retries"])
+            else:
+                raise ValueError("Invalid API Choice")
+            _clients[key] = client
+        return client
+
+def close_clients():
+    """Close every pooled synchronous client and its connections."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+def _used_tokens(usage, prompt_tokens, response, model):
+    """Return the tokens a request counts against the TPM limit, from usage fields when reported."""
+    usage = usage or {}
+    if usage.get("prompt_tokens") is not None:
+        prompt_tokens = usage["prompt_tokens"]
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = count_tokens(response, model)
+    return prompt_tokens + completion_tokens
+
+def _usage_fields(usage):
+    """Return the token counts of a provider usage object, or None if it has none."""
+    if usage is None or getattr(usage, "prompt_tokens", None) is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": getattr(usage, "completion_tokens", None)}
+
+def call_openai_api(content, api_key, model="gpt-4o", usage=None):
     """Simplified OpenAI API call without persistent conversation.
     # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
     # do not change this unless explicitly requested by the user
+    
+    If usage is a dict, the token counts reported by the API are stored in it.
     """
-    client = openai.OpenAI(api_key=api_key)
+    client = get_client("OpenAI API", api_key)
     messages = [{"role": "user", "content": content}]
     response = client.chat.completions.create(
         model=model,
         messages=messages
     )
+    if usage is not None:
+        usage.update(_usage_fields(getattr(response, "usage", None)) or {})
     return response.choices[0].message.content
 
-def call_groq_api(prompt, api_key, model="llama3-8b-8192"):
-    """Make an API call to Groq."""
-    client = Groq(api_key=api_key)
+def call_groq_api(prompt, api_key, model="llama3-8b-8192", usage=None):
+    """Make an API call to Groq.
+    
+    If usage is a dict, the token counts reported by the API are stored in it.
+    """
+    client = get_client("Groq API", api_key)
     chat_completion = client.chat.completions.create(
             messages=[{"role": "user", "content": prompt}],
             model=model
         )
+    if usage is not None:
+        usage.update(_usage_fields(getattr(chat_completion, "usage", None)) or {})
     return chat_completion.choices[0].message.content
 
-def unified_api_call(api_choice, prompt, api_key, model):
-    """Unified API call function."""
-    if api_choice == "OpenAI API":
-        return call_openai_api(prompt, api_key, model=model)
-    elif api_choice == "Groq API":
-        return call_groq_api(prompt, api_key, model=model)
-    else:
+def unified_api_call(api_choice, prompt, api_key, model, use_cache=True, stage=None):
+    """Unified API call function.
+    
+    Identical requests are answered from the on-disk response cache unless
+    use_cache is False. Other requests wait for room in the provider's
+    request and token budget and are retried with backoff when the provider
+    answers with a rate-limit error. Every call is recorded in the token
+    ledger under stage.
+    """
+    if api_choice not in ("OpenAI API", "Groq API"):
         raise ValueError("Invalid API Choice")
+    
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(api_choice, model, prompt)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            get_token_ledger().record(stage, prompt, cached, model, cached=True)
+            return cached
+    
+    limiter = get_rate_limiter(api_choice, model)
+    prompt_tokens = count_tokens(prompt, model)
+    estimated_tokens = prompt_tokens + RESERVED_OUTPUT_TOKENS
+    
+    usage = {}
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(estimated_tokens)
+        start = time.perf_counter()
+        try:
+            if api_choice == "OpenAI API":
+                response = call_openai_api(prompt, api_key, model=model, usage=usage)
+            else:
+                response = call_groq_api(prompt, api_key, model=model, usage=usage)
+        except Exception as e:
+            # A failed or rate-limited request is not counted by the provider
+            limiter.settle(estimated_tokens)
+            if not is_rate_limit_error(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            # Exponential fallback when the provider does not say how long to wait
+            limiter.on_rate_limited(retry_after_seconds(e) or 2 ** attempt)
+            continue
+        limiter.settle(estimated_tokens, _used_tokens(usage, prompt_tokens, response, model))
+        limiter.on_success()
+        break
+    
+    get_token_ledger().record(stage, prompt, response, model, usage=usage, seconds=time.perf_counter() - start)
+    if cache is not None:
+        cache.set(cache_key, response)
+    return response
+
+def stream_api_call(api_choice, prompt, api_key, model, use_cache=True, stage=None):
+    """Streaming variant of unified_api_call that yields the response text piece by piece.
+    
+    Cached responses are yielded in one piece. A completed stream is stored
+    in the response cache, so a later unified_api_call for the same prompt
+    is answered without a request.
+    """
+    if api_choice not in ("OpenAI API", "Groq API"):
+        raise ValueError("Invalid API Choice")
+    
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(api_choice, model, prompt)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            get_token_ledger().record(stage, prompt, cached, model, cached=True)
+            yield cached
+            return
+    
+    limiter = get_rate_limiter(api_choice, model)
+    prompt_tokens = count_tokens(prompt, model)
+    estimated_tokens = prompt_tokens + RESERVED_OUTPUT_TOKENS
+    client = get_client(api_choice, api_key)
+    # OpenAI only reports usage for a stream when asked to (openai>=1.26), in a final chunk
+    # without choices; a stream that ends without one is counted with the tokenizer
+    options = {"stream_options": {"include_usage": True}} if api_choice == "OpenAI API" else {}
+    
+    # Rate-limit errors arrive before the first token, so only opening the stream is retried
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(estimated_tokens)
+        start = time.perf_counter()
+        try:
+            stream = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **options
+            )
+        except Exception as e:
+            limiter.settle(estimated_tokens)
+            if not is_rate_limit_error(e) or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            limiter.on_rate_limited(retry_after_seconds(e) or 2 ** attempt)
+            continue
+        limiter.on_success()
+        break
+    
+    # The reservation is settled once the stream has ended and its size is known
+    pieces = []
+    usage = None
+    for chunk in stream:
+        # Groq reports usage on the last chunk under x_groq
+        usage = _usage_fields(getattr(chunk, "usage", None)) \
+            or _usage_fields(getattr(getattr(chunk, "x_groq", None), "usage", None)) or usage
+        if not chunk.choices:
+            continue
+        piece = chunk.choices[0].delta.content
+        if piece:
+            pieces.append(piece)
+            yield piece
+    
+    limiter.settle(estimated_tokens, _used_tokens(usage, prompt_tokens, "".join(pieces), model))
+    get_token_ledger().record(
+        stage, prompt, "".join(pieces), model, usage=usage, seconds=time.perf_counter() - start
+    )
+    if cache is not None:
+        cache.set(cache_key, "".join(pieces))
@@ -0,0 +1,205 @@
+import json
+import os
+import time
+import uuid
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Provider limit on requests per batch input file
+MAX_REQUESTS_PER_FILE = 50000
+
+CUSTOM_ID_SEPARATOR = "::"
+
+def make_custom_id(document_id, stage, chunk_index):
+    """Return the batch custom_id identifying one request of a document."""
+    return f"{document_id}{CUSTOM_ID_SEPARATOR}{stage}{CUSTOM_ID_SEPARATOR}{chunk_index}"
+
+def parse_custom_id(custom_id):
+    """Split a custom_id back into (document_id, stage, chunk_index)."""
+    document_id, stage, chunk_index = custom_id.rsplit(CUSTOM_ID_SEPARATOR, 2)
+    return document_id, stage, int(chunk_index)
+
+def build_batch_request(custom_id, model, prompt):
+    """Return one request line in the OpenAI batch input format."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+    }
+
+def write_batch_files(requests, directory, prefix="batch", max_requests=MAX_REQUESTS_PER_FILE):
+    """Write requests to JSONL job files of at most max_requests lines each.
+
+    Returns the paths of the written files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    handle = None
+    count = 0
+    try:
+        for request in requests:
+            if handle is None or count >= max_requests:
+                if handle is not None:
+                    handle.close()
+                path = os.path.join(directory, f"{prefix}-{len(paths):04d}.jsonl")
+                handle = open(path, "w", encoding="utf-8")
+                paths.append(path)
+                count = 0
+            handle.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        if handle is not None:
+            handle.close()
+    return paths
+
+def read_batch_output(lines):
+    """Map custom_id to response content for every line of a batch output file.
+
+    Failed requests map to None.
+    """
+    results = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        content = None
+        if not record.get("error") and response.get("status_code", 200) == 200:
+            choices = (response.get("body") or {}).get("choices") or []
+            if choices:
+                content = choices[0]["message"]["content"]
+        results[record["custom_id"]] = content
+    return results
+
+class BatchBackend:
+    """Base class for services that run JSONL batch job files."""
+    def submit(self, path):
+        """Submit a job file and return its job id."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def status(self, job_id):
+        """Return "completed", "failed" or another in-progress status string."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def results(self, job_id):
+        """Return the output lines of a completed job."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+class APIBatchBackend(BatchBackend):
+    """Batch backend for the OpenAI and Groq batch APIs."""
+    def __init__(self, api_choice, api_key, completion_window="24h"):
+        from utils.api_clients import get_client
+        self.client = get_client(api_choice, api_key)
+        self.completion_window = completion_window
+
+    def submit(self, path):
+        with open(path, "rb") as handle:
+            input_file = self.client.files.create(file=handle, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, job_id):
+        status = self.client.batches.retrieve(job_id).status
+        if status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return status
+
+    def results(self, job_id):
+        batch = self.client.batches.retrieve(job_id)
+        if not batch.output_file_id:
+            return []
+        return self.client.files.content(batch.output_file_id).text.splitlines()
+
+class LocalFileBatchBackend(BatchBackend):
+    """File-based stand-in for a batch service, for testing without network access.
+
+    Submitted job files are copied into directory and answered line by line
+    with responder(body), which returns the completion text for a request
+    body. The default responder answers every request with an empty JSON
+    array.
+    """
+    def __init__(self, directory, responder=None):
+        self.directory = directory
+        self.responder = responder or (lambda body: "[]")
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, kind):
+        return os.path.join(self.directory, f"{job_id}.{kind}.jsonl")
+
+    def submit(self, path):
+        job_id = f"local-{uuid.uuid4().hex}"
+        with open(path, encoding="utf-8") as source, open(self._path(job_id, "input"), "w", encoding="utf-8") as target:
+            for line in source:
+                target.write(line)
+        return job_id
+
+    def status(self, job_id):
+        if not os.path.exists(self._path(job_id, "input")):
+            return "failed"
+        if not os.path.exists(self._path(job_id, "output")):
+            self._run(job_id)
+        return "completed"
+
+    def _run(self, job_id):
+        output_path = self._path(job_id, "output")
+        with open(self._path(job_id, "input"), encoding="utf-8") as source, \
+                open(output_path + ".tmp", "w", encoding="utf-8") as target:
+            for line in source:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    content = self.responder(request["body"])
+                    record = {
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+                        },
+                        "error": None
+                    }
+                except Exception as e:
+                    record = {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+                target.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(output_path + ".tmp", output_path)
+
+    def results(self, job_id):
+        with open(self._path(job_id, "output"), encoding="utf-8") as handle:
+            return handle.readlines()
+
+def run_batch(requests, backend, directory, prefix="batch", poll_interval=30.0, timeout=None):
+    """Write, submit and wait for a batch of requests.
+
+    Returns a dict mapping each custom_id to its response content (None for
+    failed requests). Raises TimeoutError if the jobs do not finish in time.
+    """
+    paths = write_batch_files(requests, directory, prefix)
+    job_ids = [backend.submit(path) for path in paths]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = {}
+    pending = list(job_ids)
+    while pending:
+        still_pending = []
+        for job_id in pending:
+            status = backend.status(job_id)
+            if status == "completed":
+                results.update(read_batch_output(backend.results(job_id)))
+            elif status == "failed":
+                raise RuntimeError(f"Batch job {job_id} failed")
+            else:
+                still_pending.append(job_id)
+        pending = still_pending
+        if pending:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Batch jobs still running: {', '.join(pending)}")
+            time.sleep(poll_interval)
+    return results
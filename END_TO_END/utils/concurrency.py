@@ -0,0 +1,64 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_MAX_CONCURRENCY = 1
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that runs every task in a copy of the submitting thread's context.
+
+    Context variables, such as the token ledger of the current run, follow
+    the work into the pool's threads.
+    """
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def map_in_order(func, items, max_concurrency=DEFAULT_MAX_CONCURRENCY, on_result=None):
+    """Apply func to every item with at most max_concurrency calls in flight.
+
+    Results are returned in the order of the input items. Items are pulled
+    from the iterable lazily, so generators are never fully materialized.
+    on_result(index, result) is invoked from the calling thread as each item
+    finishes, which keeps Streamlit callbacks on the script thread.
+    """
+    max_concurrency = max(1, int(max_concurrency or 1))
+    results = {}
+
+    if max_concurrency == 1:
+        for index, item in enumerate(items):
+            result = func(item)
+            results[index] = result
+            if on_result:
+                on_result(index, result)
+        return [results[i] for i in range(len(results))]
+
+    iterator = enumerate(items)
+    with ContextThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = {}
+
+        def submit_next():
+            try:
+                index, item = next(iterator)
+            except StopIteration:
+                return False
+            pending[executor.submit(func, item)] = index
+            return True
+
+        while len(pending) < max_concurrency and submit_next():
+            pass
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    result = future.result()
+                    results[index] = result
+                    if on_result:
+                        on_result(index, result)
+                    submit_next()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    return [results[i] for i in range(len(results))]
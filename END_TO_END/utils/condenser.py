@@ -0,0 +1,95 @@
+import math
+from utils.api_clients import unified_api_call
+from utils.concurrency import map_in_order, DEFAULT_MAX_CONCURRENCY
+from utils.pdf_processor import get_chunk_token_budget
+from utils.token_utils import count_tokens
+
+DEFAULT_FAN_IN = 4
+
+def group_parts(parts, fan_in=DEFAULT_FAN_IN, max_tokens=None, model="gpt-4o"):
+    """Group consecutive parts into merges of at most fan_in parts.
+
+    A group is also closed early once it would exceed max_tokens, but every
+    group except possibly the last holds at least two parts so each level of
+    the reduction is guaranteed to shrink.
+    """
+    fan_in = max(2, int(fan_in))
+    groups = []
+    current = []
+    current_tokens = 0
+    for part in parts:
+        tokens = count_tokens(part, model) if max_tokens is not None else 0
+        too_large = max_tokens is not None and current_tokens + tokens > max_tokens
+        if current and (len(current) >= fan_in or (too_large and len(current) >= 2)):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def estimate_merge_count(part_count, fan_in=DEFAULT_FAN_IN):
+    """Estimate the number of condense calls a reduction over part_count parts needs."""
+    fan_in = max(2, int(fan_in))
+    total = 0
+    remaining = part_count
+    while remaining > 0:
+        remaining = math.ceil(remaining / fan_in)
+        total += remaining
+        if remaining == 1:
+            break
+    return max(1, total)
+
+def tree_condense(parts, instruction, merge_instruction, api_choice, api_key, model, **kwargs):
+    """Condense parts with a parallel tree reduction.
+
+    Each level merges groups of up to fan_in parts with one call per group,
+    running a level's calls concurrently, until a single output remains. The
+    first level uses instruction and later levels merge_instruction. The tree
+    depth grows logarithmically with the number of parts. progress_callback,
+    if given, receives the completed fraction between 0.0 and 1.0, and the
+    calls are recorded in the token ledger under stage. use_cache is passed
+    to every call.
+    """
+    fan_in = kwargs.get('fan_in', DEFAULT_FAN_IN)
+    max_concurrency = kwargs.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+    max_tokens = kwargs.get('max_tokens', None)
+    if max_tokens is None:
+        max_tokens = get_chunk_token_budget(model, merge_instruction, api_choice)
+    progress_callback = kwargs.get('progress_callback', None)
+    stage = kwargs.get('stage', None)
+    use_cache = kwargs.get('use_cache', True)
+
+    parts = [part for part in parts if part]
+    if not parts:
+        return ""
+
+    expected_merges = estimate_merge_count(len(parts), fan_in)
+    completed = [0]
+    level_instruction = instruction
+
+    def on_result(index, response):
+        completed[0] += 1
+        if progress_callback:
+            progress_callback(min(1.0, completed[0] / expected_merges))
+
+    while True:
+        groups = group_parts(parts, fan_in, max_tokens, model)
+        prefix = level_instruction
+        single_group = len(groups) == 1
+
+        def merge(group):
+            # A leftover single part is carried up to the next level unchanged
+            if len(group) == 1 and not single_group:
+                return group[0]
+            return unified_api_call(
+                api_choice, prefix + "\n" + "\n".join(group), api_key, model, use_cache=use_cache, stage=stage
+            )
+
+        responses = map_in_order(merge, groups, max_concurrency, on_result)
+        parts = [response.strip() for response in responses if response]
+        level_instruction = merge_instruction
+        if len(parts) <= 1:
+            return parts[0] if parts else ""
@@ -0,0 +1,177 @@
+import re
+import unicodedata
+from collections import deque
+from utils.structured_extraction import CATEGORY_ALIASES, format_entities, normalize_name
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Single-word names shorter than this (e.g. "C", "a") would match almost every chunk
+MIN_NAME_CHARS = 2
+
+# Category labels, singular, that introduce a comma-separated list of names
+CATEGORY_LABELS = {alias.rstrip("s") for alias in CATEGORY_ALIASES}
+
+# Inflection suffixes folded away so "hot pressing" also matches "hot pressed"
+SUFFIX_PATTERN = re.compile(r"(?<=\w{4})(?:ing|ed|(?<!s)s)$")
+
+def mention_words(text):
+    """Return the casefolded, suffix-folded words of text, the unit the mention index matches on."""
+    words = WORD_PATTERN.findall(unicodedata.normalize("NFKC", str(text)).casefold())
+    return [SUFFIX_PATTERN.sub("", word) for word in words]
+
+class MentionIndex:
+    """Aho-Corasick automaton over word sequences.
+
+    Each added name is a path of words in a trie; find() walks a text's
+    words through the automaton once and returns the values of every name
+    occurring in it as a whole-word phrase, however many names there are.
+    Names can be added at any time; the failure links are rebuilt lazily
+    on the next lookup.
+    """
+    def __init__(self, names=()):
+        self.goto = [{}]
+        self.values = [[]]
+        self.fail = None
+        self.output = None
+        for name, value in names:
+            self.add(name, value)
+
+    def __len__(self):
+        return sum(len(values) for values in self.values)
+
+    def add(self, name, value):
+        """Index name so that find() reports value wherever it is mentioned."""
+        words = mention_words(name)
+        if not words or (len(words) == 1 and len(words[0]) < MIN_NAME_CHARS):
+            return
+        state = 0
+        for word in words:
+            following = self.goto[state].get(word)
+            if following is None:
+                following = len(self.goto)
+                self.goto.append({})
+                self.values.append([])
+                self.goto[state][word] = following
+            state = following
+        self.values[state].append(value)
+        self.fail = None
+
+    def _build(self):
+        """Compute failure links and, per state, the nearest shorter match in its failure chain."""
+        self.fail = [0] * len(self.goto)
+        self.output = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, following in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(word, 0)
+                if target == following:
+                    target = 0
+                self.fail[following] = target
+                self.output[following] = target if self.values[target] else self.output[target]
+                queue.append(following)
+
+    def find(self, text):
+        """Return the set of values whose names occur in text."""
+        if self.fail is None:
+            self._build()
+        found = set()
+        state = 0
+        for word in mention_words(text):
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            match = state
+            while match:
+                found.update(self.values[match])
+                match = self.output[match]
+        return found
+
+def _entry_names(text):
+    """Return the names an entity list line refers to, or None if the line is a heading.
+
+    Handles "Category: name, name", "Name: description", "Name - description"
+    and "Name (ABBR)" lines, with any bullet or numbering in front.
+    """
+    stripped = re.sub(r"^[\s\-*•#>\d.)]+", "", text).strip().strip("*").strip()
+    if not stripped:
+        return None
+    label, colon, rest = stripped.partition(":")
+    label = label.strip().strip("*").strip()
+    rest = rest.strip()
+    if colon and not rest:
+        return None
+    if colon and normalize_name(label).rstrip("s") in CATEGORY_LABELS:
+        candidates = re.split(r"[,;]", rest)
+    elif colon:
+        candidates = [label]
+    else:
+        candidates = [re.split(r"\s[-–—]\s", stripped)[0]]
+    names = []
+    for candidate in candidates:
+        for abbreviation in re.findall(r"\(([^()]{1,40})\)", candidate):
+            names.append(abbreviation)
+        name = re.sub(r"\([^()]*\)", "", candidate).strip()
+        if name:
+            names.append(name)
+    return names
+
+def parse_entity_entries(entities):
+    """Split a plain-text entity list into entries.
+
+    Returns (heading, line, names) tuples, where heading is the last
+    heading line seen before the entry (or None).
+    """
+    entries = []
+    heading = None
+    for line in (entities or "").splitlines():
+        if not line.strip():
+            continue
+        names = _entry_names(line)
+        if names is None:
+            heading = line
+        else:
+            entries.append((heading, line, names))
+    return entries
+
+def format_entity_entries(entries):
+    """Render entries as text, repeating each heading once before its first selected entry."""
+    lines = []
+    current = None
+    for heading, line, _ in entries:
+        if heading is not None and heading != current:
+            lines.append(heading)
+        current = heading
+        lines.append(line)
+    return "\n".join(lines)
+
+def entity_contexts(chunks, entities, entity_records=None, neighbors=0):
+    """Return, for each chunk, the part of the entity list that is relevant to it.
+
+    An entity is relevant to a chunk when one of its names (or an
+    abbreviation given in parentheses) occurs in that chunk or in one of the
+    neighbors chunks on either side, so relationships spanning a chunk
+    boundary keep both endpoints. A chunk that mentions none of the
+    entities gets the full list, as before.
+    """
+    if entity_records is not None:
+        entries = [(None, format_entities([record]), [record.name]) for record in entity_records]
+    else:
+        entries = parse_entity_entries(entities)
+    index = MentionIndex(
+        (name, position) for position, (_, _, names) in enumerate(entries) for name in names
+    )
+    mentions = [index.find(chunk) for chunk in chunks]
+    contexts = []
+    for position in range(len(chunks)):
+        selected = set()
+        for other in range(max(0, position - neighbors), min(len(chunks), position + neighbors + 1)):
+            selected.update(mentions[other])
+        if selected:
+            contexts.append(format_entity_entries(entries[i] for i in sorted(selected)))
+        else:
+            contexts.append(entities)
+    return contexts
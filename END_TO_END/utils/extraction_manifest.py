@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+
+DEFAULT_MANIFEST_DIR = os.environ.get(
+    "KG_EXTRACTOR_MANIFESTS",
+    os.path.join(os.path.expanduser("~"), ".cache", "kg_extractor", "manifests")
+)
+
+MANIFEST_VERSION = 1
+
+def hash_text(*parts):
+    """Return the sha256 hex digest of the given strings."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ExtractionManifest:
+    """Per-document store of extraction results for each chunk, keyed on content hashes.
+
+    A chunk's entity result is keyed on its text, the entity prompt and the
+    model; its relationship result also on the entity context it was
+    extracted with. save() keeps only the entries looked up since the
+    manifest was loaded, so the file always mirrors the latest revision of
+    the document.
+    """
+    def __init__(self, document_id, directory=DEFAULT_MANIFEST_DIR):
+        self.document_id = document_id
+        self.path = os.path.join(directory, hash_text(document_id)[:32] + ".json")
+        self.results = {"entities": {}, "relationships": {}}
+        self.used = {"entities": set(), "relationships": set()}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Read the stored results, ignoring missing, corrupt or outdated files."""
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("document_id") != self.document_id:
+            return
+        for kind in self.results:
+            self.results[kind] = dict(data.get(kind) or {})
+
+    @staticmethod
+    def entity_key(chunk, prompt, api_choice, model):
+        """Return the key of a chunk's entity extraction result."""
+        return hash_text("entities", api_choice, model, prompt, chunk)
+
+    @staticmethod
+    def relationship_key(chunk, entities, prompt, api_choice, model):
+        """Return the key of a chunk's relationship result for a given entity context."""
+        return hash_text("relationships", api_choice, model, prompt, chunk, hash_text(entities))
+
+    def get(self, kind, key):
+        """Return the stored result for key, or None if the chunk must be extracted."""
+        self.used[kind].add(key)
+        value = self.results[kind].get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, kind, key, value):
+        """Record the result of extracting a chunk."""
+        self.used[kind].add(key)
+        self.results[kind][key] = value or ""
+
+    def save(self):
+        """Write the results used by the current run to disk atomically."""
+        data = {"version": MANIFEST_VERSION, "document_id": self.document_id}
+        for kind, results in self.results.items():
+            data[kind] = {key: results[key] for key in self.used[kind] if key in results}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump(data, handle, ensure_ascii=False)
+        os.replace(self.path + ".tmp", self.path)
+
+    def stats(self):
+        """Return how many per-chunk results were reused and how many were extracted."""
+        return {"reused": self.hits, "extracted": self.misses}
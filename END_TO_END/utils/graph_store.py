@@ -0,0 +1,493 @@
+import json
+from array import array
+from collections import Counter
+
+# EMMO class IRIs and the category their instances are linked to
+NODE_TYPES = {
+    "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94": "Matter",
+    "emmo:EMMO_a4d66059_5dd3_4b90_b4cb_10960559441b": "Manufacturing",
+    "emmo:EMMO_463bcfda_867b_41d9_a967_211d4d437cfb": "Measurement",
+    "emmo:EMMO_b7bcff25_ffc3_474e_9ab5_01b1664bd4ba": "Property",
+    "emmo:EMMO_d1d436e7_72fc_49cd_863b_7bfb4ba5276a": "Parameter",
+    "emmo:EMMO_EMMO_4207e895_8b83_4318_996a_72cfb32acd93": "Simulation",
+    "emmo:EMMO_EMMO_4207e895_8b83_4318_996a_72cfb32acd92": "Metadata"
+}
+
+# Node categories; a node's category is stored as its index in this list
+CATEGORIES = [
+    "Matter", "Manufacturing", "Measurement", "Property", "Parameter", "Simulation", "Metadata",
+    "Instance/Individual", "Value/Literal", "Unit", "Unknown"
+]
+CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORIES)}
+INSTANCE = CATEGORY_CODES["Instance/Individual"]
+LITERAL = CATEGORY_CODES["Value/Literal"]
+UNIT = CATEGORY_CODES["Unit"]
+# Nodes that are only referenced by a link and never defined by an @graph item
+REFERENCED = -1
+# Instances without a known EMMO class, and nodes that are not instances
+UNTYPED = -1
+
+CATEGORY_COLORS = {
+    "Matter": "#5470c6",         # Blue
+    "Manufacturing": "#ee6666",  # Red
+    "Measurement": "#fac858",    # Yellow
+    "Property": "#73c0de",       # Cyan
+    "Parameter": "#91cc75",      # Green
+    "Simulation": "#a5a5a5",     # Grey
+    "Metadata": "#9b59b6",       # Purple
+    "Instance/Individual": "#3ba272", # Dark Green
+    "Value/Literal": "#fc8452",  # Orange
+    "Unit": "#d14a61",           # Dark Red
+    "Unknown": "#ccc"            # Grey
+}
+
+RELATIONSHIP_KEYS = {
+    "emmo:EMMO_e1097637": "is_manufacturing_input",
+    "emmo:EMMO_e1245987": "has_manufacturing_output",
+    "emmo:EMMO_m5677989": "is_measurement_input",
+    "emmo:EMMO_m87987545": "has_measurement_output",
+    "emmo:EMMO_m5677980": "is_model_input",
+    "emmo:EMMO_m87987546": "has_model_output",
+    "emmo:EMMO_p5778r78": "has_property",
+    "emmo:EMMO_p46903ar7": "has_parameter",
+    "skos:prefLabel": "skos:prefLabel"
+}
+
+TYPE_CODES = {type_id: CATEGORY_CODES[name] for type_id, name in NODE_TYPES.items()}
+
+# One shared style payload per category instead of one dict per node
+CATEGORY_STYLES = {code: {"color": CATEGORY_COLORS[name]} for code, name in enumerate(CATEGORIES)}
+
+class GraphStore:
+    """Compact node/edge store for a JSON-LD knowledge graph.
+
+    Node names and edge labels are interned to integer ids; node
+    categories, node classes, edge endpoints and edge labels are kept in
+    typed arrays, and a dict keyed on the packed (label, source, target) ids
+    makes edge deduplication O(1). Every value node has exactly one unit
+    node, so unit nodes and their links are implied rather than stored.
+    @graph items are added in a single pass, and ECharts nodes and links
+    are only rendered by to_echarts().
+
+    Items can also be removed again: each node counts the items defining it
+    and each edge the items contributing it, and an edge whose count drops
+    to zero is left out of every view until an item adds it back. Ids are
+    never reused, so rendered dicts stay valid and only new or changed
+    nodes and links are rendered after an update.
+    """
+    __slots__ = (
+        "names", "node_ids", "categories", "node_types", "type_definitions", "definitions", "labels", "label_ids",
+        "edge_sources", "edge_targets", "edge_labels", "edge_counts", "edge_ids",
+        "_node_dicts", "_unit_dicts", "_link_dicts", "_dirty_nodes", "_views", "_relationship_labels"
+    )
+
+    def __init__(self):
+        self.names = []
+        self.node_ids = {}
+        self.categories = array("b")
+        # Class code of each instance, the class's own code for class nodes, UNTYPED otherwise
+        self.node_types = array("b")
+        # Classes of nodes defined by more than one typed item (duplicate @ids):
+        # node id -> {class code: number of those items}, most recently added class last
+        self.type_definitions = {}
+        # Number of @graph items defining each node
+        self.definitions = array("i")
+        self.labels = []
+        self.label_ids = {}
+        self.edge_sources = array("i")
+        self.edge_targets = array("i")
+        self.edge_labels = array("i")
+        # Number of @graph items contributing each edge; edges at zero are not shown
+        self.edge_counts = array("i")
+        self.edge_ids = {}
+        self._node_dicts = []
+        self._unit_dicts = {}
+        self._link_dicts = []
+        self._dirty_nodes = set()
+        self._views = {}
+        self._relationship_labels = None
+        # Class nodes come first, so a class node's id is its category code
+        for code, name in enumerate(CATEGORIES[:len(NODE_TYPES)]):
+            self.add_node(name, code)
+            self.node_types[code] = code
+        for type_id, name in NODE_TYPES.items():
+            self.node_ids[type_id] = self.node_ids[name]
+
+    @classmethod
+    def from_json_ld(cls, data):
+        """Build a store from a JSON-LD document with an @graph list."""
+        store = cls()
+        store.add_items(data.get("@graph", []))
+        return store
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_sources)
+
+    def _changed(self):
+        """Drop cached views after the graph changed; rendered dicts are kept."""
+        self._views = {}
+        self._relationship_labels = None
+
+    def add_node(self, name, category):
+        """Return the id of the node called name, adding it if needed.
+
+        A node first seen as a link target is upgraded when its category
+        becomes known.
+        """
+        node = self.node_ids.get(name)
+        if node is None:
+            node = self.node_ids[name] = len(self.names)
+            self.names.append(name)
+            self.categories.append(category)
+            self.node_types.append(UNTYPED)
+            self.definitions.append(0)
+            self._changed()
+        elif category != REFERENCED and self.categories[node] == REFERENCED:
+            self.categories[node] = category
+            self._dirty_nodes.add(node)
+            self._changed()
+        return node
+
+    def add_edge(self, source, target, label):
+        """Add a link between two node ids, or count it once more if it exists; return its id."""
+        label_id = self.label_ids.get(label)
+        if label_id is None:
+            label_id = self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        key = (label_id << 64) | (source << 32) | target
+        edge = self.edge_ids.get(key)
+        if edge is None:
+            edge = self.edge_ids[key] = len(self.edge_sources)
+            self.edge_sources.append(source)
+            self.edge_targets.append(target)
+            self.edge_labels.append(label_id)
+            self.edge_counts.append(1)
+        else:
+            self.edge_counts[edge] += 1
+        self._changed()
+        return edge
+
+    def _item_links(self, item, node_id, label_id):
+        """Return (node, class code, packed edge keys) of an @graph item, or None if it has no @id or @type.
+
+        node_id(name, category) and label_id(label) map names to ids; they
+        intern new names when adding and only look them up when removing.
+        """
+        if not isinstance(item, dict) or "@id" not in item or "@type" not in item:
+            return None
+        node_name = item["@id"]
+        types = item["@type"] if isinstance(item["@type"], list) else (item["@type"],)
+        node = node_id(node_name, REFERENCED)
+        source = node << 32
+        type_code = UNTYPED
+        keys = []
+        for type_id in types:
+            if type_id in TYPE_CODES:
+                type_code = TYPE_CODES[type_id]
+                keys.append((label_id("rdf:type") << 64) | source | type_code)
+                break
+        for key, value in item.items():
+            if key == "@id" or key == "@type":
+                continue
+            prefix = (label_id(RELATIONSHIP_KEYS.get(key, key)) << 64) | source
+            if not isinstance(value, list):
+                value = (value,) if isinstance(value, dict) and "@id" in value else (str(value),)
+            for element in value:
+                if isinstance(element, dict) and "@id" in element:
+                    keys.append(prefix | node_id(element["@id"], REFERENCED))
+                elif isinstance(element, str):
+                    keys.append(prefix | node_id(f"{node_name}_{key}_{element}", LITERAL))
+        return node, type_code, keys
+
+    def add_item(self, item):
+        """Add one @graph item: its node, its class link, its links and its literal values."""
+        self.add_items((item,))
+
+    def add_items(self, items):
+        """Add @graph items in a single pass.
+
+        add_node() and add_edge() are inlined here, with the store's
+        containers bound to locals, because this loop runs once per link.
+        Items without @id or @type are skipped, as before.
+        """
+        self._changed()
+        names = self.names
+        node_ids = self.node_ids
+        categories = self.categories
+        node_types = self.node_types
+        type_definitions = self.type_definitions
+        definitions = self.definitions
+        labels = self.labels
+        label_ids = self.label_ids
+        edge_sources = self.edge_sources
+        edge_targets = self.edge_targets
+        edge_labels = self.edge_labels
+        edge_counts = self.edge_counts
+        edge_ids = self.edge_ids
+        dirty_nodes = self._dirty_nodes
+        item_links = self._item_links
+
+        def node_id(name, category):
+            node = node_ids.get(name)
+            if node is None:
+                node = node_ids[name] = len(names)
+                names.append(name)
+                categories.append(category)
+                node_types.append(UNTYPED)
+                definitions.append(0)
+            return node
+
+        def label_id(label):
+            label_code = label_ids.get(label)
+            if label_code is None:
+                label_code = label_ids[label] = len(labels)
+                labels.append(label)
+            return label_code
+
+        for item in items:
+            links = item_links(item, node_id, label_id)
+            if links is None:
+                continue
+            node, type_code, keys = links
+            definitions[node] += 1
+            if categories[node] == REFERENCED:
+                categories[node] = INSTANCE
+                dirty_nodes.add(node)
+            if type_code != UNTYPED:
+                previous = node_types[node]
+                if previous != UNTYPED:
+                    type_counts = type_definitions.get(node)
+                    if type_counts is None:
+                        type_counts = type_definitions[node] = {previous: 1}
+                    type_counts[type_code] = type_counts.pop(type_code, 0) + 1
+                node_types[node] = type_code
+            for edge_key in keys:
+                edge = edge_ids.get(edge_key)
+                if edge is None:
+                    edge_ids[edge_key] = len(edge_sources)
+                    edge_sources.append(node)
+                    edge_targets.append(edge_key & 0xFFFFFFFF)
+                    edge_labels.append(edge_key >> 64)
+                    edge_counts.append(1)
+                else:
+                    edge_counts[edge] += 1
+
+    def remove_items(self, items):
+        """Remove @graph items that were added before, e.g. the old versions of edited items.
+
+        Their links are uncounted, and a node no longer defined by any item
+        is only shown again if another item defines it. A node still defined
+        by other items (duplicate @ids) takes the class of the most recently
+        added of them.
+        """
+        self._changed()
+        node_ids = self.node_ids
+        categories = self.categories
+        node_types = self.node_types
+        type_definitions = self.type_definitions
+        definitions = self.definitions
+        edge_counts = self.edge_counts
+        edge_ids = self.edge_ids
+
+        def node_id(name, category):
+            return node_ids[name]
+
+        for item in items:
+            links = self._item_links(item, node_id, self.label_ids.__getitem__)
+            if links is None:
+                continue
+            node, type_code, keys = links
+            definitions[node] -= 1
+            if type_code != UNTYPED:
+                type_counts = type_definitions.get(node)
+                if type_counts is None:
+                    node_types[node] = UNTYPED
+                else:
+                    type_counts[type_code] -= 1
+                    if not type_counts[type_code]:
+                        del type_counts[type_code]
+                    node_types[node] = next(reversed(type_counts))
+                    if list(type_counts.values()) == [1]:
+                        del type_definitions[node]
+            if not definitions[node] and categories[node] == INSTANCE:
+                categories[node] = REFERENCED
+                node_types[node] = UNTYPED
+                self._dirty_nodes.add(node)
+            for edge_key in keys:
+                edge_counts[edge_ids[edge_key]] -= 1
+
+    def type_names(self):
+        """Return the classes that have at least one instance, for view filters."""
+        present = set(self.node_types[len(NODE_TYPES):])
+        return [name for code, name in enumerate(CATEGORIES[:len(NODE_TYPES)]) if code in present]
+
+    def relationship_labels(self):
+        """Return the labels of links between items, for view filters."""
+        if self._relationship_labels is None:
+            categories = self.categories
+            used = {
+                label for target, label, count in zip(self.edge_targets, self.edge_labels, self.edge_counts)
+                if count and categories[target] != LITERAL
+            }
+            self._relationship_labels = [self.labels[label] for label in sorted(used) if self.labels[label] != "rdf:type"]
+        return self._relationship_labels
+
+    def _render(self):
+        """Render the ECharts dicts of nodes and links added or changed since the last render."""
+        names = self.names
+        categories = self.categories
+        class_styles = [(CATEGORY_STYLES[code], CATEGORIES[code]) for code in range(INSTANCE)]
+        instance_style = CATEGORY_STYLES[INSTANCE]
+        literal_style = CATEGORY_STYLES[LITERAL]
+        unit_style = CATEGORY_STYLES[UNIT]
+        node_dicts = self._node_dicts
+        unit_dicts = self._unit_dicts
+        rendered = len(node_dicts)
+        node_dicts.extend([None] * (len(names) - rendered))
+        changed = [node for node in self._dirty_nodes if node < rendered]
+        for node in changed + list(range(rendered, len(names))):
+            name = names[node]
+            code = categories[node]
+            if code == INSTANCE:
+                node_dicts[node] = {
+                    "name": name,
+                    "symbolSize": 10,
+                    "itemStyle": instance_style,
+                    "category": "Instance/Individual",
+                    "label": {"show": True, "formatter": name}
+                }
+            elif code == LITERAL:
+                unit_name = f"{name}_unit"
+                node_dicts[node] = {"name": name, "symbolSize": 10, "itemStyle": literal_style, "category": "Value/Literal"}
+                unit_dicts[node] = (
+                    {"name": unit_name, "symbolSize": 10, "itemStyle": unit_style, "category": "Unit"},
+                    {"source": name, "target": unit_name, "value": "skos:prefLabel"}
+                )
+            elif code == REFERENCED:
+                node_dicts[node] = None
+            else:
+                style, category = class_styles[code]
+                node_dicts[node] = {"name": name, "symbolSize": 15, "itemStyle": style, "category": category}
+        self._dirty_nodes.clear()
+        labels = self.labels
+        rendered = len(self._link_dicts)
+        self._link_dicts.extend(
+            {"source": names[source], "target": names[target], "value": labels[label]}
+            for source, target, label in zip(
+                self.edge_sources[rendered:], self.edge_targets[rendered:], self.edge_labels[rendered:]
+            )
+        )
+
+    def _view(self, hide_units_and_literals, types, relationships):
+        """Select the nodes and links of one view with per-node and per-link masks."""
+        if self._dirty_nodes or len(self._node_dicts) < len(self.names) or len(self._link_dicts) < self.edge_count:
+            self._render()
+        categories = self.categories
+        # Indexed by category code; the extra last entry is what REFERENCED (-1) looks up
+        category_shown = [True] * len(CATEGORIES) + [False]
+        category_shown[LITERAL] = not hide_units_and_literals
+        if types is None:
+            shown = [category_shown[code] for code in categories]
+        else:
+            # Indexed by class code; the extra last entry is what UNTYPED (-1) looks up
+            type_shown = [name in types for name in CATEGORIES[:len(NODE_TYPES)]] + [False]
+            shown = [
+                category_shown[code] and (code == LITERAL or type_shown[type_code])
+                for code, type_code in zip(categories, self.node_types)
+            ]
+        label_shown = [
+            relationships is None or label == "rdf:type" or label in relationships for label in self.labels
+        ]
+        link_dicts = self._link_dicts
+        links = []
+        literals = set()
+        edges = zip(self.edge_sources, self.edge_targets, self.edge_labels, self.edge_counts)
+        for edge, (source, target, label, count) in enumerate(edges):
+            if not count or not shown[source]:
+                continue
+            code = categories[target]
+            if code == LITERAL:
+                # Value links follow their value node, whatever the relationship filter
+                if shown[target]:
+                    links.append(link_dicts[edge])
+                    literals.add(target)
+            elif (shown[target] or code == REFERENCED) and label_shown[label]:
+                links.append(link_dicts[edge])
+        nodes = []
+        unit_dicts = self._unit_dicts
+        for node, node_dict in enumerate(self._node_dicts):
+            if node in literals:
+                unit_node, unit_link = unit_dicts[node]
+                nodes.append(node_dict)
+                nodes.append(unit_node)
+                links.append(unit_link)
+            elif shown[node] and node_dict is not None and categories[node] != LITERAL:
+                nodes.append(node_dict)
+        return nodes, links
+
+    def to_echarts(self, hide_units_and_literals=False, types=None, relationships=None):
+        """Return the ECharts (nodes, links) of a view of the graph.
+
+        Nodes that are only link targets are not rendered, as before. With
+        hide_units_and_literals, value and unit nodes and their links are
+        left out; types keeps only instances of those classes (e.g.
+        "Matter") and the class nodes themselves; relationships keeps only
+        links between items with those labels (e.g. "has_property").
+
+        Node and link dicts are rendered once per graph and every view is a
+        mask over them, cached per view key, so switching views does not
+        rebuild the graph. The returned lists are shared with the cache and
+        must not be modified.
+        """
+        key = (
+            bool(hide_units_and_literals),
+            None if types is None else frozenset(types),
+            None if relationships is None else frozenset(relationships)
+        )
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = self._view(*key)
+        return view
+
+# Canonical JSON of an @graph item, independent of its key order, for hashing and diffing
+canonical_item = json.JSONEncoder(sort_keys=True, ensure_ascii=False, default=str).encode
+
+class GraphEditor:
+    """Keeps a GraphStore in step with a JSON-LD document that is edited between updates.
+
+    update() keys every @graph item by its canonical JSON and diffs those
+    keys (a hash lookup each) against the previous version, then removes
+    only the items that disappeared and adds only the ones that appeared,
+    so editing one item of a large graph touches only that item's nodes
+    and links. Changed items are parsed back from their JSON, so callers
+    may modify the documents they pass in.
+    """
+    def __init__(self):
+        self.store = GraphStore()
+        # Canonical JSON of each item in the current version -> number of copies
+        self.items = Counter()
+
+    def update(self, data):
+        """Apply a new version of the document and return what changed."""
+        graph = data.get("@graph", [])
+        items = Counter(map(canonical_item, graph))
+        if self.items:
+            removed = [json.loads(key) for key, count in (self.items - items).items() for _ in range(count)]
+            added = [json.loads(key) for key, count in (items - self.items).items() for _ in range(count)]
+        else:
+            removed = []
+            added = graph
+        if removed:
+            self.store.remove_items(removed)
+        if added:
+            self.store.add_items(added)
+        self.items = items
+        return {
+            "items": len(graph),
+            "added_items": len(added),
+            "removed_items": len(removed)
+        }
@@ -0,0 +1,161 @@
+import json
+import re
+from utils.entity_index import MentionIndex, format_entity_entries, parse_entity_entries
+from utils.structured_extraction import format_entities, format_relationships, normalize_name
+
+# Entities per JSON-LD request in sharded mode; about 40 entities with their
+# relationships fit comfortably in one completion
+DEFAULT_SHARD_SIZE = 40
+
+# Context every fragment is merged into; keys a fragment adds are kept as well
+DEFAULT_CONTEXT = {
+    "ex": "http://example.com/",
+    "emmo": "http://emmo.info/emmo#",
+    "skos": "http://www.w3.org/2004/02/skos/core#"
+}
+
+# Keys whose first value wins when fragments describe the same item
+SINGLE_VALUED_KEYS = {"@id", "@type", "skos:prefLabel"}
+
+def entity_id(name):
+    """Return the ex: identifier for an entity name, e.g. "hot pressing" -> "ex:HotPressing"."""
+    words = re.findall(r"[A-Za-z0-9]+", name)
+    local = "".join(word[:1].upper() + word[1:] for word in words) or "Entity"
+    if local[0].isdigit():
+        local = "E" + local
+    return "ex:" + local
+
+def plan_shards(entities, relationships, entity_records=None, relationship_records=None,
+                shard_size=DEFAULT_SHARD_SIZE):
+    """Split entities into shards of shard_size, each with its incident relationships.
+
+    Every entity gets an @id up front, so all shards refer to it the same
+    way. A relationship goes to the shard of the first entity it mentions,
+    and the other entities it mentions are listed there as defined in
+    another shard. Relationships that mention no known entity go to the
+    first shard. Returns a list of dicts with the shard's entity and
+    relationship text, the ids of its own entities and of the entities it
+    only refers to.
+    """
+    if entity_records is not None:
+        entries = [(None, format_entities([record]), [record.name]) for record in entity_records]
+    else:
+        entries = parse_entity_entries(entities)
+    if relationship_records is not None:
+        lines = [format_relationships([record]) for record in relationship_records]
+    else:
+        lines = [line for line in (relationships or "").splitlines() if line.strip()]
+
+    # The longest name is usually the full one, not an abbreviation
+    labels = [max(names, key=len) if names else line.strip() for _, line, names in entries]
+    ids = []
+    used = set()
+    for label in labels:
+        base = entity_id(label)
+        candidate = base
+        suffix = 2
+        while candidate in used:
+            candidate = f"{base}{suffix}"
+            suffix += 1
+        used.add(candidate)
+        ids.append(candidate)
+
+    index = MentionIndex((name, position) for position, (_, _, names) in enumerate(entries) for name in names)
+    shard_size = max(1, int(shard_size))
+    shard_count = max(1, -(-len(entries) // shard_size))
+    shard_lines = [[] for _ in range(shard_count)]
+    shard_refs = [set() for _ in range(shard_count)]
+    for line in lines:
+        mentioned = sorted(index.find(line))
+        shard = mentioned[0] // shard_size if mentioned else 0
+        shard_lines[shard].append(line)
+        shard_refs[shard].update(
+            position for position in mentioned if position // shard_size != shard
+        )
+
+    shards = []
+    for shard in range(shard_count):
+        own = range(shard * shard_size, min(len(entries), (shard + 1) * shard_size))
+        shards.append({
+            "entities": format_entity_entries(entries[position] for position in own),
+            "relationships": "\n".join(shard_lines[shard]),
+            "ids": {labels[position]: ids[position] for position in own},
+            "references": {labels[position]: ids[position] for position in sorted(shard_refs[shard])}
+        })
+    return shards
+
+def shard_instructions(shard):
+    """Return the @id table a shard's JSON-LD prompt carries."""
+    lines = ["Use exactly these @id values for the entities above:"]
+    lines += [f"- {name}: {identifier}" for name, identifier in shard["ids"].items()]
+    if shard["references"]:
+        lines.append(
+            "These entities are described in another part of the graph. Refer to them only by "
+            "{\"@id\": ...} and do not add them to @graph:"
+        )
+        lines += [f"- {name}: {identifier}" for name, identifier in shard["references"].items()]
+    return "\n".join(lines)
+
+def _values(value):
+    return value if isinstance(value, list) else [value]
+
+def _merge_item(merged, item):
+    """Merge the properties of item into merged, an item with the same @id."""
+    for key, value in item.items():
+        if key not in merged:
+            merged[key] = value
+        elif key not in SINGLE_VALUED_KEYS and merged[key] != value:
+            combined = _values(merged[key])
+            seen = {json.dumps(element, sort_keys=True) for element in combined}
+            for element in _values(value):
+                marker = json.dumps(element, sort_keys=True)
+                if marker not in seen:
+                    seen.add(marker)
+                    combined.append(element)
+            merged[key] = combined
+
+def _rename_references(value, renamed):
+    if isinstance(value, list):
+        return [_rename_references(element, renamed) for element in value]
+    if isinstance(value, dict) and value.get("@id") in renamed:
+        return dict(value, **{"@id": renamed[value["@id"]]})
+    return value
+
+def merge_fragments(fragments, shards):
+    """Merge the JSON-LD fragments of the shards into one document.
+
+    An item whose @id differs from the planned one but whose skos:prefLabel
+    names a planned entity is given the planned @id, and references to it
+    within its fragment are updated. Items with the same @id are merged;
+    list-valued properties are combined without duplicates. All @context
+    entries are kept, the first definition of a prefix winning.
+    """
+    planned = {}
+    for shard in shards:
+        for name, identifier in list(shard["ids"].items()) + list(shard["references"].items()):
+            planned.setdefault(normalize_name(name), identifier)
+    known = set(planned.values())
+
+    context = dict(DEFAULT_CONTEXT)
+    items = {}
+    for fragment in fragments:
+        if not isinstance(fragment, dict):
+            continue
+        fragment_context = fragment.get("@context")
+        if isinstance(fragment_context, dict):
+            for prefix, iri in fragment_context.items():
+                context.setdefault(prefix, iri)
+        graph = [item for item in fragment.get("@graph", []) if isinstance(item, dict) and "@id" in item]
+        renamed = {}
+        for item in graph:
+            label = item.get("skos:prefLabel")
+            if item["@id"] not in known and isinstance(label, str) and normalize_name(label) in planned:
+                renamed[item["@id"]] = planned[normalize_name(label)]
+        for item in graph:
+            item = {key: _rename_references(value, renamed) for key, value in item.items()}
+            item["@id"] = renamed.get(item["@id"], item["@id"])
+            if item["@id"] in items:
+                _merge_item(items[item["@id"]], item)
+            else:
+                items[item["@id"]] = item
+    return {"@context": context, "@graph": list(items.values())}
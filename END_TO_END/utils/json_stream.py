@@ -0,0 +1,99 @@
+import json
+
+class GraphStreamParser:
+    """Incremental parser that yields JSON-LD @graph items as soon as they close.
+
+    Text is fed in arbitrary pieces, for example completion tokens. The
+    scanner tracks strings, escapes and nesting in a single pass over the
+    input, so every character is looked at once no matter how the stream
+    is split, and text that can no longer be part of an item is dropped.
+    Text before the first "{" (such as a markdown fence) is ignored.
+    """
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.keys = []
+        self.graph_depth = None
+        self.item_start = None
+        self.items = []
+
+    def feed(self, piece):
+        """Consume a piece of text and return the @graph items completed by it."""
+        if not piece:
+            return []
+        self.text += piece
+        completed = []
+        text = self.text
+        for index in range(self.position, len(text)):
+            char = text[index]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    self.last_string = text[self.string_start + 1:index]
+                continue
+            if not self.stack and char != "{":
+                continue
+            if char == '"':
+                self.in_string = True
+                self.string_start = index
+            elif char == ":":
+                if self.stack and self.stack[-1] == "{":
+                    self.keys[-1] = self.last_string
+            elif char == "{":
+                self.stack.append("{")
+                self.keys.append(None)
+                if self.graph_depth is not None and len(self.stack) == self.graph_depth + 1:
+                    self.item_start = index
+            elif char == "[":
+                if len(self.stack) == 1 and self.keys[-1] == "@graph":
+                    self.graph_depth = 2
+                self.stack.append("[")
+                self.keys.append(None)
+            elif char in "}]":
+                if not self.stack:
+                    continue
+                closing_item = (
+                    char == "}" and self.item_start is not None
+                    and len(self.stack) == self.graph_depth + 1
+                )
+                self.stack.pop()
+                self.keys.pop()
+                if closing_item:
+                    try:
+                        item = json.loads(text[self.item_start:index + 1])
+                    except json.JSONDecodeError:
+                        item = None
+                    self.item_start = None
+                    if isinstance(item, dict):
+                        self.items.append(item)
+                        completed.append(item)
+                elif char == "]" and self.graph_depth is not None and len(self.stack) == 1:
+                    self.graph_depth = None
+        self.position = len(text)
+        self._discard_consumed()
+        return completed
+
+    def _discard_consumed(self):
+        """Drop scanned text that no open string or @graph item still needs."""
+        keep_from = self.position
+        if self.in_string:
+            keep_from = min(keep_from, self.string_start)
+        if self.item_start is not None:
+            keep_from = min(keep_from, self.item_start)
+        if keep_from == 0:
+            return
+        self.text = self.text[keep_from:]
+        self.position -= keep_from
+        if self.string_start is not None:
+            self.string_start -= keep_from
+        if self.item_start is not None:
+            self.item_start -= keep_from
@@ -1,53 +1,149 @@
 import json
 import re
 
+# Strings (closed or cut off, group 1 is the closing quote), brackets and colons; the regex
+# engine skips everything else, so a response is scanned in one pass
+JSON_TOKEN_PATTERN = re.compile(r'"(?:[^"\\]|\\[\s\S])*("?)|[{}\[\]:]')
+
+_json_loads = None
+
+def json_loads(text):
+    """Parse JSON with orjson when it is installed, with the json module otherwise.
+
+    Both raise a ValueError subclass on invalid input.
+    """
+    global _json_loads
+    if _json_loads is None:
+        try:
+            import orjson
+            _json_loads = orjson.loads
+        except ImportError:
+            _json_loads = json.loads
+    return _json_loads(text)
+
 def is_valid_json(json_string):
     """Check if a string is valid JSON."""
     try:
-        json.loads(json_string)
+        json_loads(json_string)
         return True
-    except json.JSONDecodeError:
+    except ValueError:
         return False
 
-def extract_json_from_text(text):
-    """Extract JSON from text that might contain extra content."""
-    # Try to find JSON block between triple backticks
-    json_pattern = r"```(?:json)?\s*([\s\S]*?)\s*```"
-    matches = re.findall(json_pattern, text)
-    
-    if matches:
-        for match in matches:
+def scan_json_objects(text):
+    """Find the top-level JSON objects in text in a single pass.
+
+    Returns (spans, truncated): spans are the (start, end) slices of every
+    balanced object, in order, and truncated is the repaired text of an
+    object the text ends inside (for example a response cut off at the
+    output-token limit), or None. Text outside objects, such as prose or
+    markdown fences, is skipped.
+
+    A truncated JSON-LD document is cut after the last complete @graph
+    item, dropping the incomplete one, and its open array and object are
+    closed. Elsewhere it is cut after the last nested object or array that
+    opened or closed, and every container still open is closed.
+    """
+    spans = []
+    position = 0
+    while True:
+        start = text.find("{", position)
+        if start == -1:
+            return spans, None
+        stack = []
+        key = None
+        last_string = None
+        graph_depth = None
+        graph_cut = None
+        cut = (start + 1, ["{"])
+        for match in JSON_TOKEN_PATTERN.finditer(text, start):
+            token = match.group()
+            if token[0] == '"':
+                if not match.group(1):
+                    break
+                last_string = token
+            elif token == ":":
+                key = last_string
+            elif token in "{[":
+                stack.append(token)
+                if token == "[" and len(stack) == 2 and key == '"@graph"':
+                    graph_depth = 2
+                    graph_cut = match.end()
+                cut = (match.end(), stack[:])
+            else:
+                stack.pop()
+                if not stack:
+                    spans.append((start, match.end()))
+                    position = match.end()
+                    break
+                if graph_depth is not None and len(stack) == graph_depth:
+                    # An @graph item closed
+                    graph_cut = match.end()
+                elif graph_depth is not None and len(stack) < graph_depth:
+                    graph_depth = None
+                cut = (match.end(), stack[:])
+        if stack:
+            # The text ends inside this object
+            if graph_depth is not None:
+                return spans, text[start:graph_cut] + "]}"
+            end, open_containers = cut
+            closing = "".join("}" if opener == "{" else "]" for opener in reversed(open_containers))
+            return spans, text[start:end].rstrip().rstrip(",") + closing
+
+def extract_json_from_text(text, repair=True):
+    """Extract JSON from text that might contain extra content.
+
+    The span from the first "{" to the last "}" is tried first, which is
+    the whole answer for a well-formed response. Otherwise the text is
+    scanned once for top-level objects and each candidate is parsed at most
+    once, the span already tried included; the first object with an @graph
+    is returned, otherwise the first object that parses. With repair, a
+    JSON-LD response cut off before its end is closed (see
+    scan_json_objects) so it can be used without regenerating it.
+    """
+    # Fast path: a response that is one JSON-LD object, possibly fenced or with prose around it
+    start = text.find("{")
+    end = text.rfind("}")
+    tried_span = None
+    tried_data = None
+    if start != -1 and end > start:
+        tried_span = (start, end + 1)
+        try:
+            tried_data = json_loads(text[start:end + 1])
+        except ValueError:
+            tried_data = None
+        if isinstance(tried_data, dict) and "@graph" in tried_data:
+            return tried_data
+    spans, truncated = scan_json_objects(text)
+    fallback = None
+    for start, end in spans:
+        if (start, end) == tried_span:
+            # One object with prose around it: it was parsed above and has no @graph
+            data = tried_data
+            if data is None:
+                continue
+        else:
             try:
-                return json.loads(match)
-            except json.JSONDecodeError:
+                data = json_loads(text[start:end])
+            except ValueError:
                 continue
-    
-    # If no valid JSON in code blocks, try to find JSON with curly braces
-    try:
-        # Try to find the first { and last } that might enclose a JSON object
-        start_index = text.find('{')
-        end_index = text.rfind('}')
-        
-        if start_index != -1 and end_index != -1 and end_index > start_index:
-            json_candidate = text[start_index:end_index+1]
-            return json.loads(json_candidate)
-    except json.JSONDecodeError:
-        pass
-    
-    # If we still don't have valid JSON, clean the text and try again
-    try:
-        # Remove any non-JSON content by finding the first { and last }
-        cleaned_text = re.sub(r'^[^{]*', '', text)
-        cleaned_text = re.sub(r'[^}]*$', '', cleaned_text)
-        return json.loads(cleaned_text)
-    except (json.JSONDecodeError, IndexError):
-        return None
+        if "@graph" in data:
+            return data
+        if fallback is None:
+            fallback = data
+    if repair and truncated is not None:
+        try:
+            data = json_loads(truncated)
+        except ValueError:
+            data = None
+        if data and (fallback is None or "@graph" in data):
+            return data
+    return fallback
 
 def read_json_ld(data_string):
     """Parse JSON-LD data from string, with fallback to extraction if needed."""
     try:
-        return json.loads(data_string)
-    except json.JSONDecodeError:
+        return json_loads(data_string)
+    except ValueError:
         # Try to extract JSON from a text response
         json_data = extract_json_from_text(data_string)
         if json_data:
@@ -1,85 +1,608 @@
+import codecs
+import hashlib
 import io
-from PyPDF2 import PdfReader
-import chardet
-from langchain_text_splitters import NLTKTextSplitter
-import nltk
+import itertools
+import math
+import mmap
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from utils.token_utils import count_tokens, get_encoding
+from utils.rate_limiter import get_rate_limits, RESERVED_OUTPUT_TOKENS
 
-# Ensure NLTK data is downloaded
-nltk.download('punkt', quiet=True)
-nltk.download('punkt_tab', quiet=True)
+# Documents shorter than this are extracted in-process; pool startup would dominate
+PARALLEL_MIN_PAGES = 16
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text content from a PDF file."""
+# Encoding detection looks at no more than this many leading bytes of a TXT file
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+ENCODING_FEED_BYTES = 64 * 1024
+# TXT files are decoded in blocks of this many bytes
+TEXT_BLOCK_BYTES = 1024 * 1024
+
+_worker_reader = None
+
+def _pdf_reader(source):
+    """Open a PdfReader, importing PyPDF2 only when a PDF is actually read."""
+    from PyPDF2 import PdfReader
+    return PdfReader(source)
+
+def _init_page_worker(pdf_bytes):
+    """Open the PDF once per worker process."""
+    global _worker_reader
+    _worker_reader = _pdf_reader(io.BytesIO(pdf_bytes))
+
+def _extract_page_range(page_range):
+    """Extract the text of pages [start, end) in a worker process."""
+    start, end = page_range
+    return [_worker_reader.pages[index].extract_text() for index in range(start, end)]
+
+def _read_pdf_bytes(pdf_file):
+    """Return the raw bytes of a PDF given a path or a binary file object."""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, "rb") as handle:
+            return handle.read()
+    data = pdf_file.read()
+    pdf_file.seek(0)
+    return data
+
+def extract_pages_from_pdf(pdf_file, max_workers=None, pages_per_task=None):
+    """Extract the text of every page of a PDF file.
+    
+    Large documents are split into page ranges that are extracted in a
+    process pool of max_workers processes (default: one per CPU).
+    """
     try:
-        pdf_reader = PdfReader(pdf_file)
-        pdf_content = ""
-        for page in pdf_reader.pages:
-            pdf_content += page.extract_text() + "\n\n"
-        return pdf_content
+        pdf_bytes = _read_pdf_bytes(pdf_file)
+        pdf_reader = _pdf_reader(io.BytesIO(pdf_bytes))
+        page_count = len(pdf_reader.pages)
+        max_workers = max_workers or os.cpu_count() or 1
+        
+        if max_workers == 1 or page_count < PARALLEL_MIN_PAGES:
+            page_texts = [page.extract_text() for page in pdf_reader.pages]
+        else:
+            pages_per_task = pages_per_task or max(1, -(-page_count // (max_workers * 4)))
+            from concurrent.futures import ProcessPoolExecutor
+            page_ranges = [
+                (start, min(start + pages_per_task, page_count))
+                for start in range(0, page_count, pages_per_task)
+            ]
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_page_worker,
+                initargs=(pdf_bytes,)
+            ) as executor:
+                page_texts = [text for texts in executor.map(_extract_page_range, page_ranges) for text in texts]
+        
+        return page_texts
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {e}")
 
+def join_pages(page_texts):
+    """Join page texts into one document, each page followed by a blank line."""
+    return "".join(text + "\n\n" for text in page_texts)
+
+def extract_text_from_pdf(pdf_file, max_workers=None, pages_per_task=None):
+    """Extract text content from a PDF file, joining the page texts once at the end."""
+    return join_pages(extract_pages_from_pdf(pdf_file, max_workers, pages_per_task))
+
+# Non-blank lines at the top and bottom of each page checked for running headers and footers
+EDGE_LINES = 3
+# An edge line is boilerplate once it recurs on at least this fraction of the pages
+REPEATED_LINE_FRACTION = 0.3
+MIN_BOILERPLATE_PAGES = 3
+# When pages are streamed, running headers are learned from this many leading pages
+BOILERPLATE_SAMPLE_PAGES = 12
+# Back-matter headings only count in the latter part of a document, not in a table of contents
+BACK_MATTER_START_FRACTION = 0.5
+BACK_MATTER_HEADING = re.compile(
+    r"^\s*(?:[0-9IVX]+\.?\s*)?(?:references|bibliography|literature cited|works cited|"
+    r"acknowledge?ments?|author contributions|competing interests|conflicts? of interest|"
+    r"declaration of competing interest)\s*:?\s*$",
+    re.IGNORECASE
+)
+# Only a heading line ends dropping, e.g. "Appendix B: Derivations" but not a sentence that
+# starts with "Supplementary Information" inside the back matter
+KEEP_HEADING = re.compile(
+    r"^\s*(?:[0-9A-Z]+\.?\s*)?(?:appendix|appendices|supporting information|"
+    r"supplementary(?:\s+(?:information|materials?|data|figures|tables|notes|methods))?)"
+    r"(?:\s+[A-Z0-9]{1,3})?\s*(?:[:.\-\u2013\u2014]\s*[^.]{0,60})?$",
+    re.IGNORECASE
+)
+
+def _boilerplate_key(line):
+    """Normalize a line so a running header matches across pages despite page numbers."""
+    return re.sub(r"[^a-z#]+", " ", re.sub(r"\d+", "#", line.lower())).strip()
+
+def _edge_indexes(lines):
+    """Return the indexes of the first and last EDGE_LINES non-blank lines."""
+    content = [index for index, line in enumerate(lines) if line.strip()]
+    return set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+
+def find_boilerplate_lines(page_texts, min_fraction=REPEATED_LINE_FRACTION):
+    """Return the keys of lines that recur at the top or bottom of many pages."""
+    if len(page_texts) < MIN_BOILERPLATE_PAGES:
+        return set()
+    counts = Counter()
+    for page in page_texts:
+        lines = page.split("\n")
+        counts.update({_boilerplate_key(lines[index]) for index in _edge_indexes(lines)})
+    threshold = max(2, math.ceil(len(page_texts) * min_fraction))
+    return {key for key, count in counts.items() if key and count >= threshold}
+
+def strip_page_boilerplate(page_text, boilerplate):
+    """Remove boilerplate lines from the edges of a page; return (text, removed lines)."""
+    lines = page_text.split("\n")
+    edges = _edge_indexes(lines)
+    kept = []
+    removed = []
+    for index, line in enumerate(lines):
+        if index in edges and _boilerplate_key(line) in boilerplate:
+            removed.append(line)
+        else:
+            kept.append(line)
+    return "\n".join(kept), removed
+
+def iter_clean_pages(page_texts, page_count, report=None, model="gpt-4o",
+                     sample_pages=BOILERPLATE_SAMPLE_PAGES, start_fraction=BACK_MATTER_START_FRACTION):
+    """Strip running headers/footers, page numbers and back matter from pages as they stream in.
+    
+    Boilerplate is learned from the first sample_pages pages. References,
+    acknowledgements and similar sections are dropped from their heading to
+    the next appendix or supplementary heading, or to the end; headings only
+    count past start_fraction of the page_count pages. If a report dict is
+    given it receives the characters and tokens removed once the pages are
+    exhausted.
+    """
+    page_texts = iter(page_texts)
+    sample = list(itertools.islice(page_texts, sample_pages))
+    boilerplate = find_boilerplate_lines(sample)
+    dropping = False
+    chars_before = 0
+    chars_after = 0
+    tokens_removed = 0
+    boilerplate_lines = 0
+    back_matter_lines = 0
+    for page_index, page in enumerate(itertools.chain(sample, page_texts)):
+        text, removed = strip_page_boilerplate(page, boilerplate)
+        lines = text.split("\n")
+        kept = []
+        for line_index, line in enumerate(lines):
+            position = (page_index + line_index / len(lines)) / max(1, page_count)
+            if position >= start_fraction and BACK_MATTER_HEADING.match(line):
+                dropping = True
+            elif dropping and KEEP_HEADING.match(line):
+                dropping = False
+            if dropping:
+                removed.append(line)
+                back_matter_lines += 1
+            else:
+                kept.append(line)
+        cleaned = "\n".join(kept)
+        boilerplate_lines += len(removed) - (len(lines) - len(kept))
+        chars_before += len(page)
+        chars_after += len(cleaned)
+        tokens_removed += count_tokens("\n".join(removed), model)
+        yield cleaned
+    if report is not None:
+        report.update({
+            "chars_before": chars_before,
+            "chars_after": chars_after,
+            "chars_removed": chars_before - chars_after,
+            "tokens_removed": tokens_removed,
+            "boilerplate_lines": boilerplate_lines,
+            "back_matter_lines": back_matter_lines
+        })
+
+def clean_pages(page_texts, model="gpt-4o"):
+    """Strip running headers/footers, page numbers and back matter before any LLM call.
+    
+    Returns the cleaned page texts and a report of the characters and tokens
+    removed.
+    """
+    report = {}
+    cleaned = list(iter_clean_pages(page_texts, len(page_texts), report, model, sample_pages=len(page_texts)))
+    return cleaned, report
+
+def clean_text(text, model="gpt-4o"):
+    """Clean a whole document; form feeds, if present, mark the page breaks."""
+    cleaned, report = clean_pages(text.split("\f"), model)
+    return "\f".join(cleaned), report
+
+@contextmanager
+def _open_bytes(txt_file):
+    """Give access to the raw bytes of a path or binary file object without copying them.
+    
+    Paths are memory-mapped; in-memory uploads are exposed through their
+    buffer. Other file objects are read once and rewound.
+    """
+    if isinstance(txt_file, (str, os.PathLike)):
+        with open(txt_file, "rb") as handle:
+            if os.fstat(handle.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+        return
+    if hasattr(txt_file, "getbuffer"):
+        with txt_file.getbuffer() as buffer:
+            yield buffer
+        return
+    data = txt_file.read()
+    txt_file.seek(0)
+    yield data
+
+def detect_encoding(data, max_bytes=ENCODING_SAMPLE_BYTES, feed_bytes=ENCODING_FEED_BYTES):
+    """Detect the text encoding of a bytes-like object from a bounded prefix.
+    
+    The detector is fed block by block and stops as soon as it is confident,
+    so the cost does not grow with the size of the file.
+    """
+    from chardet import UniversalDetector
+    detector = UniversalDetector()
+    with memoryview(data) as view:
+        end = min(len(view), max_bytes)
+        for start in range(0, end, feed_bytes):
+            detector.feed(view[start:min(start + feed_bytes, end)])
+            if detector.done:
+                break
+    encoding = detector.close()["encoding"] or "utf-8"
+    # An ASCII prefix says nothing about later bytes; UTF-8 decodes it identically
+    if encoding.lower() == "ascii":
+        encoding = "utf-8"
+    return encoding
+
+def iter_txt_text(txt_file, block_size=TEXT_BLOCK_BYTES):
+    """Yield the decoded text of a TXT file block by block.
+    
+    Bytes that do not fit the detected encoding are replaced rather than
+    failing halfway through a large file.
+    """
+    try:
+        with _open_bytes(txt_file) as data, memoryview(data) as view:
+            decoder = codecs.getincrementaldecoder(detect_encoding(view))(errors="replace")
+            for start in range(0, len(view), block_size):
+                text = decoder.decode(view[start:start + block_size])
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+    except Exception as e:
+        raise Exception(f"Error extracting text from TXT file: {e}")
+
 def extract_text_from_txt(txt_file):
     """Extract text content from a TXT file."""
+    return "".join(iter_txt_text(txt_file))
+
+# Context window sizes (in tokens) of the models offered in the app
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_MODELS = {
+    "OpenAI API": "gpt-4o",
+    "Groq API": "llama3-8b-8192"
+}
+
+MIN_CHUNK_TOKENS = 256
+# Chunk size used when no max_chunk_tokens is given: the entities and relationships of a
+# larger chunk would not fit in the RESERVED_OUTPUT_TOKENS of its answer
+DEFAULT_MAX_CHUNK_TOKENS = 8000
+# One request may use at most this share of a minute's token budget, so a chunk never
+# fills the whole TPM limit (6000 TPM on Groq) and the next request need not wait a minute
+MAX_REQUEST_TPM_FRACTION = 0.5
+# A relationship request also lists the chunk's entities; they are assumed to take up to
+# this many tokens per chunk token
+ENTITY_LIST_ALLOWANCE = 0.5
+PARAGRAPH_SEPARATOR = "\n\n"
+# Content-defined chunking may end a chunk after about one paragraph in this many
+CONTENT_BOUNDARY_DIVISOR = 4
+
+class Chunk:
+    """A planned chunk of text with its token count and source offset."""
+    __slots__ = ("text", "tokens", "start")
+
+    def __init__(self, text, tokens, start):
+        self.text = text
+        self.tokens = tokens
+        self.start = start
+
+    def __repr__(self):
+        return f"Chunk(start={self.start}, tokens={self.tokens})"
+
+class ChunkPlan:
+    """Ordered chunks packed against a token budget.
+    
+    Iterating, indexing and len() behave like the plain list of chunk
+    strings returned by earlier versions of chunk_text.
+    """
+    def __init__(self, chunks, token_budget, model):
+        self.chunks = list(chunks)
+        self.token_budget = token_budget
+        self.model = model
+
+    @property
+    def texts(self):
+        return [chunk.text for chunk in self.chunks]
+
+    @property
+    def token_counts(self):
+        return [chunk.tokens for chunk in self.chunks]
+
+    @property
+    def total_tokens(self):
+        return sum(chunk.tokens for chunk in self.chunks)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __iter__(self):
+        return (chunk.text for chunk in self.chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [chunk.text for chunk in self.chunks[index]]
+        return self.chunks[index].text
+
+def get_context_window(model):
+    """Return the context window of a model in tokens."""
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+def get_chunk_token_budget(model, prompt="", api_choice="OpenAI API",
+                           reserved_output_tokens=RESERVED_OUTPUT_TOKENS, max_chunk_tokens=None,
+                           context_allowance=0.0):
+    """Return the number of text tokens that fit in one request next to prompt.
+    
+    The budget is the model's context window minus the prompt and the space
+    reserved for the answer, further capped by MAX_REQUEST_TPM_FRACTION of the
+    provider's tokens-per-minute limit and by max_chunk_tokens
+    (DEFAULT_MAX_CHUNK_TOKENS unless given). context_allowance reserves that many
+    extra tokens per text token for data sent along with the text, such as
+    the entity list of a relationship request.
+    """
+    prompt_tokens = count_tokens(prompt, model)
+    budget = get_context_window(model) - prompt_tokens - reserved_output_tokens
+    tpm = get_rate_limits(api_choice, model)["tpm"]
+    budget = min(budget, tpm * MAX_REQUEST_TPM_FRACTION - prompt_tokens - reserved_output_tokens)
+    budget /= 1.0 + context_allowance
+    budget = min(budget, max_chunk_tokens or DEFAULT_MAX_CHUNK_TOKENS)
+    return max(MIN_CHUNK_TOKENS, int(budget))
+
+def get_extraction_token_budget(model, entity_prompt, relationship_prompt, api_choice="OpenAI API",
+                                max_chunk_tokens=None):
+    """Return the chunk budget that fits both extraction requests of a chunk.
+    
+    The entity request carries the chunk next to entity_prompt; the
+    relationship request carries it next to relationship_prompt and the
+    chunk's entity list, which is allowed ENTITY_LIST_ALLOWANCE tokens per
+    chunk token. The smaller of the two budgets is returned.
+    """
+    return min(
+        get_chunk_token_budget(model, entity_prompt, api_choice, max_chunk_tokens=max_chunk_tokens),
+        get_chunk_token_budget(
+            model, relationship_prompt, api_choice, max_chunk_tokens=max_chunk_tokens,
+            context_allowance=ENTITY_LIST_ALLOWANCE
+        )
+    )
+
+def _split_oversized(text, start, model, token_budget):
+    """Split a paragraph larger than the budget at line breaks, then by tokens."""
+    lines = text.split("\n")
+    if len(lines) > 1:
+        pieces = []
+        offset = start
+        for line in lines:
+            pieces.append((line, offset))
+            offset += len(line) + 1
+        yield from iter_planned_chunks(pieces, model, token_budget, separator="\n")
+        return
+
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Without a tokenizer, assume four characters per token
+        step = max(1, token_budget - 1) * 4
+        for offset in range(0, len(text), step):
+            piece = text[offset:offset + step]
+            yield Chunk(piece, count_tokens(piece, model), start + offset)
+        return
+
+    tokens = encoding.encode(text, disallowed_special=())
+    offset = start
+    for index in range(0, len(tokens), token_budget):
+        piece = encoding.decode(tokens[index:index + token_budget])
+        yield Chunk(piece, min(token_budget, len(tokens) - index), offset)
+        offset += len(piece)
+
+def is_content_boundary(text, divisor=CONTENT_BOUNDARY_DIVISOR):
+    """Return True if a chunk may end after this paragraph, judged by its content alone."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % divisor == 0
+
+def iter_planned_chunks(pieces, model, token_budget, separator=PARAGRAPH_SEPARATOR, boundary=None):
+    """Pack (text, start_offset) pieces into chunks of at most token_budget tokens.
+    
+    Every piece is tokenized exactly once and chunks are assembled with a
+    single join, so planning is linear in the size of the input. Pieces
+    larger than the budget are split on their own. Works lazily on any
+    iterable of pieces.
+    
+    If boundary is given, a chunk that is at least half full is also closed
+    after any piece for which boundary(text) is true. With a content-based
+    boundary such as is_content_boundary, an edit only moves the chunk
+    boundaries near it and the chunks further on come out unchanged.
+    """
+    separator_tokens = count_tokens(separator, model)
+    parts = []
+    part_tokens = 0
+    part_start = 0
+
+    for text, start in pieces:
+        if not text.strip():
+            continue
+        tokens = count_tokens(text, model)
+        if tokens > token_budget:
+            if parts:
+                yield Chunk(separator.join(parts), part_tokens, part_start)
+                parts, part_tokens = [], 0
+            yield from _split_oversized(text, start, model, token_budget)
+            continue
+        added = tokens + (separator_tokens if parts else 0)
+        if parts and part_tokens + added > token_budget:
+            yield Chunk(separator.join(parts), part_tokens, part_start)
+            parts, part_tokens = [], 0
+            added = tokens
+        if not parts:
+            part_start = start
+        parts.append(text)
+        part_tokens += added
+        if boundary is not None and part_tokens * 2 >= token_budget and boundary(text):
+            yield Chunk(separator.join(parts), part_tokens, part_start)
+            parts, part_tokens = [], 0
+
+    if parts:
+        yield Chunk(separator.join(parts), part_tokens, part_start)
+
+def iter_paragraphs(text, separator=PARAGRAPH_SEPARATOR):
+    """Yield (paragraph, start_offset) pairs from text in a single scan."""
+    position = 0
+    while position <= len(text):
+        end = text.find(separator, position)
+        if end == -1:
+            end = len(text)
+        yield text[position:end], position
+        position = end + len(separator)
+
+def plan_chunks(text, model=None, prompt="", api_choice="OpenAI API",
+                reserved_output_tokens=RESERVED_OUTPUT_TOKENS, max_chunk_tokens=None, content_defined=False):
+    """Plan token-budgeted chunks for text sent to model alongside prompt.
+    
+    content_defined places chunk boundaries by paragraph content, so revised
+    versions of a document share most of their chunks.
+    """
+    model = model or DEFAULT_MODELS.get(api_choice, "gpt-4o")
+    token_budget = get_chunk_token_budget(
+        model, prompt, api_choice, reserved_output_tokens, max_chunk_tokens
+    )
+    boundary = is_content_boundary if content_defined else None
+    chunks = iter_planned_chunks(iter_paragraphs(text), model, token_budget, boundary=boundary)
+    return ChunkPlan(chunks, token_budget, model)
+
+def iter_chunks(paragraphs, model=None, prompt="", api_choice="OpenAI API",
+                reserved_output_tokens=RESERVED_OUTPUT_TOKENS, max_chunk_tokens=None):
+    """Lazily pack (paragraph, start_offset) pairs into token-budgeted Chunks."""
+    model = model or DEFAULT_MODELS.get(api_choice, "gpt-4o")
+    token_budget = get_chunk_token_budget(
+        model, prompt, api_choice, reserved_output_tokens, max_chunk_tokens
+    )
+    return iter_planned_chunks(paragraphs, model, token_budget)
+
+def iter_pdf_pages(pdf_file):
+    """Yield the text of each page of a PDF, parsing pages only as they are requested."""
     try:
-        # Read the content as bytes first to detect encoding
-        content_bytes = txt_file.read()
-        # Rewind the file pointer to the beginning
-        txt_file.seek(0)
-        
-        # Detect encoding
-        encoding_result = chardet.detect(content_bytes)
-        encoding = encoding_result['encoding'] if encoding_result['encoding'] else 'utf-8'
-        
-        # Decode the content using the detected encoding
-        content = content_bytes.decode(encoding)
-        return content
+        pdf_reader = _pdf_reader(pdf_file)
+        for page in pdf_reader.pages:
+            yield page.extract_text()
     except Exception as e:
-        raise Exception(f"Error extracting text from TXT file: {e}")
+        raise Exception(f"Error extracting text from PDF: {e}")
 
-def chunk_text(pdf_content, api_choice="OpenAI API"):
-    """Chunk text using simple newline splitting to avoid dependency issues."""
-    # Adjust chunk size based on API provider
-    # Groq has stricter token limits (6000 TPM), so we use much smaller chunks
-    # The prompt templates are very large, so we need to leave room for them
-    chunk_size = 500 if api_choice == "Groq API" else 3000
-    
-    # Manual chunking by paragraphs
-    paragraphs = pdf_content.split('\n\n')
-    chunks = []
-    current_chunk = ""
-    
-    for paragraph in paragraphs:
-        if len(current_chunk) + len(paragraph) + 2 <= chunk_size:
-            if current_chunk:
-                current_chunk += "\n\n" + paragraph
-            else:
-                current_chunk = paragraph
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = paragraph
-    
-    if current_chunk:
-        chunks.append(current_chunk)
-    
-    return chunks
-
-def process_in_chunks(text, max_length=4000, api_choice="OpenAI API"):
-    """Split text into smaller chunks for processing."""
-    # Adjust max length based on API provider
-    if api_choice == "Groq API":
-        max_length = 500  # Much smaller chunks for Groq due to large prompts
-    
-    chunks = []
-    while len(text) > max_length:
-        split_index = text[:max_length].rfind("\n")  # Split at the last newline
-        if split_index == -1:
-            split_index = max_length
-        chunks.append(text[:split_index])
-        text = text[split_index:]
-    chunks.append(text)
-    return chunks
+def iter_page_paragraphs(pages):
+    """Yield (paragraph, start_offset) pairs from an iterable of page texts.
+    
+    Offsets match the text extract_text_from_pdf would return for the same
+    pages, where every page is followed by a blank line.
+    """
+    offset = 0
+    for page_text in pages:
+        for paragraph, start in iter_paragraphs(page_text):
+            yield paragraph, offset + start
+        offset += len(page_text) + len(PARAGRAPH_SEPARATOR)
+
+def count_pdf_pages(pdf_file):
+    """Return the number of pages of a PDF without extracting any text."""
+    page_count = len(_pdf_reader(pdf_file).pages)
+    if not isinstance(pdf_file, (str, os.PathLike)):
+        pdf_file.seek(0)
+    return page_count
+
+def iter_pdf_chunks(pdf_file, model=None, prompt="", api_choice="OpenAI API", max_chunk_tokens=None,
+                    clean=False, cleaning_report=None):
+    """Stream a PDF as token-budgeted Chunks: pages -> paragraphs -> chunks.
+    
+    Only the pages behind the chunk being assembled are held in memory, so
+    the first chunk can be sent to the model while later pages are still
+    unparsed. With clean, boilerplate and back matter are stripped on the
+    way (see iter_clean_pages).
+    """
+    pages = iter_pdf_pages(pdf_file)
+    if clean:
+        pages = iter_clean_pages(
+            pages, count_pdf_pages(pdf_file), cleaning_report, model or DEFAULT_MODELS.get(api_choice, "gpt-4o")
+        )
+    paragraphs = iter_page_paragraphs(pages)
+    return iter_chunks(paragraphs, model, prompt, api_choice, max_chunk_tokens=max_chunk_tokens)
+
+def iter_text_paragraphs(pieces, separator=PARAGRAPH_SEPARATOR):
+    """Yield (paragraph, start_offset) pairs from text that arrives in pieces.
+    
+    Gives the same result as iter_paragraphs over the joined text while
+    holding only the current, unfinished paragraph.
+    """
+    buffer = ""
+    offset = 0
+    for piece in pieces:
+        # A separator may straddle the boundary between two pieces
+        search_from = max(0, len(buffer) - len(separator) + 1)
+        buffer += piece
+        start = 0
+        while True:
+            end = buffer.find(separator, search_from)
+            if end == -1:
+                break
+            yield buffer[start:end], offset + start
+            start = search_from = end + len(separator)
+        if start:
+            buffer = buffer[start:]
+            offset += start
+    yield buffer, offset
+
+def iter_txt_chunks(txt_file, model=None, prompt="", api_choice="OpenAI API", max_chunk_tokens=None):
+    """Stream a TXT file as token-budgeted Chunks, decoding it block by block."""
+    paragraphs = iter_text_paragraphs(iter_txt_text(txt_file))
+    return iter_chunks(paragraphs, model, prompt, api_choice, max_chunk_tokens=max_chunk_tokens)
+
+def iter_document_chunks(document, model=None, prompt="", api_choice="OpenAI API", max_chunk_tokens=None,
+                         file_type=None, clean=False, cleaning_report=None):
+    """Stream a PDF or TXT document as token-budgeted Chunks.
+    
+    file_type ("pdf" or "txt") defaults to the extension of the path or of
+    the file object's name. Cleaning applies to PDFs, whose pages are known.
+    """
+    if file_type is None:
+        name = document if isinstance(document, (str, os.PathLike)) else getattr(document, "name", "")
+        file_type = os.path.splitext(str(name))[1].lstrip(".").lower()
+    if file_type == "pdf":
+        return iter_pdf_chunks(document, model, prompt, api_choice, max_chunk_tokens, clean, cleaning_report)
+    if file_type == "txt":
+        return iter_txt_chunks(document, model, prompt, api_choice, max_chunk_tokens)
+    raise ValueError(f"Unsupported file type: {file_type}")
+
+def chunk_text(pdf_content, api_choice="OpenAI API", model=None, prompt="", max_chunk_tokens=None,
+               content_defined=False):
+    """Chunk text by paragraphs into a ChunkPlan sized for the model's context window."""
+    return plan_chunks(
+        pdf_content, model, prompt, api_choice,
+        max_chunk_tokens=max_chunk_tokens, content_defined=content_defined
+    )
+
+def process_in_chunks(text, max_tokens=None, api_choice="OpenAI API", model=None, prompt=""):
+    """Split text into pieces that each fit into one request next to prompt."""
+    return plan_chunks(text, model, prompt, api_choice, max_chunk_tokens=max_tokens).texts
 
 def read_prompt_file(prompt_file, default_prompt):
     """Read a prompt from a file or return the default prompt."""
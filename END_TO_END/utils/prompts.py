@@ -0,0 +1,61 @@
+# Entity extraction prompt
+DEFAULT_ENTITY_PROMPT = """
+You are a Materials Science expert. Extract entities from the text using these categories:
+- Material: any material, substance, or chemical
+- Manufacturing: any manufacturing process, synthesis, or fabrication
+- Measurement: any characterization, measurement, or analysis
+- Property: any property, characteristic, or attribute
+- Parameter: any processing parameter, condition, or variable
+
+Format your response as a structured list of entities.
+"""
+
+# Relationship extraction prompt
+DEFAULT_RELATIONSHIP_PROMPT = """
+You are a Materials Science expert. Extract relationships between the entities using these relationship types:
+- is_manufacturing_input: material → manufacturing
+- has_manufacturing_output: manufacturing → material
+- is_measurement_input: material → measurement
+- has_measurement_output: measurement → property
+- has_property: material → property
+- has_parameter: manufacturing/measurement → parameter
+
+Format your response as a simple list of relationships.
+"""
+
+# JSON-LD generation prompt
+DEFAULT_JSON_PROMPT = """
+Generate a JSON-LD representation of the following entities and relationships.
+
+Format:
+{
+  "@context": {
+    "ex": "http://example.com/",
+    "emmo": "http://emmo.info/emmo#",
+    "skos": "http://www.w3.org/2004/02/skos/core#"
+  },
+  "@graph": [
+    {
+      "@id": "ex:Material1",
+      "@type": "emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94",
+      "skos:prefLabel": "Material Name"
+    },
+    ...
+  ]
+}
+
+Use these entity types:
+- Material: emmo:EMMO_4207e895_8b83_4318_996a_72cfb32acd94
+- Manufacturing: emmo:EMMO_a4d66059_5dd3_4b90_b4cb_10960559441b
+- Measurement: emmo:EMMO_463bcfda_867b_41d9_a967_211d4d437cfb
+- Property: emmo:EMMO_b7bcff25_ffc3_474e_9ab5_01b1664bd4ba
+- Parameter: emmo:EMMO_d1d436e7_72fc_49cd_863b_7bfb4ba5276a
+
+And these relationship types:
+- is_manufacturing_input: emmo:EMMO_e1097637
+- has_manufacturing_output: emmo:EMMO_e1245987
+- is_measurement_input: emmo:EMMO_m5677989
+- has_measurement_output: emmo:EMMO_m87987545
+- has_property: emmo:EMMO_p5778r78
+- has_parameter: emmo:EMMO_p46903ar7
+"""
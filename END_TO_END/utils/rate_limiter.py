@@ -0,0 +1,174 @@
+import threading
+import time
+
+# Requests and tokens per minute used unless the account's limits are configured:
+# OpenAI's usage tier 2 for gpt-4o (tier 1 accounts have 500 RPM / 30k TPM) and
+# Groq's free tier
+DEFAULT_RATE_LIMITS = {
+    "OpenAI API": {"rpm": 5000, "tpm": 450000},
+    "Groq API": {"rpm": 30, "tpm": 6000}
+}
+
+# Output tokens reserved per request on top of the prompt tokens, both in the token
+# budget and in the context window left when chunks are planned
+RESERVED_OUTPUT_TOKENS = 2048
+
+MAX_RATE_LIMIT_RETRIES = 5
+
+class TokenBucket:
+    """Token bucket that refills continuously up to its capacity."""
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.available = min(self.capacity, self.available + elapsed * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Take amount from the bucket and return how long the caller must wait.
+
+        The bucket may go negative, which queues later callers behind this
+        one. A request larger than the whole bucket leaves it in debt, so it
+        waits for the refill instead of being blocked forever.
+        """
+        self._refill(now)
+        self.available -= float(amount)
+        if self.available >= 0:
+            return 0.0
+        return -self.available / self.refill_per_second
+
+    def refund(self, amount, now):
+        """Give back part of an earlier reservation; a negative amount takes more."""
+        self._refill(now)
+        self.available = min(self.capacity, self.available + float(amount))
+
+class RateLimiter:
+    """Request and token budget for one provider/model pair.
+
+    acquire() blocks until a request of the given size fits under both the
+    RPM and TPM budgets, and settle() corrects that reservation once the
+    request's actual size is known. Rate-limit responses halve the effective rate and
+    successful calls restore it gradually, so concurrent callers settle at the
+    highest throughput the provider actually sustains.
+    """
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.rate_scale = 1.0
+        self.paused_until = 0.0
+        self._requests = TokenBucket(rpm, rpm / 60.0)
+        self._tokens = TokenBucket(tpm, tpm / 60.0)
+        self._lock = threading.Lock()
+
+    def _apply_scale(self):
+        self._requests.refill_per_second = self.rpm / 60.0 * self.rate_scale
+        self._tokens.refill_per_second = self.tpm / 60.0 * self.rate_scale
+
+    def acquire(self, tokens):
+        """Block until a request using the given number of tokens may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            wait_time = max(
+                self._requests.reserve(1, now),
+                self._tokens.reserve(tokens, now),
+                self.paused_until - now
+            )
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def settle(self, reserved, used=0):
+        """Return the unused part of a token reservation made by acquire().
+
+        used is the number of tokens the provider counted for the request;
+        a request that failed or was rate limited uses none. A request that
+        used more than it reserved is charged the difference.
+        """
+        with self._lock:
+            self._tokens.refund(reserved - used, time.monotonic())
+
+    def on_success(self):
+        """Recover a little of the rate lost to earlier rate-limit responses."""
+        with self._lock:
+            if self.rate_scale < 1.0:
+                self.rate_scale = min(1.0, self.rate_scale + 0.05)
+                self._apply_scale()
+
+    def on_rate_limited(self, retry_after=None):
+        """Back off after a rate-limit response from the provider."""
+        with self._lock:
+            now = time.monotonic()
+            self.rate_scale = max(0.05, self.rate_scale * 0.5)
+            self._apply_scale()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+_limiters = {}
+_rate_limit_overrides = {}
+# Number of processes sharing the provider budget, each with its own limiters
+_process_share = 1
+_limiters_lock = threading.Lock()
+
+def configure_rate_limit(api_choice, model=None, rpm=None, tpm=None):
+    """Override the RPM/TPM budget for a provider, or for one of its models."""
+    with _limiters_lock:
+        limits = dict(_rate_limit_overrides.get((api_choice, model), {}))
+        if rpm is not None:
+            limits["rpm"] = rpm
+        if tpm is not None:
+            limits["tpm"] = tpm
+        _rate_limit_overrides[(api_choice, model)] = limits
+        for key in [key for key in _limiters if key[0] == api_choice and (model is None or key[1] == model)]:
+            del _limiters[key]
+
+def set_process_share(processes):
+    """Give every limiter of this process 1/processes of the provider budget.
+
+    Only the limiters are divided; get_rate_limits still returns the whole
+    budget, so request sizes do not depend on the number of processes.
+    """
+    global _process_share
+    with _limiters_lock:
+        _process_share = max(1, int(processes))
+        _limiters.clear()
+
+def get_rate_limits(api_choice, model):
+    """Return the effective {"rpm", "tpm"} budget for a provider/model pair."""
+    limits = dict(DEFAULT_RATE_LIMITS.get(api_choice, DEFAULT_RATE_LIMITS["OpenAI API"]))
+    limits.update(_rate_limit_overrides.get((api_choice, None), {}))
+    limits.update(_rate_limit_overrides.get((api_choice, model), {}))
+    return limits
+
+def get_rate_limiter(api_choice, model):
+    """Return the shared rate limiter for a provider/model pair."""
+    with _limiters_lock:
+        limiter = _limiters.get((api_choice, model))
+        if limiter is None:
+            limits = get_rate_limits(api_choice, model)
+            limiter = RateLimiter(
+                max(1, limits["rpm"] / _process_share),
+                max(1, limits["tpm"] / _process_share)
+            )
+            _limiters[(api_choice, model)] = limiter
+        return limiter
+
+def is_rate_limit_error(error):
+    """Return True if an API error is a rate-limit (HTTP 429) response."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+def retry_after_seconds(error):
+    """Return the Retry-After delay of a rate-limit error in seconds, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,194 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from utils.structured_extraction import CATEGORY_ALIASES
+
+# Weighted mentions per 100 words below which a chunk is skipped
+DEFAULT_RELEVANCE_THRESHOLD = 1.0
+
+# Characters of each chunk kept in the audit log
+PREVIEW_CHARS = 120
+
+# Domain vocabulary per category; a trailing * matches any word starting with the stem
+CATEGORY_TERMS = {
+    "Material": [
+        "material*", "substance*", "chemical*", "polymer*", "ionomer*", "membrane*", "film*", "alloy*",
+        "oxide*", "metal*", "ceramic*", "composite*", "crystal*", "powder*", "solvent*", "solution*",
+        "electrolyte*", "catalyst*", "nanoparticle*", "particle*", "fiber*", "fibre*", "glass*", "carbon*",
+        "graphene*", "silicon*", "steel*", "resin*", "monomer*", "salt*", "acid*", "electrode*",
+        "substrate*", "coating*", "compound*", "precursor*", "water", "ethanol", "nafion"
+    ],
+    "Manufacturing": [
+        "manufactur*", "synthes*", "fabricat*", "processing", "anneal*", "sinter*", "cast*", "deposit*",
+        "coated", "spin", "print*", "milling", "milled", "extru*", "mixed", "mixing", "stirr*", "dried",
+        "drying", "calcin*", "heated", "heating", "quench*", "pressed", "pressing", "cured", "curing",
+        "dissolv*", "evaporat*", "sputter*", "electrospun", "electrospin*", "hydrotherm*", "doped",
+        "doping", "prepar*", "treated", "treatment*", "polymeriz*", "polymeris*", "immers*", "washed"
+    ],
+    "Measurement": [
+        "measur*", "characteri*", "analys*", "analyz*", "spectroscop*", "spectr*", "diffract*",
+        "microscop*", "xrd", "sem", "tem", "ftir", "nmr", "xps", "dsc", "tga", "afm", "saxs", "waxs",
+        "impedance", "titrat*", "calorimetr*", "chromatograph*", "scattering", "tensile", "isotherm*"
+    ],
+    "Property": [
+        "propert*", "characteristic*", "attribute*", "conductiv*", "resistiv*", "strength*", "modul*",
+        "hardness", "density", "densities", "viscosit*", "porosit*", "crystallin*", "stabilit*",
+        "permeab*", "uptake", "swelling", "morpholog*", "thickness*", "capacit*", "efficienc*",
+        "bandgap", "toughness", "elastic*", "thermal*", "mechanical*", "optical*", "electrical*",
+        "magnetic*", "solubilit*", "diffusiv*", "hydrophil*", "hydrophob*", "durabilit*", "ductil*"
+    ],
+    "Parameter": [
+        "paramet*", "condition*", "variable*", "temperature*", "pressure*", "humidit*", "duration*",
+        "rate", "rates", "concentration*", "ratio*", "ph", "voltage*", "current*", "frequenc*", "speed*",
+        "atmosphere*", "dose*", "loading*", "content*", "hydration", "annealing"
+    ]
+}
+
+# Front-matter and licence words; each one cancels a category mention
+FRONT_MATTER_TERMS = [
+    "universit*", "department*", "institut*", "laborator*", "school", "faculty", "email", "e-mail",
+    "orcid", "correspond*", "received", "accepted", "published", "revised", "copyright", "licen*",
+    "doi", "http*", "www", "journal", "permission*", "creative", "commons", "affiliation*", "author*"
+]
+
+# Chemical formulas such as TiO2, H2SO4 or Li7La3Zr2O12 count as material mentions
+FORMULA_PATTERN = r"\b(?=[A-Za-z]*\d)(?:[A-Z][a-z]?\d*(?:\.\d+)?){2,}\b"
+
+# Numbers with units count as parameter mentions
+QUANTITY_PATTERN = (
+    r"(?<![\w.,])\d+(?:[.,]\d+)?\s?(?:°\s?C|K|nm|µm|μm|mm|cm|mg|kg|g|mL|ml|L|mol|mM|M|wt\s?%|vol\s?%|mol\s?%|%|"
+    r"Pa|kPa|MPa|GPa|bar|atm|mV|V|mA|A|W|Hz|kHz|MHz|rpm|h|min|s|S/cm|mS/cm|eV)(?![A-Za-z])"
+)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+PROMPT_CATEGORY_PATTERN = re.compile(r"^\s*[-*]\s*([A-Za-z][A-Za-z ]*?)\s*:\s*(.+)$", re.MULTILINE)
+
+PROMPT_STOPWORDS = {"any", "and", "the", "for", "with", "from", "that", "this", "other", "such"}
+
+def prompt_category_terms(entity_prompt):
+    """Return {category: [terms]} for the "- Category: description" lines of an entity prompt.
+
+    Custom prompts that add categories or describe them differently extend
+    the scorer's vocabulary with their own words.
+    """
+    terms = {}
+    for name, description in PROMPT_CATEGORY_PATTERN.findall(entity_prompt or ""):
+        category = CATEGORY_ALIASES.get(name.strip().lower(), name.strip())
+        words = [name] + re.split(r"[^A-Za-z]+", description)
+        for word in words:
+            word = word.strip().lower()
+            if len(word) < 4 or word in PROMPT_STOPWORDS:
+                continue
+            # Match plurals and inflections of the description words
+            terms.setdefault(category, []).append(word.rstrip("s") + "*")
+    return terms
+
+def _term_pattern(terms):
+    """Return a regex alternation matching whole words and * stems, longest first."""
+    alternatives = []
+    for term in sorted(set(terms), key=len, reverse=True):
+        if term.endswith("*"):
+            alternatives.append(re.escape(term[:-1]) + r"\w*")
+        else:
+            alternatives.append(re.escape(term) + r"\b")
+    # Words match in any case; formulas and units below stay case-sensitive
+    return r"(?i:\b(?:" + "|".join(alternatives) + "))"
+
+@lru_cache(maxsize=16)
+def build_relevance_pattern(entity_prompt=None):
+    """Compile one regex with a named group per category (plus formulas and quantities).
+
+    A single pass of the regex engine over a chunk finds every mention, and
+    match.lastgroup tells which category it belongs to.
+    """
+    vocabulary = {category: list(terms) for category, terms in CATEGORY_TERMS.items()}
+    for category, terms in prompt_category_terms(entity_prompt).items():
+        vocabulary.setdefault(category, []).extend(terms)
+    groups = {f"c{index}": category for index, category in enumerate(vocabulary)}
+    parts = [f"(?P<formula>{FORMULA_PATTERN})", f"(?P<quantity>{QUANTITY_PATTERN})"]
+    parts += [f"(?P<{group}>{_term_pattern(vocabulary[category])})" for group, category in groups.items()]
+    parts.append(f"(?P<front_matter>{_term_pattern(FRONT_MATTER_TERMS)})")
+    groups["formula"] = "Material"
+    groups["quantity"] = "Parameter"
+    groups["front_matter"] = None
+    return re.compile("|".join(parts)), groups
+
+class RelevanceScorer:
+    """Cheap local estimate of whether a chunk mentions any extractable entities.
+
+    The score is the number of category mentions per 100 words, with
+    sublinear term frequency (1 + ln tf) so a single word repeated many
+    times counts for less than several different ones, minus the same
+    measure for front-matter words. Author lists, affiliations, licence
+    text and figure-axis residue score close to zero.
+    """
+    def __init__(self, entity_prompt=None, threshold=DEFAULT_RELEVANCE_THRESHOLD):
+        self.pattern, self.groups = build_relevance_pattern(entity_prompt)
+        self.threshold = threshold
+
+    def score(self, text):
+        """Return (score, {category: mentions}, [most frequent terms]) for a chunk."""
+        words = len(WORD_PATTERN.findall(text))
+        if not words:
+            return 0.0, {}, []
+        term_counts = Counter()
+        term_categories = {}
+        for match in self.pattern.finditer(text):
+            term = match.group().lower()
+            term_counts[term] += 1
+            term_categories[term] = self.groups[match.lastgroup]
+        categories = Counter()
+        weighted = 0.0
+        for term, count in term_counts.items():
+            category = term_categories[term]
+            if category is None:
+                weighted -= 1 + math.log(count)
+            else:
+                categories[category] += count
+                weighted += 1 + math.log(count)
+        top_terms = [term for term, _ in term_counts.most_common(5) if term_categories[term] is not None]
+        return max(0.0, 100.0 * weighted / words), dict(categories), top_terms
+
+    def filter(self, chunks, decisions=None):
+        """Yield the chunks scoring at least the threshold, in order.
+
+        A decision is appended to decisions for every chunk, so skipped
+        chunks can be audited. If no chunk reaches the threshold, the best
+        scoring one is still yielded at the end so extraction never runs
+        on an empty document.
+        """
+        kept = 0
+        best = None
+        for index, chunk in enumerate(chunks):
+            score, categories, terms = self.score(chunk)
+            decision = {
+                "chunk": index,
+                "score": round(score, 2),
+                "kept": score >= self.threshold,
+                "categories": categories,
+                "terms": terms,
+                "preview": " ".join(chunk[:PREVIEW_CHARS].split())
+            }
+            if decisions is not None:
+                decisions.append(decision)
+            if decision["kept"]:
+                kept += 1
+                yield chunk
+            elif best is None or score > best[0]:
+                best = (score, chunk, decision)
+        if not kept and best is not None:
+            best[2]["kept"] = True
+            best[2]["reason"] = "best scoring chunk kept because none reached the threshold"
+            yield best[1]
+
+def relevance_summary(decisions, threshold):
+    """Summarize the decisions of RelevanceScorer.filter for a workflow result."""
+    skipped = [decision for decision in decisions if not decision["kept"]]
+    return {
+        "threshold": threshold,
+        "kept": len(decisions) - len(skipped),
+        "skipped": len(skipped),
+        "decisions": decisions
+    }
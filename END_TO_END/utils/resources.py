@@ -0,0 +1,58 @@
+import importlib.util
+import json
+from utils.token_utils import ENCODING_URLS, OFFLINE, is_encoding_cached, tiktoken_cache_dir
+
+# Optional modules and the feature each one enables
+OPTIONAL_DEPENDENCIES = {
+    "PyPDF2": "PDF text extraction",
+    "chardet": "TXT encoding detection",
+    "tiktoken": "exact token counts (estimated from characters otherwise)",
+    "openai": "OpenAI API calls",
+    "groq": "Groq API calls",
+    "httpx": "pooled API connections",
+    "orjson": "faster JSON-LD parsing"
+}
+
+def check_resources():
+    """Report which optional dependencies and tokenizer files are available.
+
+    Nothing is imported and no network access is made, so the check is safe
+    to run at startup on air-gapped machines.
+    """
+    dependencies = {
+        name: importlib.util.find_spec(name) is not None
+        for name in OPTIONAL_DEPENDENCIES
+    }
+    encodings = {name: is_encoding_cached(name) for name in ENCODING_URLS}
+    return {
+        "offline": OFFLINE,
+        "dependencies": dependencies,
+        "encodings": encodings,
+        "tiktoken_cache_dir": tiktoken_cache_dir()
+    }
+
+def missing_resources(report=None):
+    """Return human-readable notes for every resource that is unavailable.
+
+    Uncached tokenizer files are only reported in offline mode; otherwise
+    tiktoken downloads them on first use.
+    """
+    report = report or check_resources()
+    notes = [
+        f"{name} is not installed: {OPTIONAL_DEPENDENCIES[name]} is unavailable"
+        for name, available in report["dependencies"].items() if not available
+    ]
+    if report["offline"] and report["dependencies"].get("tiktoken"):
+        for name, cached in report["encodings"].items():
+            if not cached:
+                notes.append(
+                    f"tiktoken encoding {name} is not cached in {report['tiktoken_cache_dir']}; "
+                    "token counts fall back to estimates"
+                )
+    return notes
+
+if __name__ == "__main__":
+    report = check_resources()
+    print(json.dumps(report, indent=2))
+    for note in missing_resources(report):
+        print("-", note)
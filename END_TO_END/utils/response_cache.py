@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "KG_EXTRACTOR_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "kg_extractor", "responses.sqlite")
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Access times of hits are written in batches of this size, or with the next set()
+ACCESS_FLUSH_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """On-disk LLM response cache keyed on a hash of the request.
+
+    Entries are evicted least-recently-used once the stored responses exceed
+    max_bytes, and expire after ttl seconds when a ttl is given. A disabled
+    cache never reads or writes but still counts bypassed lookups as misses.
+
+    Several processes may share the database: the size is read from it
+    inside each write transaction, and hits only record their access time in
+    memory until the next write, so lookups never take the write lock.
+    Database errors are logged and treated as misses or skipped writes, so
+    the cache never fails a request.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=None, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        # key -> access time of hits not yet written to the database
+        self._accessed = {}
+
+    def _connect(self):
+        """Open the database on first use."""
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Autocommit; writes open their own transaction with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                # Readers are not blocked by another process's write
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(provider, model, prompt, params=None):
+        """Return the content hash identifying a request."""
+        payload = json.dumps(
+            {"provider": provider, "model": model, "prompt": prompt, "params": params or {}},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss."""
+        if not self.enabled:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Response cache read failed, continuing without it: %s", e)
+                row = None
+            # Expired entries are replaced or deleted by the next write
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                try:
+                    self._write(conn)
+                except sqlite3.Error as e:
+                    logger.warning("Response cache write failed, continuing without it: %s", e)
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """Store a response and evict old entries if the cache is over budget."""
+        if not self.enabled or not value:
+            return
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            try:
+                now = time.time()
+                self._write(self._connect(), (key, value, size, now, now))
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Response cache write failed, continuing without it: %s", e)
+
+    def _write(self, conn, entry=None):
+        """Store entry and the pending access times, expire and evict, in one write transaction."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._accessed:
+                conn.executemany(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    [(accessed, key) for key, accessed in self._accessed.items()]
+                )
+            if entry is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    entry
+                )
+            if self.ttl is not None:
+                conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            # Access times only order eviction; a failed write does not keep them
+            self._accessed.clear()
+
+    def _evict(self, conn):
+        """Delete least recently used entries until the cache fits max_bytes."""
+        total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total_bytes > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """Remove every cached response and reset the counters."""
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+            self._accessed.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            entries = 0
+            total_bytes = 0
+            if self.enabled:
+                try:
+                    entries, total_bytes = self._connect().execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                    ).fetchone()
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning("Response cache stats failed: %s", e)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": entries,
+                "bytes": total_bytes
+            }
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the process-wide response cache, creating it on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+def configure_response_cache(**kwargs):
+    """Replace the process-wide response cache with one built from kwargs."""
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = ResponseCache(**kwargs)
+        return _response_cache
@@ -0,0 +1,229 @@
+import json
+import re
+import unicodedata
+
+ENTITY_CATEGORIES = ["Material", "Manufacturing", "Measurement", "Property", "Parameter"]
+
+RELATIONSHIP_TYPES = [
+    "is_manufacturing_input",
+    "has_manufacturing_output",
+    "is_measurement_input",
+    "has_measurement_output",
+    "has_property",
+    "has_parameter"
+]
+
+# Alternative category names models tend to use, mapped to the canonical ones
+CATEGORY_ALIASES = {
+    "material": "Material",
+    "materials": "Material",
+    "matter": "Material",
+    "substance": "Material",
+    "chemical": "Material",
+    "manufacturing": "Manufacturing",
+    "process": "Manufacturing",
+    "synthesis": "Manufacturing",
+    "fabrication": "Manufacturing",
+    "measurement": "Measurement",
+    "characterization": "Measurement",
+    "analysis": "Measurement",
+    "property": "Property",
+    "properties": "Property",
+    "parameter": "Parameter",
+    "parameters": "Parameter",
+    "condition": "Parameter"
+}
+
+STRUCTURED_ENTITY_INSTRUCTIONS = """
+
+Return ONLY a JSON array with one object per entity, no other text:
+[{"name": "<entity name>", "category": "<Material|Manufacturing|Measurement|Property|Parameter>", "attributes": {"<attribute>": "<value>"}}]
+Use an empty object for attributes when there are none."""
+
+STRUCTURED_RELATIONSHIP_INSTRUCTIONS = """
+
+Return ONLY a JSON array with one object per relationship, no other text:
+[{"source": "<entity name>", "relation": "<relationship type>", "target": "<entity name>"}]"""
+
+class EntityRecord:
+    """A typed entity with free-form attributes."""
+    __slots__ = ("name", "category", "attributes")
+
+    def __init__(self, name, category, attributes=None):
+        self.name = name
+        self.category = category
+        self.attributes = attributes or {}
+
+    def to_dict(self):
+        return {"name": self.name, "category": self.category, "attributes": dict(self.attributes)}
+
+    def __repr__(self):
+        return f"EntityRecord({self.name!r}, {self.category!r})"
+
+class RelationshipRecord:
+    """A directed, typed relationship between two entity names."""
+    __slots__ = ("source", "relation", "target")
+
+    def __init__(self, source, relation, target):
+        self.source = source
+        self.relation = relation
+        self.target = target
+
+    def to_dict(self):
+        return {"source": self.source, "relation": self.relation, "target": self.target}
+
+    def __repr__(self):
+        return f"RelationshipRecord({self.source!r}, {self.relation!r}, {self.target!r})"
+
+def normalize_name(name):
+    """Return the key used to decide whether two entity names are the same."""
+    name = unicodedata.normalize("NFKC", str(name)).casefold()
+    name = re.sub(r"\s+", " ", name)
+    return name.strip(" \t.,;:'\"`*-")
+
+def normalize_category(category):
+    """Map a category label onto one of ENTITY_CATEGORIES, if possible."""
+    if not category:
+        return "Unknown"
+    key = normalize_name(category)
+    if key in CATEGORY_ALIASES:
+        return CATEGORY_ALIASES[key]
+    for canonical in ENTITY_CATEGORIES:
+        if canonical.lower() in key:
+            return canonical
+    return str(category).strip()
+
+def normalize_relation(relation):
+    """Return a relationship type in lower snake case."""
+    return re.sub(r"[\s\-]+", "_", normalize_name(relation))
+
+def _json_items(text):
+    """Return the JSON objects contained in a model response."""
+    if not text:
+        return []
+    start = text.find("[")
+    end = text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            if isinstance(data, list):
+                return [item for item in data if isinstance(item, dict)]
+        except json.JSONDecodeError:
+            pass
+    # Fall back to one JSON object per line
+    items = []
+    for line in text.splitlines():
+        line = line.strip().rstrip(",")
+        if line.startswith("{") and line.endswith("}"):
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return items
+
+def parse_entity_records(text):
+    """Parse a structured entity response into EntityRecords.
+
+    Responses that are not JSON are read as list lines of the form
+    "- Category: name".
+    """
+    records = []
+    for item in _json_items(text):
+        name = item.get("name")
+        if not name:
+            continue
+        attributes = item.get("attributes")
+        records.append(EntityRecord(
+            str(name).strip(),
+            normalize_category(item.get("category")),
+            attributes if isinstance(attributes, dict) else {}
+        ))
+    if records or not text:
+        return records
+    for match in re.finditer(r"^\s*[-*\d.]*\s*\**([A-Za-z ]+?)\**\s*:\s*(.+?)\s*$", text, re.MULTILINE):
+        category = normalize_category(match.group(1))
+        if category in ENTITY_CATEGORIES:
+            for name in match.group(2).split(","):
+                if name.strip():
+                    records.append(EntityRecord(name.strip(), category))
+    return records
+
+def parse_relationship_records(text):
+    """Parse a structured relationship response into RelationshipRecords.
+
+    Responses that are not JSON are read as lines of the form
+    "source -- relation --> target" or "source | relation | target".
+    """
+    records = []
+    for item in _json_items(text):
+        source, relation, target = item.get("source"), item.get("relation"), item.get("target")
+        if source and relation and target:
+            records.append(RelationshipRecord(str(source).strip(), normalize_relation(relation), str(target).strip()))
+    if records or not text:
+        return records
+    pattern = re.compile(r"^\s*[-*\d.]*\s*(.+?)\s*(?:--+|\|)\s*(\w+)\s*(?:--+>|->|\|)\s*(.+?)\s*$", re.MULTILINE)
+    for match in pattern.finditer(text):
+        records.append(RelationshipRecord(match.group(1), normalize_relation(match.group(2)), match.group(3)))
+    return records
+
+def merge_entities(record_lists):
+    """Merge per-chunk entity records into one deduplicated list.
+
+    Entities are matched on their normalized name; the first spelling and
+    the first known category win, and attribute values from every chunk are
+    kept, collecting conflicting values into a list. Order follows first
+    appearance, so the result is reproducible for the same inputs.
+    """
+    merged = {}
+    for records in record_lists:
+        for record in records:
+            key = normalize_name(record.name)
+            if not key:
+                continue
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = EntityRecord(record.name, record.category, dict(record.attributes))
+                continue
+            if existing.category == "Unknown" and record.category != "Unknown":
+                existing.category = record.category
+            for attribute, value in record.attributes.items():
+                current = existing.attributes.get(attribute)
+                if current is None:
+                    existing.attributes[attribute] = value
+                elif current != value:
+                    values = current if isinstance(current, list) else [current]
+                    if value not in values:
+                        existing.attributes[attribute] = values + [value]
+    return list(merged.values())
+
+def merge_relationships(record_lists, entities=None):
+    """Merge per-chunk relationship records into one deduplicated list.
+
+    When merged entities are given, endpoints are rewritten to the entity's
+    canonical spelling before deduplication.
+    """
+    canonical = {normalize_name(entity.name): entity.name for entity in entities or []}
+    merged = {}
+    for records in record_lists:
+        for record in records:
+            source = canonical.get(normalize_name(record.source), record.source)
+            target = canonical.get(normalize_name(record.target), record.target)
+            key = (normalize_name(source), record.relation, normalize_name(target))
+            if key not in merged:
+                merged[key] = RelationshipRecord(source, record.relation, target)
+    return list(merged.values())
+
+def format_entities(records):
+    """Render entity records as the plain-text list used in later prompts."""
+    lines = []
+    for record in records:
+        line = f"- {record.category}: {record.name}"
+        if record.attributes:
+            attributes = "; ".join(f"{key}={value}" for key, value in record.attributes.items())
+            line += f" ({attributes})"
+        lines.append(line)
+    return "\n".join(lines)
+
+def format_relationships(records):
+    """Render relationship records as the plain-text list used in later prompts."""
+    return "\n".join(f"- {record.source} --{record.relation}--> {record.target}" for record in records)
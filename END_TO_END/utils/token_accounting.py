@@ -0,0 +1,162 @@
+import contextvars
+import functools
+import threading
+from utils.token_utils import count_tokens
+
+# Workflow stages in pipeline order; calls made without a stage are reported as "other"
+STAGES = ["entity", "entity_condense", "relationship", "relationship_condense", "json_ld"]
+
+class StageUsage:
+    """Token and call counters for one stage."""
+    __slots__ = (
+        "calls", "cached_calls", "estimated_calls", "input_tokens", "output_tokens",
+        "max_input_tokens", "seconds"
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.cached_calls = 0
+        self.estimated_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.max_input_tokens = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        billed = self.calls - self.cached_calls
+        return {
+            "calls": self.calls,
+            "cached_calls": self.cached_calls,
+            "estimated_calls": self.estimated_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "mean_input_tokens": round(self.input_tokens / billed) if billed else 0,
+            "max_input_tokens": self.max_input_tokens,
+            "seconds": round(self.seconds, 3)
+        }
+
+class TokenLedger:
+    """Thread-safe record of the tokens every API call consumed, grouped by stage.
+
+    Provider usage fields are used when the response carries them; otherwise
+    the prompt and response are counted with tiktoken (or the character
+    estimate). Calls answered by the response cache consume no tokens and
+    are only counted.
+    """
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget every recorded call, e.g. at the start of a new run."""
+        with self._lock:
+            self._stages = {}
+
+    def record(self, stage, prompt, response, model, usage=None, cached=False, seconds=0.0):
+        """Record one call; usage is a dict with prompt_tokens/completion_tokens if the provider sent it."""
+        stage = stage or "other"
+        if cached:
+            input_tokens = output_tokens = 0
+            estimated = False
+        elif usage and usage.get("prompt_tokens") is not None:
+            input_tokens = usage["prompt_tokens"]
+            output_tokens = usage.get("completion_tokens") or 0
+            estimated = False
+        else:
+            input_tokens = count_tokens(prompt, model)
+            output_tokens = count_tokens(response, model)
+            estimated = True
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = StageUsage()
+            entry.calls += 1
+            entry.cached_calls += cached
+            entry.estimated_calls += estimated
+            entry.input_tokens += input_tokens
+            entry.output_tokens += output_tokens
+            entry.max_input_tokens = max(entry.max_input_tokens, input_tokens)
+            entry.seconds += seconds
+
+    def report(self):
+        """Return per-stage usage in pipeline order, totals and each stage's share of all tokens."""
+        with self._lock:
+            stages = {stage: usage.to_dict() for stage, usage in self._stages.items()}
+        return _build_report(stages)
+
+def _build_report(stages):
+    order = STAGES + sorted(stage for stage in stages if stage not in STAGES)
+    stages = {stage: stages[stage] for stage in order if stage in stages}
+    totals = {
+        key: sum(usage[key] for usage in stages.values())
+        for key in ("calls", "cached_calls", "estimated_calls", "input_tokens", "output_tokens")
+    }
+    all_tokens = totals["input_tokens"] + totals["output_tokens"]
+    for usage in stages.values():
+        tokens = usage["input_tokens"] + usage["output_tokens"]
+        usage["share"] = round(tokens / all_tokens, 3) if all_tokens else 0.0
+    return {"stages": stages, "totals": totals}
+
+def combine_token_reports(reports):
+    """Add up the stage usage of several reports, e.g. one per document of a corpus."""
+    stages = {}
+    for report in reports:
+        for stage, usage in report["stages"].items():
+            combined = stages.setdefault(stage, StageUsage())
+            combined.calls += usage["calls"]
+            combined.cached_calls += usage["cached_calls"]
+            combined.estimated_calls += usage["estimated_calls"]
+            combined.input_tokens += usage["input_tokens"]
+            combined.output_tokens += usage["output_tokens"]
+            combined.max_input_tokens = max(combined.max_input_tokens, usage["max_input_tokens"])
+            combined.seconds += usage["seconds"]
+    return _build_report({stage: usage.to_dict() for stage, usage in stages.items()})
+
+def format_token_report(report):
+    """Render a token report as an aligned text table."""
+    lines = [f"{'stage':22} {'calls':>6} {'cached':>6} {'input':>9} {'output':>8} {'mean in':>8} {'max in':>7} {'share':>6}"]
+    for stage, usage in report["stages"].items():
+        lines.append(
+            f"{stage:22} {usage['calls']:6d} {usage['cached_calls']:6d} {usage['input_tokens']:9d} "
+            f"{usage['output_tokens']:8d} {usage['mean_input_tokens']:8d} {usage['max_input_tokens']:7d} "
+            f"{usage['share']:6.1%}"
+        )
+    totals = report["totals"]
+    lines.append(
+        f"{'total':22} {totals['calls']:6d} {totals['cached_calls']:6d} {totals['input_tokens']:9d} "
+        f"{totals['output_tokens']:8d}"
+    )
+    if totals["estimated_calls"]:
+        lines.append(f"{totals['estimated_calls']} calls without provider usage were counted with the tokenizer")
+    return "\n".join(lines)
+
+_token_ledger = None
+_token_ledger_lock = threading.Lock()
+# Ledger of the run in progress; every run (and Streamlit session) sets its own
+_run_ledger = contextvars.ContextVar("token_ledger", default=None)
+
+def get_token_ledger():
+    """Return the ledger of the current run, or the process-wide ledger outside a run."""
+    global _token_ledger
+    ledger = _run_ledger.get()
+    if ledger is not None:
+        return ledger
+    with _token_ledger_lock:
+        if _token_ledger is None:
+            _token_ledger = TokenLedger()
+        return _token_ledger
+
+def with_token_ledger(function):
+    """Give every call of function a new ledger for the API calls it makes.
+
+    Calls made from threads started with ContextThreadPoolExecutor are
+    recorded in the same ledger, and concurrent runs do not see each other.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _run_ledger.set(TokenLedger())
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _run_ledger.reset(token)
+    return wrapper
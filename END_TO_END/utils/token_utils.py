@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+FALLBACK_ENCODING = "cl100k_base"
+
+# With KG_EXTRACTOR_OFFLINE set, encodings are only loaded from the local tiktoken cache
+OFFLINE = os.environ.get("KG_EXTRACTOR_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# Download locations tiktoken uses as cache keys for the encodings our models need
+ENCODING_URLS = {
+    "cl100k_base": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+    "o200k_base": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+}
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+def tiktoken_cache_dir():
+    """Return the directory tiktoken reads downloaded encodings from."""
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        return os.environ["TIKTOKEN_CACHE_DIR"]
+    if "DATA_GYM_CACHE_DIR" in os.environ:
+        return os.environ["DATA_GYM_CACHE_DIR"]
+    return os.path.join(tempfile.gettempdir(), "data-gym-cache")
+
+def is_encoding_cached(encoding_name):
+    """Return True if tiktoken can load encoding_name without network access."""
+    url = ENCODING_URLS.get(encoding_name)
+    if url is None:
+        return False
+    cache_key = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.exists(os.path.join(tiktoken_cache_dir(), cache_key))
+
+def get_encoding(model):
+    """Return the tiktoken encoding for a model, or None if tiktoken is unavailable.
+
+    Models tiktoken does not know (such as the Groq-hosted Llama and Mixtral
+    models) use cl100k_base, which is close enough for budgeting. In offline
+    mode an encoding that is not in the local cache is treated as unavailable
+    instead of being downloaded.
+    """
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        try:
+            import tiktoken
+            try:
+                encoding_name = tiktoken.encoding_name_for_model(model)
+            except KeyError:
+                encoding_name = FALLBACK_ENCODING
+            if OFFLINE and not is_encoding_cached(encoding_name):
+                encoding = None
+            else:
+                encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            encoding = None
+        _encodings[model] = encoding
+        return encoding
+
+def count_tokens(text, model="gpt-4o"):
+    """Count the tokens in text, estimating four characters per token without tiktoken."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))